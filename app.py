@@ -20,7 +20,7 @@ from config import Config, config
 from models import image_storage, job_storage, progress_storage
 
 # 導入服務
-from services import progress_tracker, ai_service, image_processing_service, cleanup_service
+from services import progress_tracker, ai_service, image_processing_service, cleanup_service, job_queue, extraction_cache, orientation_cache, gemini_scheduler, async_extraction_engine, job_prefilter
 
 # 導入路由
 from routes import main_bp, upload_bp, results_bp
@@ -57,6 +57,9 @@ def create_app(config_name='default'):
     app.register_blueprint(upload_bp)
     app.register_blueprint(results_bp)
     
+    # 啟動背景任務佇列（上傳的檔案在工作執行緒中處理）
+    job_queue.start()
+    
     # SocketIO 事件處理
     @socketio.on('connect')
     def handle_connect():
@@ -155,6 +158,20 @@ def create_app(config_name='default'):
             'estimated_memory_mb': round(estimated_memory_mb, 2)
         }
         
+        # 背景任務佇列狀態
+        storage_info['job_queue'] = job_queue.get_stats()
+        
+        # 工作資訊提取與方向檢測結果快取的命中統計
+        storage_info['extraction_cache'] = extraction_cache.get_stats()
+        storage_info['orientation_cache'] = orientation_cache.get_stats()
+        
+        # Gemini 請求排程狀態（等待中的請求、429 次數與退避時間）
+        storage_info['gemini_scheduler'] = gemini_scheduler.get_stats()
+        storage_info['async_extraction'] = async_extraction_engine.get_stats()
+        
+        # 本地預篩略過的區塊數（減少的請求）與 shadow 模式下的召回損失
+        storage_info['job_prefilter'] = job_prefilter.get_stats()
+        
         # 獲取最近的處理記錄
         recent_processes = []
         if os.path.exists(Config.RESULTS_FOLDER):
@@ -517,8 +534,9 @@ def start_cleanup_scheduler():
     cleanup_status = "已啟用" if Config.CLEANUP_ENABLE_COUNT_LIMIT else "時間清理已啟用，數量限制已停用"
     print(f"定時清理任務已啟動，每{Config.CLEANUP_INTERVAL_HOURS}小時執行一次（{cleanup_status}）")
 
-# 創建應用實例
-app, socketio = create_app()
+# 創建應用實例（區塊分割引擎的子進程會以 __mp_main__ 重新載入此檔案，不需要建立應用）
+if __name__ != '__mp_main__':
+    app, socketio = create_app()
 
 if __name__ == '__main__':
     # 立即執行一次清理（清理啟動時的舊檔案）
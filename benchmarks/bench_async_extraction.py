@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作資訊提取引擎的壓力測試
+
+對本地模擬 Gemini 伺服器送出大量區塊，比較 threads（每個等待中的請求佔用一個線程）
+與 asyncio（共用事件迴圈中的協程）兩種引擎的耗時、同時等待的請求數、線程數與記憶體
+
+用法：python benchmarks/bench_async_extraction.py [--blocks 2000] [--batch-size 1] [--latency 1.0] [--workers 8] [--concurrency 256]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+import threading
+import concurrent.futures
+
+import cv2
+import numpy as np
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config  # noqa: E402
+from services.ai_service import AIService  # noqa: E402
+from services.async_extraction import AsyncExtractionEngine  # noqa: E402
+from services.rate_limiter import RequestScheduler  # noqa: E402
+from services.result_cache import ResultCache  # noqa: E402
+from benchmarks.fake_gemini_server import FakeGeminiServer  # noqa: E402
+
+
+def write_blocks(directory, count, seed=0):
+    """產生內容各不相同的區塊圖片（避免被結果快取命中）"""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for index in range(count):
+        block = rng.integers(0, 255, size=(120, 200, 3), dtype=np.uint8)
+        path = os.path.join(directory, f'block_{index:05d}.png')
+        cv2.imwrite(path, block)
+        paths.append(path)
+    return paths
+
+
+def make_service(directory, server):
+    service = AIService()
+    service.create_client = server.create_client  # 連到模擬伺服器
+    service.scheduler = RequestScheduler(rpm=0, tpm=0)
+    service.extraction_cache = ResultCache(os.path.join(directory, 'cache.sqlite3'), max_entries=10, enabled=False)
+    return service
+
+
+class PeakSampler:
+    """定期記錄程序的線程數與常駐記憶體峰值"""
+
+    def __init__(self):
+        self.process = psutil.Process()
+        self.peak_threads = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_threads = max(self.peak_threads, self.process.num_threads())
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+            time.sleep(0.02)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_threads(service, groups, workers):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(service.analyze_jobs_batch, 'key', group) for group in groups]
+        return sum(len(future.result()) for future in futures)
+
+
+def run_asyncio(service, groups, concurrency):
+    engine = AsyncExtractionEngine(service, concurrency)
+    futures = [engine.submit('key', group) for group in groups]
+    return sum(len(future.result()) for future in futures)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--blocks', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=1, help='每次請求的區塊數')
+    parser.add_argument('--latency', type=float, default=1.0, help='模擬伺服器的回應延遲（秒）')
+    parser.add_argument('--workers', type=int, default=Config.MAX_WORKERS, help='threads 引擎的線程數')
+    parser.add_argument('--concurrency', type=int, default=Config.ASYNC_EXTRACTION_CONCURRENCY, help='asyncio 引擎的並行上限')
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(latency=args.latency)
+    server.start()
+    Config.EXTRACTION_BATCH_SIZE = args.batch_size
+    Config.JOB_PREFILTER_MODE = 'off'  # 隨機雜訊的區塊不是文字，避免被預篩略過
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_blocks(directory, args.blocks)
+        service = make_service(directory, server)
+        groups = service.plan_extraction_batches(paths)
+        print(f"{len(paths)} 個區塊，{len(groups)} 次請求，模擬延遲 {args.latency} 秒")
+
+        for name, run, limit in (('threads', run_threads, args.workers), ('asyncio', run_asyncio, args.concurrency)):
+            server.peak_in_flight = 0
+            with PeakSampler() as sampler:
+                start = time.perf_counter()
+                analyzed = run(service, groups, limit)
+                elapsed = time.perf_counter() - start
+            print(f"{name:8s} 上限 {limit:4d}: {elapsed:7.2f} 秒，分析 {analyzed} 個區塊，"
+                  f"同時等待 {server.peak_in_flight} 個請求，線程峰值 {sampler.peak_threads}，"
+                  f"記憶體峰值 {sampler.peak_rss / 1024 / 1024:.0f} MB")
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+未填充區域重疊比例計算的效能測試
+
+比較原本「每個候選區域配置遮罩並逐一繪製初始區塊」的做法
+與區間聯集（座標壓縮）做法在大尺寸頁面上的耗時
+
+用法：python benchmarks/bench_overlap_ratio.py [--width 9000] [--height 12800] [--blocks 400] [--candidates 300]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_processor import covered_area  # noqa: E402
+
+
+def make_page_layout(width, height, num_blocks, num_candidates, seed=0):
+    """產生模擬分類廣告版面：格狀排列的初始區塊與大小不一的候選區域"""
+    rng = random.Random(seed)
+    cols = max(1, int(round((num_blocks * width / height) ** 0.5)))
+    rows = max(1, (num_blocks + cols - 1) // cols)
+    cell_w, cell_h = width // cols, height // rows
+    block_bboxes = []
+    for index in range(num_blocks):
+        row, col = divmod(index, cols)
+        pad_x, pad_y = rng.randint(5, cell_w // 6), rng.randint(5, cell_h // 6)
+        block_bboxes.append((col * cell_w + pad_x, row * cell_h + pad_y,
+                             cell_w - 2 * pad_x, cell_h - 2 * pad_y))
+
+    candidates = []
+    for _ in range(num_candidates):
+        w = rng.randint(cell_w // 2, cell_w * 4)
+        h = rng.randint(cell_h // 2, cell_h * 4)
+        x, y = rng.randint(0, width - w), rng.randint(0, height - h)
+        candidates.append((x, y, w, h))
+    return block_bboxes, candidates
+
+
+def overlap_with_masks(block_bboxes, candidates):
+    """原本的做法：為每個候選區域配置遮罩，逐一繪製相交的初始區塊"""
+    results = []
+    for orig_x, orig_y, orig_w, orig_h in candidates:
+        temp_overlap_mask = np.zeros((orig_h, orig_w), dtype=np.uint8)
+        for bx, by, bw, bh in block_bboxes:
+            x_start, y_start = max(orig_x, bx) - orig_x, max(orig_y, by) - orig_y
+            x_end = min(orig_x + orig_w, bx + bw) - orig_x
+            y_end = min(orig_y + orig_h, by + bh) - orig_y
+            if x_end > x_start and y_end > y_start:
+                temp_overlap_mask[y_start:y_end, x_start:x_end] = 255
+        results.append(cv2.countNonZero(temp_overlap_mask) / (orig_w * orig_h))
+    return results
+
+
+def overlap_with_interval_union(block_bboxes, candidates):
+    """區間聯集做法：只對相交的區塊做座標壓縮，不配置任何遮罩"""
+    block_array = np.asarray(block_bboxes, dtype=np.int64)
+    return [covered_area((x, y, w, h), block_array) / (w * h) for x, y, w, h in candidates]
+
+
+def best_of(func, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='未填充區域重疊比例計算效能測試')
+    parser.add_argument('--width', type=int, default=9000, help='頁面寬度（像素），預設約為 A3 600 DPI')
+    parser.add_argument('--height', type=int, default=12800, help='頁面高度（像素）')
+    parser.add_argument('--blocks', type=int, default=400, help='初始區塊數量')
+    parser.add_argument('--candidates', type=int, default=300, help='未填充候選區域數量')
+    parser.add_argument('--repeat', type=int, default=3, help='重複次數（取最佳值）')
+    args = parser.parse_args()
+
+    block_bboxes, candidates = make_page_layout(args.width, args.height, args.blocks, args.candidates)
+    print(f"頁面 {args.width}x{args.height}，{len(block_bboxes)} 個初始區塊，{len(candidates)} 個候選區域")
+
+    mask_time, mask_ratios = best_of(lambda: overlap_with_masks(block_bboxes, candidates), args.repeat)
+    union_time, union_ratios = best_of(lambda: overlap_with_interval_union(block_bboxes, candidates), args.repeat)
+
+    if mask_ratios != union_ratios:
+        print("❌ 兩種做法的結果不一致")
+        sys.exit(1)
+
+    print(f"逐一配置遮罩：{mask_time * 1000:.1f} ms")
+    print(f"區間聯集：    {union_time * 1000:.1f} ms")
+    print(f"加速：        {mask_time / union_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模擬 Gemini 伺服器
+
+以 gRPC 實作 GenerativeService.GenerateContent，固定延遲後回答工作資訊 JSON
+（批次請求依「圖片 B1：」等代號回答以代號為鍵的物件），可設定回應 429 的比例，
+用於在沒有網路與 API 配額的環境下壓力測試工作資訊提取
+
+用法：python benchmarks/fake_gemini_server.py [--port 50051] [--latency 1.0] [--rate-limit-ratio 0.0]
+在測試或壓力測試程式中以 FakeGeminiServer.create_client 取代 AIService.create_client，
+即可讓 AIService 與非同步提取引擎改連到模擬伺服器（正式程式沒有連到其他位址的設定）
+"""
+
+import re
+import json
+import random
+import asyncio
+import argparse
+import threading
+
+import grpc
+import google.ai.generativelanguage as glm
+from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+    GenerativeServiceGrpcTransport, GenerativeServiceGrpcAsyncIOTransport
+)
+
+SERVICE_NAME = 'google.ai.generativelanguage.v1beta.GenerativeService'
+LABEL_PATTERN = re.compile(r'圖片 (B\d+)：')
+
+
+class FakeGeminiServer:
+    """在背景執行緒中執行的模擬伺服器"""
+
+    def __init__(self, latency=1.0, rate_limit_ratio=0.0, seed=0):
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        self.image_bytes = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.port = None
+        self._loop = None
+        self._thread = None
+        self._stopping = None
+
+    def answer(self, request):
+        """依請求中的區塊代號產生回答"""
+        texts = [part.text for content in request.contents for part in content.parts if part.text]
+        labels = LABEL_PATTERN.findall('\n'.join(texts))
+        if labels:
+            return json.dumps({label: [{"工作": f"模擬工作 {label}", "行業": "住宿及餐飲業"}] for label in labels},
+                              ensure_ascii=False)
+        return json.dumps([{"工作": "模擬工作", "行業": "住宿及餐飲業"}], ensure_ascii=False)
+
+    async def generate_content(self, request, context):
+        self.requests += 1
+        self.image_bytes += sum(len(part.inline_data.data) for content in request.contents for part in content.parts)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.random.random() < self.rate_limit_ratio:
+                self.rate_limited += 1
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                    'Resource has been exhausted. retry_delay { seconds: 1 }')
+            text = self.answer(request)
+        finally:
+            self.in_flight -= 1
+        return glm.GenerateContentResponse(candidates=[glm.Candidate(
+            index=0, finish_reason=glm.Candidate.FinishReason.STOP,
+            content=glm.Content(role='model', parts=[glm.Part(text=text)])
+        )])
+
+    async def _serve(self, port, started):
+        self._stopping = asyncio.Event()
+        server = grpc.aio.server()
+        handler = grpc.method_handlers_generic_handler(SERVICE_NAME, {
+            'GenerateContent': grpc.unary_unary_rpc_method_handler(
+                self.generate_content,
+                request_deserializer=glm.GenerateContentRequest.deserialize,
+                response_serializer=glm.GenerateContentResponse.serialize
+            )
+        })
+        server.add_generic_rpc_handlers((handler,))
+        self.port = server.add_insecure_port(f'127.0.0.1:{port}')
+        await server.start()
+        started.set()
+        await self._stopping.wait()
+        await server.stop(None)
+
+    def start(self, port=0):
+        """在背景執行緒啟動伺服器，返回 gRPC 位址；port 為 0 時自動選擇可用的埠"""
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._serve(port, started),), daemon=True)
+        self._thread.start()
+        started.wait(timeout=10)
+        return f'127.0.0.1:{self.port}'
+
+    def create_client(self, api_key, asynchronous=False):
+        """與 AIService.create_client 相同介面的連線工廠，以不加密的本地連線連到模擬伺服器（忽略 API 密鑰）"""
+        address = f'127.0.0.1:{self.port}'
+        if asynchronous:
+            return glm.GenerativeServiceAsyncClient(
+                transport=GenerativeServiceGrpcAsyncIOTransport(channel=grpc.aio.insecure_channel(address))
+            )
+        return glm.GenerativeServiceClient(transport=GenerativeServiceGrpcTransport(channel=grpc.insecure_channel(address)))
+
+    def stop(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+            self._thread.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=50051)
+    parser.add_argument('--latency', type=float, default=1.0, help='每個請求的回應延遲（秒）')
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help='回應 429 的請求比例')
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(args.latency, args.rate_limit_ratio)
+    address = server.start(args.port)
+    print(f"模擬 Gemini 伺服器已啟動: {address}（延遲 {args.latency} 秒，429 比例 {args.rate_limit_ratio}）")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+        print(f"共處理 {server.requests} 個請求，其中 {server.rate_limited} 個回應 429，最多同時 {server.peak_in_flight} 個")
+
+
+if __name__ == '__main__':
+    main()
@@ -37,6 +37,9 @@ class Config:
     GEMINI_TOP_P = 0.0
     GEMINI_MAX_RETRIES = 3  # API 限制錯誤的最大重試次數
     GEMINI_ORIENTATION_MAX_RETRIES = 2  # 方向檢測的最大重試次數（通常較快，重試次數少）
+    GEMINI_RPM_LIMIT = int(os.environ.get('GEMINI_RPM_LIMIT', 15))  # 每個 API 密鑰的每個模型每分鐘最多送出的請求數，0 表示不限制
+    GEMINI_CLIENT_POOL_SIZE = int(os.environ.get('GEMINI_CLIENT_POOL_SIZE', 16))  # 保留連線的 API 密鑰數（依最近使用淘汰）
+    GEMINI_TPM_LIMIT = int(os.environ.get('GEMINI_TPM_LIMIT', 1000000))  # 每個 API 密鑰的每個模型每分鐘最多使用的 token 數（估計值），0 表示不限制
     
     # 伺服器設定
     FLASK_HOST = os.environ.get('FLASK_HOST', '0.0.0.0')
@@ -50,8 +53,61 @@ class Config:
     CORS_ALLOWED_ORIGINS = "*"
     
     # 並行處理設定
-    MAX_WORKERS = 8
+    MAX_WORKERS = int(os.environ.get('AI_PARALLEL_WORKERS', 8))  # 一次上傳中所有頁面的區塊共用的 AI 分析線程數
     REQUEST_TIMEOUT = 30
+    EXTRACTION_BATCH_SIZE = int(os.environ.get('EXTRACTION_BATCH_SIZE', 8))  # 合併為一次 AI 請求的區塊數上限，1 表示每個區塊單獨請求
+    EXTRACTION_BATCH_MAX_BYTES = int(os.environ.get('EXTRACTION_BATCH_MAX_BYTES', 4 * 1024 * 1024))  # 一次請求的區塊圖片總大小上限
+    # 工作資訊提取引擎：threads 以 MAX_WORKERS 個線程等待回應、asyncio 在共用的事件迴圈中以協程等待回應
+    EXTRACTION_ENGINES = ('threads', 'asyncio')
+    EXTRACTION_ENGINE = os.environ.get('EXTRACTION_ENGINE', 'threads')
+    ASYNC_EXTRACTION_CONCURRENCY = int(os.environ.get('ASYNC_EXTRACTION_CONCURRENCY', 256))  # asyncio 引擎所有上傳合計同時等待回應的請求數上限
+    
+    # 區塊請求圖片編碼：compact 依文字高度縮小並轉為灰階壓縮圖片、original 送出區塊檔案的原始位元組
+    BLOCK_ENCODING_MODES = ('compact', 'original')
+    BLOCK_ENCODING = os.environ.get('BLOCK_ENCODING', 'compact')
+    BLOCK_TARGET_TEXT_HEIGHT = float(os.environ.get('BLOCK_TARGET_TEXT_HEIGHT', 20))  # 縮小後文字的目標高度（像素），不會放大
+    BLOCK_MIN_TEXT_HEIGHT = float(os.environ.get('BLOCK_MIN_TEXT_HEIGHT', 16))  # 為了少用一個圖片區塊（token）最多可縮到的文字高度
+    BLOCK_IMAGE_FORMAT = os.environ.get('BLOCK_IMAGE_FORMAT', 'jpeg')  # jpeg 或 webp
+    BLOCK_IMAGE_QUALITY = int(os.environ.get('BLOCK_IMAGE_QUALITY', 80))
+    # 本地工作廣告預篩：on 略過分數低於門檻的區塊（不呼叫 API）、shadow 只計分並統計會漏掉的工作、off 不計分
+    JOB_PREFILTER_MODES = ('on', 'shadow', 'off')
+    JOB_PREFILTER_MODE = os.environ.get('JOB_PREFILTER_MODE', 'shadow')  # 先以 shadow 統計召回損失，確認後再改為 on
+    JOB_PREFILTER_THRESHOLD = float(os.environ.get('JOB_PREFILTER_THRESHOLD', 0.08))  # 0 到 1，排列成行列的字元越多分數越高
+    
+    # 區塊分割設定
+    SEGMENTATION_WORKERS = int(os.environ.get('SEGMENTATION_WORKERS', 0))  # 分割子進程數量，0 表示使用所有可用核心
+    SEGMENTATION_ANALYSIS_SCALE = float(os.environ.get('SEGMENTATION_ANALYSIS_SCALE', 1.0))  # 輪廓偵測使用的縮放比例，1.0 表示原解析度
+    
+    # PDF 渲染設定：依預覽估計的字高選擇 DPI，關閉時所有頁面使用原本的固定規則（至少 300 DPI）
+    PDF_ADAPTIVE_DPI = os.environ.get('PDF_ADAPTIVE_DPI', 'True').lower() == 'true'
+    PDF_MIN_DPI = int(os.environ.get('PDF_MIN_DPI', 150))  # 自動選擇的最低 DPI
+    PDF_MIN_GLYPH_PIXELS = int(os.environ.get('PDF_MIN_GLYPH_PIXELS', 16))  # 最小文字至少需要的像素高度
+    
+    # 方向檢測設定：local 只用本地估計、auto 本地信心不足時以 Gemini 比較剩餘候選方向、gemini 四個方向都送 Gemini 評分
+    ORIENTATION_MODES = ('local', 'auto', 'gemini')
+    ORIENTATION_MODE = os.environ.get('ORIENTATION_MODE', 'auto')
+    ORIENTATION_MIN_CONFIDENCE = float(os.environ.get('ORIENTATION_MIN_CONFIDENCE', 0.5))  # 本地估計信心達此值時不呼叫 Gemini
+    ORIENTATION_SCORING_MODES = ('single', 'separate')
+    ORIENTATION_SCORING = os.environ.get('ORIENTATION_SCORING', 'single')  # single 一次請求比較所有候選方向、separate 每個方向分別評分
+    ORIENTATION_THUMBNAIL_SIZE = int(os.environ.get('ORIENTATION_THUMBNAIL_SIZE', 1024))  # 送 Gemini 評分的縮圖長邊像素
+    ORIENTATION_JPEG_QUALITY = int(os.environ.get('ORIENTATION_JPEG_QUALITY', 80))  # 縮圖的 JPEG 品質
+    
+    # 處理步驟圖像設定：off 不產生、lazy 需要查看或下載時才產生、full 每頁都產生
+    DEBUG_ARTIFACT_MODES = ('off', 'lazy', 'full')
+    DEBUG_ARTIFACTS = os.environ.get('DEBUG_ARTIFACTS', 'full')
+    
+    # 背景任務佇列設定
+    JOB_QUEUE_FOLDER = 'queue'  # 任務記錄目錄（重新啟動後可恢復未完成的任務）
+    JOB_QUEUE_MAX_SIZE = int(os.environ.get('JOB_QUEUE_MAX_SIZE', 20))  # 佇列中最多等待的任務數
+    JOB_QUEUE_WORKERS = int(os.environ.get('JOB_QUEUE_WORKERS', 2))  # 同時處理的上傳任務數
+    
+    # 結果快取設定：以區塊內容雜湊保存 Gemini 分析結果、以頁面內容雜湊保存方向檢測結果，重複的內容不再呼叫 API
+    CACHE_FOLDER = 'cache'
+    EXTRACTION_CACHE_ENABLED = os.environ.get('EXTRACTION_CACHE_ENABLED', 'True').lower() == 'true'
+    EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get('EXTRACTION_CACHE_MAX_ENTRIES', 20000))  # 超過時淘汰最久未使用的結果
+    ORIENTATION_CACHE_ENABLED = os.environ.get('ORIENTATION_CACHE_ENABLED', 'True').lower() == 'true'  # 以頁面內容雜湊快取方向檢測結果
+    ORIENTATION_CACHE_MAX_ENTRIES = int(os.environ.get('ORIENTATION_CACHE_MAX_ENTRIES', 5000))
+    ORIENTATION_CACHE_TTL_HOURS = float(os.environ.get('ORIENTATION_CACHE_TTL_HOURS', 168))  # 方向結果的有效時間
     
     @staticmethod
     def init_app(app):
@@ -59,6 +115,8 @@ class Config:
         # 確保目錄存在
         os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
         os.makedirs(Config.RESULTS_FOLDER, exist_ok=True)
+        os.makedirs(Config.JOB_QUEUE_FOLDER, exist_ok=True)
+        os.makedirs(Config.CACHE_FOLDER, exist_ok=True)
 
 class DevelopmentConfig(Config):
     """開發環境配置"""
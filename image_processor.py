@@ -3,6 +3,9 @@ import numpy as np
 import os
 import fitz
 import gc
+import math
+from collections import namedtuple
+from utils.pdf_utils import DpiPlan, PageBufferPool, default_page_dpi, plan_page_dpi, load_page_image
 
 # 檢查一個邊界框是否被另一個邊界框包含
 def is_contained_bbox(bbox1, bbox2, tolerance=10):
@@ -24,34 +27,192 @@ def intersection_area(boxA, boxB):
         return inter_width * inter_height
     return 0
 
-# 處理單一圖像的函數（直接接收圖像數據）
-def process_image(image, output_folder, image_name):
-    """處理圖像數據，提取區塊並保存結果 - 總是保存處理圖像"""
-    if image is None:
-        print(f"圖像數據為空，無法處理：{image_name}")
-        return
-    
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-        print(f"創建資料夾：{output_folder}")
-
-    # 總是保存原始圖像
-    original_image_path = os.path.join(output_folder, f"{image_name}_original.jpg")
-    cv2.imwrite(original_image_path, image)
-    print(f"保存原始圖像：{original_image_path}")
-
-    print(f"開始處理圖像：{image_name}，尺寸：{image.shape}")
-
+# 向量化計算所有邊界框之間的包含關係
+def containment_matrix(bboxes, tolerance=10):
+    """返回布林矩陣，matrix[i, j] 表示 bboxes[i] 是否包含在 bboxes[j] 內（與 is_contained_bbox 相同規則，對角線為 False）"""
+    boxes = np.asarray(bboxes, dtype=np.int64).reshape(-1, 4)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    matrix = ((x1[:, None] >= x1[None, :] - tolerance) &
+              (y1[:, None] >= y1[None, :] - tolerance) &
+              (x2[:, None] <= x2[None, :] + tolerance) &
+              (y2[:, None] <= y2[None, :] + tolerance))
+    np.fill_diagonal(matrix, False)
+    return matrix
+
+def filter_contained_initial(bboxes, tolerance=10):
+    """第一次包含過濾：兩個邊界框有包含關係時保留面積較大者，返回保留的索引
+
+    依序處理的結果與逐對比較相同（被移除的邊界框不再參與比較），
+    但只需走訪包含矩陣中為 True 的項目。
+    """
+    contained = containment_matrix(bboxes, tolerance)
+    areas = [w * h for (_, _, w, h) in bboxes]
+    removed = [False] * len(bboxes)
+    kept_indices = []
+    for i in range(len(bboxes)):
+        if removed[i]:  # 跳過已移除的邊界框
+            continue
+        is_contained_by_others = False
+        for j in np.flatnonzero(contained[i]).tolist():
+            if removed[j]:
+                continue
+            if areas[i] >= areas[j]:
+                # 保留 bbox_i，移除 other_bbox
+                removed[j] = True
+            else:
+                # 保留 other_bbox，移除 bbox_i
+                is_contained_by_others = True
+                break
+        if not is_contained_by_others:
+            kept_indices.append(i)
+    return kept_indices
+
+def filter_contained_final(bboxes, tolerance=10):
+    """最終包含過濾：依序移除被其他仍保留的邊界框包含的區域，返回保留的索引"""
+    contained = containment_matrix(bboxes, tolerance)
+    keep = np.ones(len(bboxes), dtype=bool)
+    for i in range(len(bboxes)):
+        if np.any(contained[i] & keep):
+            keep[i] = False
+    return np.flatnonzero(keep).tolist()
+
+# 分割結果中的單一區塊：邊界框、檔名與原圖上的裁切視圖（不複製像素）
+Region = namedtuple('Region', ['bbox', 'name', 'crop'])
+
+def build_block_mask(geometry):
+    """根據初始區塊邊界框繪製未處理的遮罩"""
+    if geometry['mask_origin'] is None:
+        return None
+    min_x_overall, min_y_overall = geometry['mask_origin']
+    mask_width, mask_height = geometry['mask_size']
+    mask = np.zeros((mask_height, mask_width), dtype=np.uint8)
+    for (x, y, w, h) in geometry['initial_bboxes']:
+        relative_y = y - min_y_overall
+        relative_x = x - min_x_overall
+        end_y = min(relative_y + h, mask_height)
+        end_x = min(relative_x + w, mask_width)
+        relative_y = max(0, relative_y)
+        relative_x = max(0, relative_x)
+        if end_y > relative_y and end_x > relative_x:
+            mask[relative_y:end_y, relative_x:end_x] = 255
+    return mask
+
+def covered_area(bbox, block_bboxes):
+    """計算 bbox 內被 block_bboxes 覆蓋的像素數（重疊部分只計算一次）
+
+    只使用與 bbox 相交的區塊邊界做座標壓縮，再以二維差分陣列求聯集面積，
+    不需配置與 bbox 同尺寸的遮罩。
+    """
+    x, y, w, h = bbox
+    blocks = np.asarray(block_bboxes, dtype=np.int64).reshape(-1, 4)
+    x0 = np.clip(blocks[:, 0], x, x + w)
+    y0 = np.clip(blocks[:, 1], y, y + h)
+    x1 = np.clip(blocks[:, 0] + blocks[:, 2], x, x + w)
+    y1 = np.clip(blocks[:, 1] + blocks[:, 3], y, y + h)
+    intersects = (x1 > x0) & (y1 > y0)
+    if not intersects.any():
+        return 0
+    x0, y0, x1, y1 = x0[intersects], y0[intersects], x1[intersects], y1[intersects]
+
+    xs = np.unique(np.concatenate([x0, x1]))
+    ys = np.unique(np.concatenate([y0, y1]))
+    covered = _coverage_grid(x0, y0, x1, y1, xs, ys)
+    cell_areas = np.diff(ys)[:, None] * np.diff(xs)[None, :]
+    return int(cell_areas[covered].sum())
+
+def _coverage_grid(x0, y0, x1, y1, xs, ys):
+    """在壓縮座標 xs / ys 劃分的格子上，標記被矩形 [x0, x1) x [y0, y1) 覆蓋的格子"""
+    ix0, ix1 = np.searchsorted(xs, x0), np.searchsorted(xs, x1)
+    iy0, iy1 = np.searchsorted(ys, y0), np.searchsorted(ys, y1)
+
+    # 二維差分：每個矩形在壓縮座標上的四個角 +1/-1，累加後大於 0 的格子即被覆蓋
+    diff = np.zeros((len(ys), len(xs)), dtype=np.int32)
+    np.add.at(diff, (iy0, ix0), 1)
+    np.add.at(diff, (iy0, ix1), -1)
+    np.add.at(diff, (iy1, ix0), -1)
+    np.add.at(diff, (iy1, ix1), 1)
+    return diff.cumsum(axis=0).cumsum(axis=1)[:-1, :-1] > 0
+
+def _eroded_runs(covered, edges, lead, trail):
+    """取出一維格子中連續被覆蓋的區間並侵蝕：起點右移 lead、終點左移 trail（遮罩邊界外視為已覆蓋）"""
+    padded = np.concatenate(([False], covered, [False]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    runs = []
+    for start_index, end_index in zip(changes[0::2].tolist(), changes[1::2].tolist()):
+        start, end = int(edges[start_index]), int(edges[end_index])
+        if start > edges[0]:
+            start += lead
+        if end < edges[-1]:
+            end -= trail
+        if end > start:
+            runs.append((start, end))
+    return runs
+
+def close_block_mask(geometry, kernel_size=30, iterations=3):
+    """對初始區塊遮罩執行閉運算（膨脹後侵蝕），填補區塊之間的縫隙
+
+    結果與在 build_block_mask 的遮罩上執行 cv2.dilate / cv2.erode（kernel_size 方形核心、
+    重複 iterations 次）逐像素相同。由於遮罩只由矩形組成，膨脹直接擴張矩形，
+    侵蝕則在壓縮座標上先水平、後垂直地收縮區間，不需逐像素套用核心。
+    """
+    if geometry['mask_origin'] is None:
+        return None
+    min_x_overall, min_y_overall = geometry['mask_origin']
+    mask_width, mask_height = geometry['mask_size']
+    closed = np.zeros((mask_height, mask_width), dtype=np.uint8)
+
+    # OpenCV 會把重複的方形核心合併為單一核心：尺寸 (k - 1) * n + 1，錨點 (k // 2) * n
+    effective_size = (kernel_size - 1) * iterations + 1
+    anchor = (kernel_size // 2) * iterations
+    trail = effective_size - 1 - anchor
+
+    # 膨脹：每個矩形向左上擴張 trail、向右下擴張 anchor（遮罩外的像素不參與）
+    rects = []
+    for (x, y, w, h) in geometry['initial_bboxes']:
+        x0 = max(0, x - min_x_overall - trail)
+        y0 = max(0, y - min_y_overall - trail)
+        x1 = min(mask_width, x - min_x_overall + w + anchor)
+        y1 = min(mask_height, y - min_y_overall + h + anchor)
+        if x1 > x0 and y1 > y0:
+            rects.append((x0, y0, x1, y1))
+    if not rects:
+        return closed
+    rects = np.asarray(rects, dtype=np.int64)
+    xs = np.unique(np.concatenate(([0, mask_width], rects[:, 0], rects[:, 2])))
+    ys = np.unique(np.concatenate(([0, mask_height], rects[:, 1], rects[:, 3])))
+    dilated = _coverage_grid(rects[:, 0], rects[:, 1], rects[:, 2], rects[:, 3], xs, ys)
+
+    # 侵蝕（方形核心可分離）：先在每個水平帶上收縮區間
+    row_runs = [_eroded_runs(dilated[i], xs, anchor, trail) for i in range(len(ys) - 1)]
+
+    # 再以水平侵蝕後的區間端點重新劃分欄位，在每個垂直帶上收縮區間並繪製
+    run_edges = [edge for runs in row_runs for run in runs for edge in run]
+    columns = np.unique(np.asarray([0, mask_width] + run_edges, dtype=np.int64))
+    eroded_rows = np.zeros((len(ys) - 1, len(columns) - 1), dtype=bool)
+    for i, runs in enumerate(row_runs):
+        for start, end in runs:
+            eroded_rows[i, np.searchsorted(columns, start):np.searchsorted(columns, end)] = True
+    for j in range(len(columns) - 1):
+        for y0, y1 in _eroded_runs(eroded_rows[:, j], ys, anchor, trail):
+            closed[y0:y1, columns[j]:columns[j + 1]] = 255
+    return closed
+
+# 偵測候選區塊輪廓
+def find_candidate_bboxes(image, min_dim=120):
+    """預處理圖像並過濾輪廓，返回尺寸與長寬比合適的候選邊界框（尚未過濾包含關係）"""
     # 預處理圖像
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     blurred = cv2.GaussianBlur(gray, (5, 5), 0)
     thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
                                    cv2.THRESH_BINARY_INV, 11, 2)
     edges = cv2.Canny(thresh, 100, 200)
+    del gray, blurred, thresh
     print("圖像預處理完成")
 
     # 檢測輪廓
     contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    del edges
     print(f"檢測到初始輪廓：{len(contours)}")
 
     # 過濾過大的輪廓
@@ -71,7 +232,6 @@ def process_image(image, output_folder, image_name):
     valid_contours_initial = []
     small_noise_count = 0
     aspect_ratio_fail_count = 0
-    min_dim = 120
     max_aspect_ratio = 5.0
     for contour in filtered_contours_size:
         x, y, w, h = cv2.boundingRect(contour)
@@ -84,55 +244,108 @@ def process_image(image, output_folder, image_name):
             small_noise_count += 1
     print(f"過濾掉 {small_noise_count} 個過小輪廓，{aspect_ratio_fail_count} 個長寬比不合適的輪廓，剩餘有效輪廓：{len(valid_contours_initial)}")
 
+    return [cv2.boundingRect(c) for c in valid_contours_initial]
+
+def scale_bbox_to_full(bbox, analysis_scale, image_size):
+    """將縮小圖上的邊界框映射回原圖座標（向外取整並裁切到圖像範圍內）"""
+    if analysis_scale == 1.0:
+        return tuple(bbox)
+    x, y, w, h = bbox
+    image_width, image_height = image_size
+    x0 = max(0, int(math.floor(x / analysis_scale)))
+    y0 = max(0, int(math.floor(y / analysis_scale)))
+    x1 = min(image_width, int(math.ceil((x + w) / analysis_scale)))
+    y1 = min(image_height, int(math.ceil((y + h) / analysis_scale)))
+    return (x0, y0, x1 - x0, y1 - y0)
+
+# 分析圖像並計算區塊幾何資訊（不寫入任何檔案）
+def detect_regions(image, analysis_scale=1.0, resolution_scale=1.0):
+    """分析圖像，返回區塊幾何資訊
+
+    analysis_scale 小於 1 時，輪廓與遮罩偵測在縮小後的圖像上執行，
+    尺寸門檻與閉運算核心會依比例自動縮放，邊界框再映射回原圖座標。
+    resolution_scale 為圖像解析度相對於門檻設定基準的比例（例如 PDF 頁面以較低 DPI 渲染時），
+    只縮放門檻而不縮放圖像。
+
+    返回的字典包含：
+    - regions: 最終區塊 [((x, y, w, h), filename), ...]（原圖座標）
+    - initial_bboxes: 初始區塊邊界框（用於繪製遮罩）
+    - mask_origin / mask_size: 遮罩在原圖上的位置與尺寸，沒有初始區塊時為 None
+    """
+    print(f"開始分析圖像，尺寸：{image.shape}")
+    image_size = (image.shape[1], image.shape[0])
+    analysis_scale = float(analysis_scale)
+    if not 0 < analysis_scale <= 1.0:
+        raise ValueError(f"analysis_scale 必須介於 0 與 1 之間: {analysis_scale}")
+    resolution_scale = float(resolution_scale)
+    if resolution_scale <= 0:
+        raise ValueError(f"resolution_scale 必須大於 0: {resolution_scale}")
+
+    if analysis_scale < 1.0:
+        analysis_image = cv2.resize(image, None, fx=analysis_scale, fy=analysis_scale, interpolation=cv2.INTER_AREA)
+        print(f"使用縮小圖像進行分析，比例 {analysis_scale}，尺寸：{analysis_image.shape}")
+    else:
+        analysis_image = image
+    analysis_height, analysis_width = analysis_image.shape[:2]
+
+    # 門檻依分析比例與解析度比例縮放（面積門檻按比例平方縮放）
+    threshold_scale = analysis_scale * resolution_scale
+    min_dim = 120 * threshold_scale
+    min_area_threshold_missing = 5000 * threshold_scale * threshold_scale
+    min_dim_missing = 120 * threshold_scale
+    kernel_size = max(1, int(round(30 * threshold_scale)))
+
+    candidate_bboxes = find_candidate_bboxes(analysis_image, min_dim=min_dim)
+    del analysis_image
+
     # 第一次過濾包含關係（僅在初始輪廓之間）
     blocks_info = []
-    contained_count_initial = 0
+    analysis_block_bboxes = []
     initial_blocks_found = 0
-    temp_initial_bboxes = [cv2.boundingRect(c) for c in valid_contours_initial]
+    kept_initial_indices = filter_contained_initial(candidate_bboxes, tolerance=10 * threshold_scale)
+    contained_count_initial = len(candidate_bboxes) - len(kept_initial_indices)
 
-    for i, contour in enumerate(valid_contours_initial):
-        bbox_i = temp_initial_bboxes[i]
-        if bbox_i is None:  # 跳過已移除的邊界框
-            continue
-        is_contained_by_others = False
-        for j, other_bbox in enumerate(temp_initial_bboxes):
-            if i != j and other_bbox is not None and is_contained_bbox(bbox_i, other_bbox):  # 確保 other_bbox 不為 None
-                # 比較兩個邊界框的面積，保留較大的
-                area_i = bbox_i[2] * bbox_i[3]
-                area_j = other_bbox[2] * other_bbox[3]
-                if area_i >= area_j:
-                    # 保留 bbox_i，移除 other_bbox
-                    temp_initial_bboxes[j] = None  # 標記為已移除
-                else:
-                    # 保留 other_bbox，移除 bbox_i
-                    is_contained_by_others = True
-                    break
-        if is_contained_by_others:
-            contained_count_initial += 1
-            continue
-        x, y, w, h = bbox_i
+    for i in kept_initial_indices:
+        x, y, w, h = candidate_bboxes[i]
         x = max(0, x)
         y = max(0, y)
-        w = min(w, image.shape[1] - x)
-        h = min(h, image.shape[0] - y)
+        w = min(w, analysis_width - x)
+        h = min(h, analysis_height - y)
         if w > 0 and h > 0:
+            analysis_block_bboxes.append((x, y, w, h))
+            x, y, w, h = scale_bbox_to_full((x, y, w, h), analysis_scale, image_size)
             blocks_info.append(((x, y, w, h), f'{x}_{y}_{x + w}_{y + h}.jpg'))
             initial_blocks_found += 1
 
-    # 移除標記為 None 的邊界框
-    temp_initial_bboxes = [bbox for bbox in temp_initial_bboxes if bbox is not None]
-
     print(f"第一次過濾：過濾掉 {contained_count_initial} 個被包含的輪廓，記錄了 {initial_blocks_found} 個初始區塊資訊。")
 
     initial_block_bboxes = [info[0] for info in blocks_info]
-
-    # 處理未填充區域
+    geometry = {
+        'image_size': image_size,
+        'analysis_scale': analysis_scale,
+        'resolution_scale': resolution_scale,
+        'initial_bboxes': initial_block_bboxes,
+        'mask_origin': None,
+        'mask_size': None,
+        # 閉運算在分析座標上執行，保留其遮罩與核心供除錯圖像沿用
+        'analysis_mask': None,
+        'kernel_size': kernel_size,
+        'regions': []
+    }
+    if initial_block_bboxes:
+        min_x_full = min(b[0] for b in initial_block_bboxes)
+        min_y_full = min(b[1] for b in initial_block_bboxes)
+        geometry['mask_origin'] = (min_x_full, min_y_full)
+        geometry['mask_size'] = (max(b[0] + b[2] for b in initial_block_bboxes) - min_x_full,
+                                 max(b[1] + b[3] for b in initial_block_bboxes) - min_y_full)
+
+    # 處理未填充區域（在分析座標上進行）
     missing_areas_info = []
     if blocks_info:
-        all_xs = [b[0] for b in initial_block_bboxes]
-        all_ys = [b[1] for b in initial_block_bboxes]
-        all_xws = [b[0] + b[2] for b in initial_block_bboxes]
-        all_yhs = [b[1] + b[3] for b in initial_block_bboxes]
+        all_xs = [b[0] for b in analysis_block_bboxes]
+        all_ys = [b[1] for b in analysis_block_bboxes]
+        all_xws = [b[0] + b[2] for b in analysis_block_bboxes]
+        all_yhs = [b[1] + b[3] for b in analysis_block_bboxes]
 
         min_x_overall = min(all_xs)
         min_y_overall = min(all_ys)
@@ -140,45 +353,26 @@ def process_image(image, output_folder, image_name):
         max_y_overall = max(all_yhs)
         mask_height = max_y_overall - min_y_overall
         mask_width = max_x_overall - min_x_overall
+        geometry['analysis_mask'] = {
+            'initial_bboxes': analysis_block_bboxes,
+            'mask_origin': (min_x_overall, min_y_overall),
+            'mask_size': (mask_width, mask_height)
+        }
 
         if mask_height > 0 and mask_width > 0:
-            mask = np.zeros((mask_height, mask_width), dtype=np.uint8)
-            for (x, y, w, h) in initial_block_bboxes:
-                relative_y = y - min_y_overall
-                relative_x = x - min_x_overall
-                end_y = min(relative_y + h, mask_height)
-                end_x = min(relative_x + w, mask_width)
-                relative_y = max(0, relative_y)
-                relative_x = max(0, relative_x)
-                if end_y > relative_y and end_x > relative_x:
-                    mask[relative_y:end_y, relative_x:end_x] = 255
-
-            # 總是保存未處理的遮罩圖像
-            mask_unprocessed_path = os.path.join(output_folder, f'{image_name}_mask_unprocessed.jpg')
-            cv2.imwrite(mask_unprocessed_path, mask)
-            print(f"保存未處理的遮罩圖像：{mask_unprocessed_path}")
-
-            kernel_size = 30
-            kernel = np.ones((kernel_size, kernel_size), np.uint8)
-            mask = cv2.dilate(mask, kernel, iterations=3)
-            mask = cv2.erode(mask, kernel, iterations=3)
-            
-            # 總是保存處理後的遮罩圖像
-            mask_processed_path = os.path.join(output_folder, f'{image_name}_mask_processed.jpg')
-            cv2.imwrite(mask_processed_path, mask)
-            print(f"保存處理後的遮罩圖像：{mask_processed_path}")
+            mask = close_block_mask(geometry['analysis_mask'], kernel_size=kernel_size)
 
             # 找到未填充區域並檢查重疊
             inv_mask = cv2.bitwise_not(mask)
             missing_contours, _ = cv2.findContours(inv_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            del mask, inv_mask
             print(f"在處理後的遮罩中檢測到 {len(missing_contours)} 個潛在未填充區域輪廓。")
 
-            min_area_threshold_missing = 5000
-            min_dim_missing = 120
             max_aspect_ratio_missing = 5.0
             overlap_threshold = 0.50
 
             missing_area_found_count = 0
+            initial_block_array = np.asarray(analysis_block_bboxes, dtype=np.int64)
             skipped_missing_area_count_filter = 0
             skipped_missing_area_count_overlap = 0
 
@@ -193,7 +387,6 @@ def process_image(image, output_folder, image_name):
                 orig_y = min_y_overall + y_rel
                 orig_w = w_rel
                 orig_h = h_rel
-                bbox_missing = (orig_x, orig_y, orig_w, orig_h)
 
                 if not (orig_w > min_dim_missing and orig_h > min_dim_missing and
                         orig_w / orig_h < max_aspect_ratio_missing and orig_h / orig_w < max_aspect_ratio_missing):
@@ -202,8 +395,8 @@ def process_image(image, output_folder, image_name):
 
                 orig_x = max(0, orig_x)
                 orig_y = max(0, orig_y)
-                orig_w = min(orig_w, image.shape[1] - orig_x)
-                orig_h = min(orig_h, image.shape[0] - orig_y)
+                orig_w = min(orig_w, analysis_width - orig_x)
+                orig_h = min(orig_h, analysis_height - orig_y)
                 bbox_missing = (orig_x, orig_y, orig_w, orig_h)
 
                 if orig_w <= 0 or orig_h <= 0:
@@ -215,34 +408,16 @@ def process_image(image, output_folder, image_name):
                     skipped_missing_area_count_filter += 1
                     continue
 
-                temp_overlap_mask = np.zeros((orig_h, orig_w), dtype=np.uint8)
-                for bbox_block in initial_block_bboxes:
-                    xA = max(bbox_missing[0], bbox_block[0])
-                    yA = max(bbox_missing[1], bbox_block[1])
-                    xB = min(bbox_missing[0] + bbox_missing[2], bbox_block[0] + bbox_block[2])
-                    yB = min(bbox_missing[1] + bbox_missing[3], bbox_block[1] + bbox_block[3])
-                    inter_width = xB - xA
-                    inter_height = yB - yA
-                    if inter_width > 0 and inter_height > 0:
-                        rel_x_start = xA - orig_x
-                        rel_y_start = yA - orig_y
-                        rel_x_end = rel_x_start + inter_width
-                        rel_y_end = rel_y_start + inter_height
-                        rel_x_start = max(0, rel_x_start)
-                        rel_y_start = max(0, rel_y_start)
-                        rel_x_end = min(orig_w, rel_x_end)
-                        rel_y_end = min(orig_h, rel_y_end)
-                        if rel_x_end > rel_x_start and rel_y_end > rel_y_start:
-                            temp_overlap_mask[rel_y_start:rel_y_end, rel_x_start:rel_x_end] = 255
-
-                covered_pixels = cv2.countNonZero(temp_overlap_mask)
+                covered_pixels = covered_area(bbox_missing, initial_block_array)
                 overlap_ratio = covered_pixels / total_missing_area
 
                 if overlap_ratio > overlap_threshold:
                     skipped_missing_area_count_overlap += 1
                     continue
 
-                missing_areas_info.append((bbox_missing, f'missing_{i}_{orig_x}_{orig_y}_{orig_x + orig_w}_{orig_y + orig_h}.jpg'))
+                orig_x, orig_y, orig_w, orig_h = scale_bbox_to_full(bbox_missing, analysis_scale, image_size)
+                missing_areas_info.append(((orig_x, orig_y, orig_w, orig_h),
+                                           f'missing_{i}_{orig_x}_{orig_y}_{orig_x + orig_w}_{orig_y + orig_h}.jpg'))
                 missing_area_found_count += 1
 
             print(f"過濾後，記錄了 {missing_area_found_count} 個有效的未填充區域。")
@@ -255,153 +430,195 @@ def process_image(image, output_folder, image_name):
 
     print("初始分割和未填充區域提取（含重疊檢查）完成！")
 
-    # 最終包含檢查
+    # 最終包含檢查（原圖座標）
     print("\n開始最終包含檢查...")
     all_candidate_regions = blocks_info + missing_areas_info
     print(f"合併初始區塊和有效未填充區域，共 {len(all_candidate_regions)} 個候選區域。")
 
     final_regions_info = []
     if all_candidate_regions:
-        indices_to_keep = set(range(len(all_candidate_regions)))
         bboxes_candidate = [r[0] for r in all_candidate_regions]
-        for i in range(len(all_candidate_regions)):
-            if i not in indices_to_keep:
-                continue
-            bbox_i = bboxes_candidate[i]
-            for j in range(len(all_candidate_regions)):
-                if i == j or j not in indices_to_keep:
-                    continue
-                bbox_j = bboxes_candidate[j]
-                if is_contained_bbox(bbox_i, bbox_j):
-                    indices_to_keep.discard(i)
-                    break
-        final_regions_info = [all_candidate_regions[i] for i in sorted(list(indices_to_keep))]
+        indices_to_keep = filter_contained_final(bboxes_candidate, tolerance=10 * resolution_scale)
+        final_regions_info = [all_candidate_regions[i] for i in indices_to_keep]
         discarded_count = len(all_candidate_regions) - len(final_regions_info)
         print(f"最終檢查完成，移除了 {discarded_count} 個被包含的區域，剩餘 {len(final_regions_info)} 個最終區域。")
     else:
         print("沒有候選區域可供最終檢查。")
 
+    geometry['regions'] = final_regions_info
+    return geometry
+
+def render_final_combined(image, regions):
+    """將最終區塊放回原位置，組合成一張圖像"""
+    if not regions:
+        print("沒有最終過濾的區塊資訊，無法創建 final_combined 圖像。")
+        return None
+
+    all_final_bboxes = [b[0] for b in regions]
+    min_x_final = min(b[0] for b in all_final_bboxes)
+    min_y_final = min(b[1] for b in all_final_bboxes)
+    max_x_final = max(b[0] + b[2] for b in all_final_bboxes)
+    max_y_final = max(b[1] + b[3] for b in all_final_bboxes)
+    final_height = max_y_final - min_y_final
+    final_width = max_x_final - min_x_final
+
+    if final_height <= 0 or final_width <= 0:
+        print(f"計算的最終組合圖像尺寸無效 (h={final_height}, w={final_width})，無法創建組合圖像。")
+        return None
+
+    combined_final = np.zeros((final_height, final_width, 3), dtype=np.uint8)
+    print(f"創建最終組合圖像畫布，尺寸：(h={final_height}, w={final_width})")
+    placement_errors = 0
+    for (x, y, w, h), filename in regions:
+        x, y, w, h = int(x), int(y), int(w), int(h)
+        if w <= 0 or h <= 0:
+            continue
+        block = image[y:y + h, x:x + w]
+        relative_y = y - min_y_final
+        relative_x = x - min_x_final
+        target_y_start = relative_y
+        target_x_start = relative_x
+        if block.size == 0:
+            print(f"警告：提取的區塊為空，跳過放置。檔名：{filename}")
+            continue
+        slice_h = min(h, final_height - target_y_start)
+        slice_w = min(w, final_width - target_x_start)
+        if slice_h > 0 and slice_w > 0 and target_y_start < final_height and target_x_start < final_width:
+            source_y_offset = 0
+            source_x_offset = 0
+            if target_y_start < 0:
+                source_y_offset = -target_y_start
+                slice_h -= source_y_offset
+                target_y_start = 0
+            if target_x_start < 0:
+                source_x_offset = -target_x_start
+                slice_w -= source_x_offset
+                target_x_start = 0
+            if slice_h > 0 and slice_w > 0:
+                try:
+                    target_slice = combined_final[target_y_start:target_y_start + slice_h,
+                                                  target_x_start:target_x_start + slice_w]
+                    source_slice = block[source_y_offset:source_y_offset + slice_h,
+                                         source_x_offset:source_x_offset + slice_w]
+                    if target_slice.shape == source_slice.shape:
+                        combined_final[target_y_start:target_y_start + slice_h,
+                                       target_x_start:target_x_start + slice_w] = source_slice
+                    else:
+                        resized_source = cv2.resize(source_slice, (target_slice.shape[1], target_slice.shape[0]))
+                        combined_final[target_y_start:target_y_start + slice_h,
+                                       target_x_start:target_x_start + slice_w] = resized_source
+                except Exception as e:
+                    print(f"放置區塊時發生錯誤，檔名：{filename}，錯誤：{e}")
+                    placement_errors += 1
+
+    if placement_errors > 0:
+        print(f"組合過程中遇到 {placement_errors} 個放置錯誤。")
+    return combined_final
+
+def render_debug_artifacts(image, geometry, image_name):
+    """根據幾何資訊產生處理步驟的除錯圖像，返回 {檔名: 圖像}"""
+    artifacts = {f"{image_name}_original.jpg": image}
+
+    mask = build_block_mask(geometry)
+    if mask is not None:
+        artifacts[f"{image_name}_mask_unprocessed.jpg"] = mask
+        # 與 detect_regions 尋找未填充區域時的遮罩相同（分析座標與核心），再放大到原圖座標
+        processed = close_block_mask(geometry['analysis_mask'], kernel_size=geometry['kernel_size'])
+        if processed.shape != mask.shape:
+            processed = cv2.resize(processed, (mask.shape[1], mask.shape[0]), interpolation=cv2.INTER_NEAREST)
+        artifacts[f"{image_name}_mask_processed.jpg"] = processed
+
+    combined_final = render_final_combined(image, geometry['regions'])
+    if combined_final is not None:
+        artifacts[f"{image_name}_final_combined.jpg"] = combined_final
+
+    return artifacts
+
+def debug_artifact_names(geometry, image_name):
+    """返回 render_debug_artifacts 會產生的檔名（不需渲染圖像）"""
+    names = [f"{image_name}_original.jpg"]
+    if geometry['mask_origin'] is not None:
+        names.append(f"{image_name}_mask_unprocessed.jpg")
+        names.append(f"{image_name}_mask_processed.jpg")
+    if geometry['regions']:
+        names.append(f"{image_name}_final_combined.jpg")
+    return names
+
+def build_regions(image, geometry):
+    """將幾何資訊轉換為 Region 列表，裁切結果為原圖的視圖"""
+    regions = []
+    for (x, y, w, h), filename in geometry['regions']:
+        crop = image[y:y + h, x:x + w]
+        if crop.size > 0:
+            regions.append(Region((x, y, w, h), filename, crop))
+        else:
+            print(f"警告：略過空的最終區塊，檔名 {filename}，座標 (x={x}, y={y}, w={w}, h={h})")
+    return regions
+
+# 在記憶體中分割圖像（不寫入任何檔案）
+def segment_image(image, image_name, include_debug=True, geometry=None, resolution_scale=1.0):
+    """分割圖像並返回區塊與除錯圖像
+
+    返回的字典包含：
+    - regions: Region 列表（裁切為原圖的視圖，未複製像素）
+    - debug_images: {檔名: 圖像}，include_debug 為 False 時為空
+    - geometry: detect_regions 的結果
+    """
+    if geometry is None:
+        geometry = detect_regions(image, resolution_scale=resolution_scale)
+    regions = build_regions(image, geometry)
+    debug_images = render_debug_artifacts(image, geometry, image_name) if include_debug else {}
+    return {'regions': regions, 'debug_images': debug_images, 'geometry': geometry}
+
+# 處理單一圖像的函數（直接接收圖像數據）
+def process_image(image, output_folder, image_name, resolution_scale=1.0):
+    """處理圖像數據，提取區塊並保存結果 - 總是保存處理圖像"""
+    if image is None:
+        print(f"圖像數據為空，無法處理：{image_name}")
+        return
+
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+        print(f"創建資料夾：{output_folder}")
+
+    print(f"開始處理圖像：{image_name}，尺寸：{image.shape}")
+    result = segment_image(image, image_name, include_debug=True, resolution_scale=resolution_scale)
+
     # 保存最終區塊圖像
     print("\n開始保存最終過濾的區塊圖像...")
-    saved_count_final = 0
-    for (x, y, w, h), filename in final_regions_info:
-        final_block = image[y:y + h, x:x + w]
-        output_path = os.path.join(output_folder, filename)
-        if final_block.size > 0:
-            cv2.imwrite(output_path, final_block)
-            saved_count_final += 1
-        else:
-            print(f"警告：無法保存空的最終區塊，檔名 {filename}，座標 (x={x}, y={y}, w={w}, h={h})")
-    print(f"保存了 {saved_count_final} 個最終區塊圖像。")
-
-    # 創建最終組合圖像
-    print("\n開始創建 final_combined 圖像...")
-    if final_regions_info:
-        all_final_bboxes = [b[0] for b in final_regions_info]
-        all_final_xs = [b[0] for b in all_final_bboxes]
-        all_final_ys = [b[1] for b in all_final_bboxes]
-        all_final_xws = [b[0] + b[2] for b in all_final_bboxes]
-        all_final_yhs = [b[1] + b[3] for b in all_final_bboxes]
-
-        if not all_final_xs:
-            print("沒有最終區塊資訊，無法創建 final_combined 圖像。")
-        else:
-            min_x_final = min(all_final_xs)
-            min_y_final = min(all_final_ys)
-            max_x_final = max(all_final_xws)
-            max_y_final = max(all_final_yhs)
-            final_height = max_y_final - min_y_final
-            final_width = max_x_final - min_x_final
-
-            if final_height <= 0 or final_width <= 0:
-                print(f"計算的最終組合圖像尺寸無效 (h={final_height}, w={final_width})，無法創建組合圖像。")
-            else:
-                combined_final = np.zeros((final_height, final_width, 3), dtype=np.uint8)
-                print(f"創建最終組合圖像畫布，尺寸：(h={final_height}, w={final_width})")
-                placement_errors = 0
-                for (x, y, w, h), filename in final_regions_info:
-                    x, y, w, h = int(x), int(y), int(w), int(h)
-                    if w <= 0 or h <= 0:
-                        continue
-                    block = image[y:y + h, x:x + w]
-                    relative_y = y - min_y_final
-                    relative_x = x - min_x_final
-                    target_y_start = relative_y
-                    target_x_start = relative_x
-                    if block.size == 0:
-                        print(f"警告：提取的區塊為空，跳過放置。檔名：{filename}")
-                        continue
-                    slice_h = min(h, final_height - target_y_start)
-                    slice_w = min(w, final_width - target_x_start)
-                    if slice_h > 0 and slice_w > 0 and target_y_start < final_height and target_x_start < final_width:
-                        source_y_offset = 0
-                        source_x_offset = 0
-                        if target_y_start < 0:
-                            source_y_offset = -target_y_start
-                            slice_h -= source_y_offset
-                            target_y_start = 0
-                        if target_x_start < 0:
-                            source_x_offset = -target_x_start
-                            slice_w -= source_x_offset
-                            target_x_start = 0
-                        if slice_h > 0 and slice_w > 0:
-                            try:
-                                target_slice = combined_final[target_y_start:target_y_start + slice_h,
-                                                              target_x_start:target_x_start + slice_w]
-                                source_slice = block[source_y_offset:source_y_offset + slice_h,
-                                                     source_x_offset:source_x_offset + slice_w]
-                                if target_slice.shape == source_slice.shape:
-                                    combined_final[target_y_start:target_y_start + slice_h,
-                                                   target_x_start:target_x_start + slice_w] = source_slice
-                                else:
-                                    resized_source = cv2.resize(source_slice, (target_slice.shape[1], target_slice.shape[0]))
-                                    combined_final[target_y_start:target_y_start + slice_h,
-                                                   target_x_start:target_x_start + slice_w] = resized_source
-                            except Exception as e:
-                                print(f"放置區塊時發生錯誤，檔名：{filename}，錯誤：{e}")
-                                placement_errors += 1
-
-                if placement_errors > 0:
-                    print(f"組合過程中遇到 {placement_errors} 個放置錯誤。")
-                
-                # 總是保存最終組合圖像
-                final_combined_path = os.path.join(output_folder, f'{image_name}_final_combined.jpg')
-                cv2.imwrite(final_combined_path, combined_final)
-                print(f"保存最終組合圖像：{final_combined_path}")
-    else:
-        print("沒有最終過濾的區塊資訊，無法創建 final_combined 圖像。")
+    for region in result['regions']:
+        cv2.imwrite(os.path.join(output_folder, region.name), region.crop)
+    print(f"保存了 {len(result['regions'])} 個最終區塊圖像。")
+
+    # 總是保存處理步驟圖像
+    for filename, artifact in result['debug_images'].items():
+        artifact_path = os.path.join(output_folder, filename)
+        cv2.imwrite(artifact_path, artifact)
+        print(f"保存處理步驟圖像：{artifact_path}")
 
     print("\n所有處理步驟完成！")
-    
+
     # 強制垃圾回收以釋放處理過程中的記憶體
-    del gray, blurred, thresh, edges, mask
-    if 'combined_final' in locals():
-        del combined_final
+    del result
     gc.collect()
     print("圖像處理完成，已執行記憶體清理")
 
 # 處理 PDF 或圖像輸入的主函數
-def main(input_path, output_folder_base, dpi=300):
+def main(input_path, output_folder_base, dpi=300, adaptive_dpi=True):
     if input_path.lower().endswith('.pdf'):
         pdf_document = fitz.open(input_path)
         pdf_base_name = os.path.splitext(os.path.basename(input_path))[0]
+        page_buffers = PageBufferPool(max_buffers=1)
 
         for page_num in range(len(pdf_document)):
             page = pdf_document.load_page(page_num)
-            # 動態調整 DPI
-            page_rect = page.rect
-            width_inch = page_rect.width / 72
-            height_inch = page_rect.height / 72
-            suggested_dpi = max(dpi, int(2000 / max(width_inch, height_inch)))
-            pix = page.get_pixmap(dpi=suggested_dpi, alpha=False, annots=True)
-
-            # 直接轉換為 OpenCV 格式
-            img_array = np.frombuffer(pix.samples, dtype=np.uint8)
-            image = img_array.reshape((pix.height, pix.width, pix.n))
-            if pix.n == 3:  # RGB
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-            elif pix.n == 4:  # RGBA
-                image = cv2.cvtColor(image, cv2.COLOR_RGBA2BGR)
+            # 動態調整 DPI：依頁面文字大小與嵌入掃描圖的解析度選擇，不超過原本的規則
+            if adaptive_dpi:
+                dpi_plan = plan_page_dpi(page, base_dpi=dpi)
+            else:
+                dpi_plan = DpiPlan(default_page_dpi(page, base_dpi=dpi), 1.0)
+            # 掃描頁直接解碼嵌入圖片，其餘頁面從 Pixmap 記憶體轉換並重複使用上一頁的緩衝區
+            image = load_page_image(page, dpi_plan.dpi, page_buffers)
 
             if image is None:
                 print(f"無法將 PDF 第 {page_num + 1} 頁轉換為圖像，跳過")
@@ -409,8 +626,10 @@ def main(input_path, output_folder_base, dpi=300):
 
             image_name = f"{pdf_base_name}_page{page_num + 1}"
             page_output_folder = f"{output_folder_base}_page{page_num + 1}"
-            print(f"\n處理 PDF 第 {page_num + 1} 頁，尺寸：{image.shape}")
-            process_image(image, page_output_folder, image_name)
+            print(f"\n處理 PDF 第 {page_num + 1} 頁，DPI：{dpi_plan.dpi}，尺寸：{image.shape}")
+            process_image(image, page_output_folder, image_name, dpi_plan.resolution_scale)
+            page_buffers.release(image)
+            del image
 
         pdf_document.close()
     else:
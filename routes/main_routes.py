@@ -19,7 +19,8 @@ def index():
     
     return render_template('index.html', 
                           api_key=session.get('gemini_api_key', ''), 
-                          model_name=Config.GEMINI_MODEL_NAME)
+                          model_name=Config.GEMINI_MODEL_NAME,
+                          debug_artifacts=session.get('debug_artifacts', Config.DEBUG_ARTIFACTS))
 
 @main_bp.route('/set_api_key', methods=['POST'])
 def set_api_key():
@@ -8,9 +8,10 @@ import csv
 import zipfile
 import base64
 from datetime import datetime
-from flask import Blueprint, render_template, send_file, request, jsonify
+from flask import Blueprint, render_template, send_file, request, jsonify, url_for
 from config.settings import Config
 from models.storage import image_storage
+from services.image_processing_service import image_processing_service
 from utils.file_utils import is_valid_job, get_page_sort_key
 
 results_bp = Blueprint('results', __name__)
@@ -26,6 +27,27 @@ def generate_base64_from_file(file_path):
         print(f"生成 base64 失敗: {e}")
     return None
 
+def build_debug_file_entry(process_key, filename, image_data, page):
+    """建立處理步驟圖像的顯示資訊；延遲產生的圖像以網址載入，瀏覽器顯示時才渲染"""
+    if image_data.get('lazy'):
+        src = url_for('results.view_image', process_id=process_key, filename=filename)
+    else:
+        base64_data = generate_base64_from_file(image_data.get('file_path', ''))
+        if not base64_data:
+            return None
+        src = f"data:image/{image_data['format']};base64,{base64_data}"
+    return {
+        'filename': filename,
+        'page': page,
+        'src': src,
+        'format': image_data['format']
+    }
+
+def ensure_debug_file(process_key, image_data):
+    """延遲產生的處理步驟圖像在第一次讀取時才渲染"""
+    if image_data.get('lazy'):
+        image_processing_service.render_lazy_debug_artifacts(process_key)
+
 @results_bp.route('/results/<process_id>')
 def show_results(process_id):
     """顯示處理結果頁面"""
@@ -53,15 +75,10 @@ def show_results(process_id):
             for filename, image_data in image_storage._storage[page_key].items():
                 # 檢查是否為偵錯圖像
                 if any(debug_type in filename for debug_type in ['_original', '_mask_', '_final_combined']):
-                    # 動態生成 base64
-                    base64_data = generate_base64_from_file(image_data.get('file_path', ''))
-                    if base64_data:
-                        debug_files.append({
-                            'filename': filename,
-                            'page': page_num,
-                            'base64': base64_data,
-                            'format': image_data['format']
-                        })
+                    # 動態生成 base64（延遲模式改以網址載入）
+                    debug_entry = build_debug_file_entry(page_key, filename, image_data, page_num)
+                    if debug_entry:
+                        debug_files.append(debug_entry)
                 else:
                     # 收集需要處理的圖片
                     batch_requests.append((page_key, filename, page_num, image_data))
@@ -87,15 +104,10 @@ def show_results(process_id):
             for filename, image_data in image_storage._storage[file_key].items():
                 # 檢查是否為偵錯圖像
                 if any(debug_type in filename for debug_type in ['_original', '_mask_', '_final_combined']):
-                    # 動態生成 base64
-                    base64_data = generate_base64_from_file(image_data.get('file_path', ''))
-                    if base64_data:
-                        debug_files.append({
-                            'filename': filename,
-                            'page': file_display,
-                            'base64': base64_data,
-                            'format': image_data['format']
-                        })
+                    # 動態生成 base64（延遲模式改以網址載入）
+                    debug_entry = build_debug_file_entry(file_key, filename, image_data, file_display)
+                    if debug_entry:
+                        debug_files.append(debug_entry)
                 else:
                     # 收集需要處理的圖片
                     batch_requests.append((file_key, filename, file_display, image_data))
@@ -103,15 +115,10 @@ def show_results(process_id):
         # 單一圖像處理
         for filename, image_data in image_storage._storage[process_id].items():
             if any(debug_type in filename for debug_type in ['_original', '_mask_', '_final_combined']):
-                # 動態生成 base64
-                base64_data = generate_base64_from_file(image_data.get('file_path', ''))
-                if base64_data:
-                    debug_files.append({
-                        'filename': filename,
-                        'page': '1',
-                        'base64': base64_data,
-                        'format': image_data['format']
-                    })
+                # 動態生成 base64（延遲模式改以網址載入）
+                debug_entry = build_debug_file_entry(process_id, filename, image_data, '1')
+                if debug_entry:
+                    debug_files.append(debug_entry)
             else:
                 # 收集需要處理的圖片
                 batch_requests.append((process_id, filename, '1', image_data))
@@ -214,6 +221,7 @@ def view_image(process_id, filename):
     """查看指定的圖片"""
     # 檢查是否存在該圖片
     if process_id in image_storage._storage and filename in image_storage._storage[process_id]:
+        ensure_debug_file(process_id, image_storage._storage[process_id][filename])
         file_path = image_storage._storage[process_id][filename]['file_path']
         if os.path.exists(file_path):
             return send_file(file_path, mimetype='image/jpeg')
@@ -222,6 +230,7 @@ def view_image(process_id, filename):
     pdf_page_keys = [key for key in image_storage._storage.keys() if key.startswith(f"{process_id}_page")]
     for page_key in pdf_page_keys:
         if filename in image_storage._storage[page_key]:
+            ensure_debug_file(page_key, image_storage._storage[page_key][filename])
             file_path = image_storage._storage[page_key][filename]['file_path']
             if os.path.exists(file_path):
                 return send_file(file_path, mimetype='image/jpeg')
@@ -230,6 +239,7 @@ def view_image(process_id, filename):
     multi_file_keys = [key for key in image_storage._storage.keys() if key.startswith(f"{process_id}_file")]
     for file_key in multi_file_keys:
         if filename in image_storage._storage[file_key]:
+            ensure_debug_file(file_key, image_storage._storage[file_key][filename])
             file_path = image_storage._storage[file_key][filename]['file_path']
             if os.path.exists(file_path):
                 return send_file(file_path, mimetype='image/jpeg')
@@ -274,6 +284,7 @@ def download_results(process_id):
                     debug_images.append({
                         'filename': filename,
                         'page': page_num,
+                        'process_key': page_key,
                         'data': image_data
                     })
                 else:
@@ -303,6 +314,7 @@ def download_results(process_id):
                     debug_images.append({
                         'filename': filename,
                         'page': file_display,
+                        'process_key': file_key,
                         'data': image_data
                     })
                 else:
@@ -316,6 +328,7 @@ def download_results(process_id):
                 debug_images.append({
                     'filename': filename,
                     'page': '1',
+                    'process_key': process_id,
                     'data': image_data
                 })
             else:
@@ -486,6 +499,8 @@ VALUES ({escape_sql(job.get('工作', ''))}, {escape_sql(job.get('行業', ''))}
         # 5. 處理步驟圖片
         if 'processing_steps' in include_options:
             for debug_img in debug_images:
+                # 延遲模式的處理步驟圖像在此時才渲染
+                ensure_debug_file(debug_img['process_key'], debug_img['data'])
                 # 從本地檔案讀取圖片數據
                 if 'file_path' in debug_img['data'] and os.path.exists(debug_img['data']['file_path']):
                     arcname = f"processing_steps/{debug_img['filename']}"
@@ -7,28 +7,34 @@ import cv2
 import uuid
 import shutil
 import fitz  # PyMuPDF
-import numpy as np
 import gc
+import threading
+import concurrent.futures
+from typing import Optional
 from werkzeug.utils import secure_filename
-from flask import Blueprint, request, flash, redirect, url_for, session
+from flask import Blueprint, request, flash, redirect, url_for, session, jsonify
 from config.settings import Config
 from utils.file_utils import allowed_file
+from utils.pdf_utils import DpiPlan, PageBufferPool, default_page_dpi, plan_page_dpi, load_page_image
 from services.progress_tracker import progress_tracker
 from services.image_processing_service import image_processing_service
+from services.async_extraction import async_extraction_engine
+from services.segmentation_engine import segmentation_engine
 from services import cleanup_service
+from services.job_queue import job_queue, QueueFullError
+from models.storage import image_storage
 
 upload_bp = Blueprint('upload', __name__)
 
 @upload_bp.route('/create_process_id', methods=['POST'])
 def create_process_id():
     """創建新的 process_id 供客戶端使用"""
-    from flask import jsonify
     process_id = str(uuid.uuid4())
     return jsonify({'process_id': process_id})
 
 @upload_bp.route('/upload', methods=['POST'])
 def upload_file():
-    """處理檔案上傳"""
+    """處理檔案上傳：驗證並儲存檔案後排入背景任務佇列，立即返回 process_id"""
     if 'files' not in request.files:
         flash('未選擇檔案', 'danger')
         return redirect(url_for('main.index'))
@@ -46,12 +52,16 @@ def upload_file():
     # 獲取處理選項
     auto_rotate = request.form.get('auto_rotate') == 'true'
     parallel_process = request.form.get('parallel_process') == 'true'
+    debug_artifacts = request.form.get('debug_artifacts', Config.DEBUG_ARTIFACTS)
+    if debug_artifacts not in Config.DEBUG_ARTIFACT_MODES:
+        debug_artifacts = Config.DEBUG_ARTIFACTS
     
-    # 將選項儲存到session中，供處理函數使用
+    # 將選項儲存到session中，供下次上傳使用
     session['auto_rotate'] = auto_rotate
     session['parallel_process'] = parallel_process
+    session['debug_artifacts'] = debug_artifacts
     
-    print(f"處理選項 - 自動校正方向: {auto_rotate}, 並行處理: {parallel_process}")
+    print(f"處理選項 - 自動校正方向: {auto_rotate}, 並行處理: {parallel_process}, 處理步驟圖像: {debug_artifacts}")
     
     # 檢查檔案數量限制
     if len(files) > Config.MAX_FILES_PER_UPLOAD:
@@ -76,48 +86,118 @@ def upload_file():
     if not process_id:
         process_id = str(uuid.uuid4())
     
-    # 初始化進度追蹤
-    progress_tracker.update_progress(process_id, "upload", 5, "開始處理檔案")
-    
     # 創建處理目錄
     process_dir = os.path.join(Config.UPLOAD_FOLDER, process_id)
     os.makedirs(process_dir, exist_ok=True)
     
-    processed_files = []  # 記錄已處理的檔案，用於錯誤時清理
+    saved_files = []
+    for file in valid_files:
+        # 保留原始檔名，並使用 UUID 作為儲存的檔名，但保留原始副檔名
+        original_filename = file.filename
+        _, file_extension = os.path.splitext(original_filename)
+        safe_filename = str(uuid.uuid4()) + file_extension
+        file_path = os.path.join(process_dir, safe_filename)
+        file.save(file_path)
+        saved_files.append({'path': file_path, 'original_filename': original_filename})
+    
+    # 背景工作執行緒無法存取 session，將需要的選項一併放入任務
+    job_payload = {
+        'process_id': process_id,
+        'process_dir': process_dir,
+        'files': saved_files,
+        'api_key': session.get('gemini_api_key', ''),
+        'auto_rotate': auto_rotate,
+        'parallel_process': parallel_process,
+        'debug_artifacts': debug_artifacts
+    }
+    
+    try:
+        job = job_queue.enqueue(process_id, job_payload)
+    except QueueFullError:
+        shutil.rmtree(process_dir, ignore_errors=True)
+        flash('系統目前忙碌中，請稍後再試', 'warning')
+        return redirect(url_for('main.index'))
+    
+    queue_position = job.get('queue_position', 1)
+    progress_tracker.update_progress(process_id, "upload", 5, f"已加入處理佇列（排隊第 {queue_position} 位）")
+    
+    return jsonify({
+        'success': True,
+        'process_id': process_id,
+        'status': job['status'],
+        'queue_position': queue_position,
+        'status_url': url_for('upload.job_status', process_id=process_id),
+        'results_url': url_for('results.show_results', process_id=process_id)
+    }), 202
+
+@upload_bp.route('/job_status/<process_id>')
+def job_status(process_id):
+    """查詢背景處理任務的狀態"""
+    job = job_queue.get_job(process_id)
+    if not job:
+        return jsonify({'error': '任務不存在', 'status': 'unknown'}), 404
+    
+    return jsonify({
+        **job,
+        'progress': progress_tracker.get_progress(process_id),
+        'results_url': url_for('results.show_results', process_id=process_id)
+    })
+
+def _run_upload_job(job_payload: dict):
+    """在背景工作執行緒中處理一次上傳的所有檔案"""
+    process_id = job_payload['process_id']
+    process_dir = job_payload['process_dir']
+    saved_files = job_payload['files']
+    options = {
+        'api_key': job_payload.get('api_key', ''),
+        'auto_rotate': job_payload.get('auto_rotate', True),
+        'parallel_process': job_payload.get('parallel_process', True),
+        'debug_artifacts': job_payload.get('debug_artifacts', Config.DEBUG_ARTIFACTS)
+    }
     
     try:
-        file_counter = 0  # 用於為不同檔案創建唯一的處理ID
-        total_files = len(valid_files)
+        total_files = len(saved_files)
         
         progress_tracker.update_progress(process_id, "upload", 10, f"準備處理 {total_files} 個檔案")
         
-        for file in valid_files:
-            file_counter += 1
-            
-            # 更新檔案處理進度 - 為每個檔案分配合理的進度範圍
-            file_start_progress = int((file_counter - 1) / total_files * 10)  # 當前檔案開始進度
-            file_end_progress = int(file_counter / total_files * 10)  # 當前檔案結束進度
-            progress_tracker.update_progress(process_id, "upload", file_start_progress, f"處理檔案 {file_counter}/{total_files}: {file.filename}")
-            
-            # 保留原始檔名，並產生唯一的儲存檔名
-            original_filename = file.filename
-            _, file_extension = os.path.splitext(original_filename)
-            # 使用 UUID 作為儲存的檔名，但保留原始副檔名
-            safe_filename = str(uuid.uuid4()) + file_extension
-            file_path = os.path.join(process_dir, safe_filename)
-            file.save(file_path)
-            processed_files.append(file_path)
-            
-            # 處理檔案
-            if file_path.lower().endswith('.pdf'):
-                # PDF 處理
-                _process_pdf_file(file_path, original_filename, file_counter, total_files, process_id)
-            else:
-                # 單一圖像處理
-                _process_single_image_file(file_path, original_filename, file_counter, total_files, process_id)
+        # 串流管線：渲染 → 分割 → AI 分析，各階段以有界緩衝銜接
+        # 所有檔案的頁面共用同一個頁面池，交由多進程分割引擎並行處理；
+        # 每頁分割完成後立即排入 AI 分析階段，與後續頁面的渲染和分割重疊執行
+        page_pool = _PagePool(segmentation_engine.max_workers)
+        extraction_stage = _ExtractionStage(process_id, options)
         
-        # 在圖像處理完成後，立即執行 AI 分析
-        _perform_batch_ai_analysis(process_id)
+        try:
+            for file_counter, saved_file in enumerate(saved_files, 1):
+                file_path = saved_file['path']
+                original_filename = saved_file['original_filename']
+                # 延遲產生處理步驟圖像時，頁面會從保留在結果目錄中的原始檔案重新渲染
+                saved_file['source_path'] = _source_file_path(process_id, file_path)
+                
+                # 更新檔案處理進度 - 為每個檔案分配合理的進度範圍
+                file_start_progress = int((file_counter - 1) / total_files * 10)  # 當前檔案開始進度
+                progress_tracker.update_progress(process_id, "upload", file_start_progress, f"處理檔案 {file_counter}/{total_files}: {original_filename}")
+                
+                # 處理檔案
+                if file_path.lower().endswith('.pdf'):
+                    # PDF 處理
+                    _process_pdf_file(file_path, original_filename, file_counter, total_files, process_id, options,
+                                      page_pool, extraction_stage, saved_file['source_path'])
+                else:
+                    # 單一圖像處理
+                    _process_single_image_file(file_path, original_filename, file_counter, total_files, process_id, options,
+                                               page_pool, extraction_stage, saved_file['source_path'])
+        finally:
+            # 等待所有頁面分割完成，再等待已排入的 AI 分析完成
+            try:
+                page_pool.wait()
+            finally:
+                extraction_stage.wait()
+        
+        # AI 分析完成
+        progress_tracker.update_progress(process_id, "analyze", 95, "AI 分析完成")
+        
+        if options['debug_artifacts'] == 'lazy':
+            _preserve_source_files(saved_files)
         
         # 強制垃圾回收以釋放處理過程中的記憶體
         gc.collect()
@@ -132,29 +212,148 @@ def upload_file():
         except Exception as cleanup_error:
             print(f"檔案清理時發生錯誤（不影響主流程）: {str(cleanup_error)}")
         
-        # 處理成功，顯示成功訊息
-        if len(valid_files) > 1:
-            flash(f'成功處理了 {len(valid_files)} 個檔案', 'success')
-        else:
-            flash('檔案處理完成', 'success')
-        
-        # 重定向到結果頁面
-        return redirect(url_for('results.show_results', process_id=process_id))
-        
     except Exception as e:
         progress_tracker.update_progress(process_id, "error", 0, f"處理錯誤: {str(e)}")
-        flash(f'處理檔案時發生錯誤: {str(e)}', 'danger')
-        return redirect(url_for('main.index'))
+        raise
     
     finally:
         # 清理上傳的檔案
-        for file_path in processed_files:
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        for saved_file in saved_files:
+            if os.path.exists(saved_file['path']):
+                os.remove(saved_file['path'])
         if os.path.exists(process_dir):
             shutil.rmtree(process_dir, ignore_errors=True)
 
-def _process_pdf_file(file_path: str, original_filename: str, file_counter: int, total_files: int, process_id: str):
+def _source_file_path(process_id: str, file_path: str) -> str:
+    """延遲模式下保留原始檔案的路徑（位於結果目錄中，隨結果一併清理）"""
+    return os.path.join(Config.RESULTS_FOLDER, process_id, 'sources', os.path.basename(file_path))
+
+def _preserve_source_files(saved_files: list):
+    """將上傳的原始檔案移至結果目錄，供之後渲染處理步驟圖像"""
+    for saved_file in saved_files:
+        try:
+            os.makedirs(os.path.dirname(saved_file['source_path']), exist_ok=True)
+            shutil.move(saved_file['path'], saved_file['source_path'])
+        except Exception as e:
+            print(f"保留原始檔案失敗 {saved_file['original_filename']}: {str(e)}")
+
+class _PagePool:
+    """限制同時處理的頁面數量，讓一次上傳中所有檔案的頁面並行處理"""
+    
+    def __init__(self, max_pages: int, max_pending: int = None):
+        self.max_pages = max_pages
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_pages)
+        # 提交新頁面前需要取得名額（包含排隊中的頁面），避免大量頁面同時佔用記憶體
+        self._slots = threading.BoundedSemaphore(max(max_pages, max_pending or 0))
+        self._futures = []
+    
+    def submit(self, fn, *args):
+        """提交一頁處理，名額用完時會阻塞直到有頁面完成"""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+    
+    def wait(self):
+        """等待所有頁面完成，任一頁失敗時拋出其錯誤"""
+        try:
+            for future in concurrent.futures.as_completed(self._futures):
+                future.result()
+        finally:
+            self._executor.shutdown(wait=True)
+
+class _ExtractionStage(_PagePool):
+    """AI 分析階段：頁面分割完成後立即將其區塊分組排入整次上傳共用的線程池，並累計整次上傳的分析進度
+    
+    所有頁面的區塊組共用 Config.MAX_WORKERS 個線程，區塊少的頁面不會讓線程閒置而其他頁面在等待；
+    EXTRACTION_ENGINE 為 asyncio 時區塊組直接交給非同步提取引擎，不建立線程池，
+    待分析的區塊組數由引擎限制（所有上傳合計）
+    """
+    
+    def __init__(self, process_id: str, options: dict):
+        self.use_async_engine = Config.EXTRACTION_ENGINE == 'asyncio' and options['parallel_process']
+        if self.use_async_engine:
+            self._futures = []
+        else:
+            max_workers = Config.MAX_WORKERS if options['parallel_process'] else 1
+            # 緩衝區滿時分割階段會阻塞，避免分割遠快於 AI 分析時累積過多待分析的區塊
+            super().__init__(max_workers, max_pending=max_workers * 2)
+        self.process_id = process_id
+        self.options = options
+        self._lock = threading.Lock()
+        self._queued_images = 0
+        self._analyzed_images = 0
+    
+    def submit_page(self, page_process_id: str, processed_files: list):
+        """將一頁的區塊分組後排入 AI 分析（處理步驟圖像不分析）"""
+        filenames = [fname for fname in processed_files
+                     if not any(debug_type in fname for debug_type in ['_original', '_mask_', '_final_combined'])]
+        if not filenames:
+            return
+        with self._lock:
+            self._queued_images += len(filenames)
+        for image_group in image_processing_service.plan_image_groups(page_process_id, filenames):
+            if self.use_async_engine:
+                # 引擎中待分析的區塊組達上限時會阻塞，直到有區塊組完成
+                self._futures.append(async_extraction_engine.run(self._analyze_group_async(page_process_id, image_group)))
+            else:
+                self.submit(self._analyze_group, page_process_id, image_group)
+    
+    def wait(self):
+        """等待所有區塊組分析完成，任一組失敗時拋出其錯誤"""
+        if not self.use_async_engine:
+            super().wait()
+            return
+        for future in concurrent.futures.as_completed(self._futures):
+            future.result()
+    
+    def _analyze_group(self, page_process_id: str, image_group: list):
+        descriptions = image_processing_service.analyze_image_group(self.options['api_key'], page_process_id, image_group)
+        self._record_descriptions(page_process_id, image_group, descriptions)
+    
+    async def _analyze_group_async(self, page_process_id: str, image_group: list):
+        descriptions = await image_processing_service.analyze_image_group_async(self.options['api_key'], page_process_id, image_group)
+        self._record_descriptions(page_process_id, image_group, descriptions)
+    
+    def _record_descriptions(self, page_process_id: str, image_group: list, descriptions: dict):
+        # 儲存AI分析結果
+        for filename, description in descriptions.items():
+            image_data = image_storage.get_image(page_process_id, filename)
+            if image_data is not None:
+                image_data['description'] = description
+        
+        with self._lock:
+            self._analyzed_images += len(image_group)
+            analyzed_images, queued_images = self._analyzed_images, self._queued_images
+        
+        # 更新 AI 分析進度 (60-95%) - 使用整次上傳的進度
+        progress = 60 + int(analyzed_images / queued_images * 35)
+        progress_tracker.update_progress(self.process_id, "analyze", progress, f"已分析 {analyzed_images}/{queued_images} 張圖片")
+
+def _process_page(extraction_stage: _ExtractionStage, page_buffers: Optional[PageBufferPool], image, page_process_id: str, *process_args):
+    """分割單一頁面，完成後立即將其區塊交給 AI 分析階段"""
+    try:
+        processed_files = image_processing_service.process_image_data(image, page_process_id, *process_args)
+    finally:
+        # 分割與輸出都已完成，頁面緩衝區可交給下一頁重複使用
+        if page_buffers is not None:
+            page_buffers.release(image)
+    extraction_stage.submit_page(page_process_id, processed_files)
+
+def _plan_page_dpi(page) -> DpiPlan:
+    """選擇 PDF 頁面的渲染 DPI（見 Config.PDF_ADAPTIVE_DPI）"""
+    if not Config.PDF_ADAPTIVE_DPI:
+        return DpiPlan(default_page_dpi(page), 1.0)
+    dpi_plan = plan_page_dpi(page, min_dpi=Config.PDF_MIN_DPI, min_glyph_pixels=Config.PDF_MIN_GLYPH_PIXELS)
+    print(f"PDF 頁面渲染 DPI：{dpi_plan.dpi}（原規則的 {dpi_plan.resolution_scale:.0%}）")
+    return dpi_plan
+
+def _process_pdf_file(file_path: str, original_filename: str, file_counter: int, total_files: int, process_id: str, options: dict,
+                      page_pool: _PagePool, extraction_stage: _ExtractionStage, source_path: str):
     """處理PDF檔案"""
     # PDF 處理 - 為每個檔案分配10-60%範圍內的子進度
     file_process_start = 10 + int((file_counter - 1) / total_files * 50)  # 當前檔案在10-60%範圍內的起始點
@@ -165,6 +364,8 @@ def _process_pdf_file(file_path: str, original_filename: str, file_counter: int,
     # 使用原始檔名（不含副檔名）作為基礎名稱
     pdf_base_name = os.path.splitext(original_filename)[0]
     total_pages = len(pdf_document)
+    # 同一份 PDF 的頁面尺寸通常相同，完成的頁面緩衝區留給後續頁面重複使用
+    page_buffers = PageBufferPool(max_buffers=page_pool.max_pages)
     
     for page_num in range(total_pages):
         # 計算當前頁面在當前檔案進度範圍內的位置
@@ -173,19 +374,9 @@ def _process_pdf_file(file_path: str, original_filename: str, file_counter: int,
         progress_tracker.update_progress(process_id, "process", current_progress, f"處理檔案 {file_counter}/{total_files} 第 {page_num + 1}/{total_pages} 頁")
         
         page = pdf_document.load_page(page_num)
-        page_rect = page.rect
-        width_inch = page_rect.width / 72
-        height_inch = page_rect.height / 72
-        suggested_dpi = max(300, int(2000 / max(width_inch, height_inch)))
-        pix = page.get_pixmap(dpi=suggested_dpi, alpha=False, annots=True)
-        
-        # 轉換為 OpenCV 格式
-        img_array = np.frombuffer(pix.samples, dtype=np.uint8)
-        image = img_array.reshape((pix.height, pix.width, pix.n))
-        if pix.n == 3:  # RGB
-            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-        elif pix.n == 4:  # RGBA
-            image = cv2.cvtColor(image, cv2.COLOR_RGBA2BGR)
+        dpi_plan = _plan_page_dpi(page)
+        # 掃描頁直接解碼嵌入圖片，其餘頁面從 Pixmap 記憶體轉換並重複使用已釋放的頁面緩衝區
+        image = load_page_image(page, dpi_plan.dpi, page_buffers)
         
         if image is not None:
             # 為多檔案場景調整處理ID和圖片名稱
@@ -203,23 +394,27 @@ def _process_pdf_file(file_path: str, original_filename: str, file_counter: int,
             page_progress_range = max(1, int(file_process_range / total_pages))  # 確保至少有1%的進度範圍
             
             # 獲取處理選項
-            api_key = session.get('gemini_api_key', '')
-            auto_rotate = session.get('auto_rotate', True)
+            api_key = options['api_key']
+            auto_rotate = options['auto_rotate']
             
-            image_processing_service.process_image_data(
+            page_pool.submit(
+                _process_page, extraction_stage, page_buffers,
                 image, page_process_id, image_name, 
                 page_progress_start, page_progress_range,
-                api_key, auto_rotate, Config.RESULTS_FOLDER
+                api_key, auto_rotate, Config.RESULTS_FOLDER,
+                options['debug_artifacts'], {'path': source_path, 'page_number': page_num, 'dpi': dpi_plan.dpi},
+                dpi_plan.resolution_scale
             )
             
-            # 立即釋放頁面圖像記憶體
-            del image, img_array, pix
+            # 頁面圖像由處理執行緒持有，這裡只釋放本地引用
+            del image
     
     pdf_document.close()
     # 強制垃圾回收以釋放 PDF 處理記憶體
     gc.collect()
 
-def _process_single_image_file(file_path: str, original_filename: str, file_counter: int, total_files: int, process_id: str):
+def _process_single_image_file(file_path: str, original_filename: str, file_counter: int, total_files: int, process_id: str, options: dict,
+                               page_pool: _PagePool, extraction_stage: _ExtractionStage, source_path: str):
     """處理單一圖像檔案"""
     # 單一圖像處理 - 為每個檔案分配10-60%範圍內的子進度
     file_process_start = 10 + int((file_counter - 1) / total_files * 50)  # 當前檔案在10-60%範圍內的起始點
@@ -238,75 +433,20 @@ def _process_single_image_file(file_path: str, original_filename: str, file_coun
             image_process_id = process_id
         
         # 獲取處理選項
-        api_key = session.get('gemini_api_key', '')
-        auto_rotate = session.get('auto_rotate', True)
+        api_key = options['api_key']
+        auto_rotate = options['auto_rotate']
         
         # 傳遞進度範圍給process_image_data函數
-        image_processing_service.process_image_data(
+        page_pool.submit(
+            _process_page, extraction_stage, None,
             image, image_process_id, image_name, 
             file_process_start, file_process_range,
-            api_key, auto_rotate, Config.RESULTS_FOLDER
+            api_key, auto_rotate, Config.RESULTS_FOLDER,
+            options['debug_artifacts'], {'path': source_path, 'page_number': None}
         )
         
-        # 立即釋放圖像記憶體
+        # 圖像由處理執行緒持有，這裡只釋放本地引用
         del image
-        gc.collect()
 
-def _perform_batch_ai_analysis(process_id: str):
-    """執行批量 AI 分析"""
-    from models.storage import image_storage
-    
-    progress_tracker.update_progress(process_id, "analyze", 60, "開始 AI 分析")
-    
-    # 收集所有需要分析的圖片
-    batch_analysis_requests = {}  # {process_key: [filenames]}
-    
-    # 檢查是否為PDF或多檔案
-    pdf_page_keys = [key for key in image_storage._storage.keys() if key.startswith(f"{process_id}_page")]
-    multi_file_keys = [key for key in image_storage._storage.keys() if key.startswith(f"{process_id}_file")]
-    
-    if pdf_page_keys or multi_file_keys or process_id in image_storage._storage:
-        # 處理PDF頁面
-        for page_key in pdf_page_keys:
-            filenames = [fname for fname in image_storage._storage[page_key].keys() 
-                       if not any(debug_type in fname for debug_type in ['_original', '_mask_', '_final_combined'])]
-            if filenames:
-                batch_analysis_requests[page_key] = filenames
-        
-        # 處理多檔案
-        for file_key in multi_file_keys:
-            filenames = [fname for fname in image_storage._storage[file_key].keys() 
-                       if not any(debug_type in fname for debug_type in ['_original', '_mask_', '_final_combined'])]
-            if filenames:
-                batch_analysis_requests[file_key] = filenames
-        
-        # 處理單一圖像
-        if process_id in image_storage._storage and not pdf_page_keys and not multi_file_keys:
-            filenames = [fname for fname in image_storage._storage[process_id].keys() 
-                       if not any(debug_type in fname for debug_type in ['_original', '_mask_', '_final_combined'])]
-            if filenames:
-                batch_analysis_requests[process_id] = filenames
-        
-        # 執行批量AI分析
-        total_images = sum(len(filenames) for filenames in batch_analysis_requests.values())
-        if total_images > 0:
-            progress_tracker.update_progress(process_id, "analyze", 65, f"準備分析 {total_images} 張圖片")
-            
-            api_key = session.get('gemini_api_key', '')
-            parallel_process = session.get('parallel_process', True)
-            processed_images = 0
-            
-            for process_key, filenames in batch_analysis_requests.items():
-                if filenames:
-                    descriptions = image_processing_service.analyze_images_batch(
-                        process_key, filenames, api_key, processed_images, total_images, parallel_process
-                    )
-                    processed_images += len(filenames)
-                    
-                    # 儲存AI分析結果
-                    for filename, description in descriptions.items():
-                        if process_key in image_storage._storage and filename in image_storage._storage[process_key]:
-                            image_storage._storage[process_key][filename]['description'] = description
-    
-    # AI 分析完成
-    progress_tracker.update_progress(process_id, "analyze", 95, "AI 分析完成") 
\ No newline at end of file
+# 註冊背景任務的處理函數
+job_queue.set_handler(_run_upload_job)
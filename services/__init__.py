@@ -6,6 +6,11 @@ from .progress_tracker import ProgressTracker, progress_tracker
 from .ai_service import AIService, ai_service
 from .image_processing_service import ImageProcessingService, image_processing_service
 from .cleanup_service import CleanupService
+from .job_queue import JobQueue, QueueFullError, job_queue
+from .result_cache import ResultCache, extraction_cache, orientation_cache
+from .rate_limiter import RequestScheduler, gemini_scheduler
+from .job_prefilter import JobPrefilter, job_prefilter
+from .async_extraction import AsyncExtractionEngine, async_extraction_engine
 
 # 創建清理服務實例
 cleanup_service = CleanupService(image_storage=image_storage, progress_tracker=progress_tracker)
@@ -18,5 +23,17 @@ __all__ = [
     'ImageProcessingService',
     'image_processing_service',
     'CleanupService',
-    'cleanup_service'
+    'cleanup_service',
+    'JobQueue',
+    'QueueFullError',
+    'job_queue',
+    'ResultCache',
+    'extraction_cache',
+    'orientation_cache',
+    'RequestScheduler',
+    'gemini_scheduler',
+    'JobPrefilter',
+    'job_prefilter',
+    'AsyncExtractionEngine',
+    'async_extraction_engine'
 ] 
\ No newline at end of file
@@ -2,21 +2,86 @@
 AI 分析服務
 使用 Google Gemini API 進行圖片方向檢測和工作資訊提取
 """
+import os
+import math
 import cv2
 import numpy as np
 import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.api_core import gapic_v1
 from PIL import Image
-import json
 import time
 import re
+import threading
 import concurrent.futures
+from collections import OrderedDict
 from functools import partial
 from typing import Tuple, Dict, List, Any, Optional
 from config.settings import Config
+from services import gemini_client
+from services.orientation_estimator import ORIENTATIONS, estimate_orientation
+from services.result_cache import extraction_cache, file_content_hash
+from services.job_prefilter import job_prefilter
+from services.answer_parser import parse_json_answer, strip_code_fence
+from services.block_encoder import EncodedBlock, encode_block_image
+from services.rate_limiter import gemini_scheduler, estimate_request_tokens, PRIORITY_ORIENTATION, PRIORITY_EXTRACTION
 
 class AIService:
     """AI 分析服務類"""
     
+    # 工作資訊提取提示詞的版本，修改提示詞、輸出格式或快取內容的格式時需遞增，使舊的快取結果失效
+    JOB_PROMPT_VERSION = 2
+    
+    # 工作資訊的欄位
+    JOB_FIELDS = ["工作", "行業", "時間", "薪資", "地點", "聯絡方式", "其他"]
+    
+    # 單一區塊的工作資訊提取提示詞
+    JOB_PROMPT = """請先仔細判斷這張圖片是否包含工作招聘、求職、就業相關的資訊。
+
+如果這張圖片不是工作相關的內容（例如：純粹的新聞報導、廣告、商品資訊、活動公告等），請回答空陣列 []。
+
+如果這張圖片確實包含工作招聘或就業相關資訊，請分析其中的所有工作崗位，並以JSON格式回答，包含一個工作列表，每個工作包含以下欄位：
+- 工作：工作職位或職業名稱
+- 行業：根據工作內容判斷屬於以下哪個行業分類，必須從下列選項中選擇一個：
+    "農、林、漁、牧業"、"礦業及土石採取業"、"製造業"、"電力及燃氣供應業"、"用水供應及污染整治業"、"營建工程業"、"批發及零售業"、"運輸及倉儲業"、"住宿及餐飲業"、"出版影音及資通訊業"、"金融及保險業"、"不動產業"、"專業、科學及技術服務業"、"支援服務業"、"公共行政及國防；強制性社會安全"、"教育業"、"醫療保健及社會工作服務業"、"藝術、娛樂及休閒服務業"、"其他服務業"
+- 時間：工作時間或營業時間
+- 薪資：薪資待遇或收入
+- 地點：工作地點或地址
+- 聯絡方式：電話、地址或其他聯絡資訊
+- 其他：其他相關資訊或備註
+
+請用繁體中文回答，如果某個欄位沒有資訊請填入空字串。行業欄位必須從上述19個分類中選擇最合適的一個。
+請直接回答JSON格式的工作列表，不要包含其他說明文字。
+
+工作相關內容的範例格式：
+[
+    {
+        "工作": "服務員",
+        "行業": "住宿及餐飲業",
+        "時間": "9:00-18:00",
+        "薪資": "時薪160元起",
+        "地點": "台北市信義區",
+        "聯絡方式": "02-1234-5678",
+        "其他": "需輪班"
+    }
+]
+
+非工作相關內容請回答：[]
+
+重要提醒：
+- 只有明確的工作招聘、求職、徵人啟事才算工作相關
+- 純粹的商業廣告、新聞報導、產品介紹不算工作相關
+- 如果圖片內容模糊不清或無法確定，請回答 []"""
+    
+    # 多個區塊合併為一次請求時的提示詞，每張圖片前面有代號，回答以代號為鍵的 JSON 物件
+    BATCH_JOB_PROMPT = """以下共有 {count} 張報紙區塊圖片，每張圖片前面都標示了它的代號（{labels}）。請依照下列規則分別分析每一張圖片：
+
+{job_prompt}
+
+請將所有圖片的結果合併成一個 JSON 物件回答：鍵為圖片代號，值為該圖片依上述規則得到的工作列表（非工作相關的圖片為 []），每個代號都必須出現，例如：
+{{"B1": [{{"工作": "服務員", "行業": "住宿及餐飲業", "時間": "", "薪資": "", "地點": "", "聯絡方式": "", "其他": ""}}], "B2": []}}
+請直接回答 JSON 物件，不要包含其他說明文字。"""
+    
     def __init__(self):
         self.model_name = Config.GEMINI_MODEL_NAME
         self.vision_model = Config.GEMINI_VISION_MODEL
@@ -25,6 +90,12 @@ class AIService:
         self.top_p = Config.GEMINI_TOP_P
         self.max_workers = Config.MAX_WORKERS
         self.progress_tracker = None  # 將在後續設置
+        self.extraction_cache = extraction_cache
+        self.job_prefilter = job_prefilter
+        self.scheduler = gemini_scheduler  # 所有 Gemini 請求共用的速率控制
+        # 依 API 密鑰保存的連線與模型（最近使用的排在最後），所有執行緒共用
+        self._clients: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._clients_lock = threading.Lock()
     
     def set_progress_tracker(self, progress_tracker):
         """設置進度追蹤器"""
@@ -69,61 +140,76 @@ class AIService:
             
         return error_info
     
-    def wait_with_progress_update(self, process_id: str, wait_seconds: int, error_info: Dict[str, Any]):
-        """等待重試延遲時間，並更新進度顯示"""
-        if not self.progress_tracker:
+    def notify_rate_limit(self, process_id: Optional[str], wait_seconds: int, error_info: Dict[str, Any]) -> None:
+        """通知前端請求頻率超限，重試前的等待由排程器處理（不在這裡佔用執行緒倒數）"""
+        if not (process_id and self.progress_tracker):
             print(f"等待 {wait_seconds} 秒後重試...")
-            time.sleep(wait_seconds)
             return
-            
         quota_info = ""
         if error_info['quota_metric']:
             quota_info = f"（限制: {error_info['quota_value']}/分鐘）"
-            
-        for remaining in range(wait_seconds, 0, -1):
-            description = f"API 請求頻率超限{quota_info}，等待 {remaining} 秒後自動重試..."
-            self.progress_tracker.update_progress(
-                process_id, 
-                "analyze", 
-                70,  # 固定在70%顯示等待狀態
-                description
-            )
-            time.sleep(1)
-            
-        # 重試前的訊息
         self.progress_tracker.update_progress(
-            process_id, 
-            "analyze", 
-            75, 
-            "重新嘗試 API 請求..."
+            process_id, "analyze", 70, f"API 請求頻率超限{quota_info}，等待 {wait_seconds} 秒後自動重試..."
         )
-
+    
     def configure_api(self, api_key: str) -> None:
         """配置 Gemini API"""
         genai.configure(api_key=api_key)
     
-    def evaluate_single_orientation(self, api_key: str, orientation_name: str, rotated_image: np.ndarray, process_id: Optional[str] = None, max_retries: int = None) -> Tuple[str, float]:
-        """評估單個方向的圖片 - 用於多線程處理，支援重試機制"""
+    def get_model(self, api_key: str, model_name: str, generation_config: Optional[Dict[str, Any]] = None) -> gemini_client.GeminiModel:
+        """取得綁定 API 密鑰的模型，相同的 (密鑰, 模型, 生成設定) 只建立一次並在所有執行緒間共用
+        
+        不使用 genai.configure 的全域設定，多位使用者以不同密鑰同時處理時不會互相覆蓋；
+        每個密鑰保留一條連線，最多保存 GEMINI_CLIENT_POOL_SIZE 個密鑰
+        """
+        model_key = (model_name, tuple(sorted((generation_config or {}).items())))
+        with self._clients_lock:
+            entry = self._clients.get(api_key)
+            if entry is None:
+                entry = self._clients[api_key] = {'client': self.create_client(api_key), 'models': {}}
+                while len(self._clients) > Config.GEMINI_CLIENT_POOL_SIZE:
+                    self._clients.popitem(last=False)
+            self._clients.move_to_end(api_key)
+            
+            model = entry['models'].get(model_key)
+            if model is None:
+                model = gemini_client.GeminiModel(model_name, generation_config, client=entry['client'])
+                entry['models'][model_key] = model
+        return model
+    
+    def create_client(self, api_key: str, asynchronous: bool = False):
+        """建立綁定 API 密鑰的 Gemini 連線"""
+        client_info = gapic_v1.client_info.ClientInfo(user_agent=f"genai-py/{genai.__version__}")
+        client_class = glm.GenerativeServiceAsyncClient if asynchronous else glm.GenerativeServiceClient
+        return client_class(client_options={'api_key': api_key}, client_info=client_info)
+    
+    def encode_orientation_thumbnails(self, image: np.ndarray, orientation_names: List[str]) -> Dict[str, bytes]:
+        """將圖片縮小為縮圖後，依各方向旋轉並編碼為 JPEG（每個方向只編碼一次，重試時重複使用）"""
+        long_side = Config.ORIENTATION_THUMBNAIL_SIZE
+        scale = long_side / max(image.shape[:2])
+        thumbnail = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else image
+        encode_params = [cv2.IMWRITE_JPEG_QUALITY, Config.ORIENTATION_JPEG_QUALITY]
+        return {
+            name: cv2.imencode('.jpg', self.apply_rotation_to_image(thumbnail, name), encode_params)[1].tobytes()
+            for name in orientation_names
+        }
+    
+    def evaluate_single_orientation(self, api_key: str, orientation_name: str, image_jpeg: bytes, process_id: Optional[str] = None, max_retries: int = None) -> Tuple[str, Optional[float]]:
+        """評估單個方向的圖片（已編碼的 JPEG 縮圖）- 用於多線程處理，支援重試機制
+        
+        請求失敗或無法解析分數時分數為 None
+        """
         
         if max_retries is None:
             max_retries = Config.GEMINI_ORIENTATION_MAX_RETRIES
         
         for retry_attempt in range(max_retries + 1):
             try:
-                # 為每個線程創建獨立的 API 配置
-                genai.configure(api_key=api_key)
-                MODEL = genai.GenerativeModel(
-                    self.vision_model,
-                    generation_config={
-                        "temperature": self.temperature,
-                        "top_k": self.top_k,
-                        "top_p": self.top_p
-                    }
-                )
-                
-                # 將OpenCV圖片轉換為PIL格式
-                image_rgb = cv2.cvtColor(rotated_image, cv2.COLOR_BGR2RGB)
-                pil_image = Image.fromarray(image_rgb)
+                MODEL = self.get_model(api_key, self.vision_model, {
+                    "temperature": self.temperature,
+                    "top_k": self.top_k,
+                    "top_p": self.top_p
+                })
                 
                 # 調用Gemini API進行評分
                 prompt = """你是一位專業的報紙排版分析師。請判斷這張圖片中的報紙內容是否為正常的閱讀方向。主要依據以下幾點：
@@ -140,7 +226,9 @@ class AIService:
 
 請「僅僅」回覆一個「阿拉伯數字」表示的分數（例如：8.5 或 7），「絕對不要」包含任何其他文字、標點符號、空格或額外說明。"""
                 
-                response = MODEL.generate_content([prompt, pil_image])
+                thumbnail_size = (Config.ORIENTATION_THUMBNAIL_SIZE, Config.ORIENTATION_THUMBNAIL_SIZE)
+                self.scheduler.acquire(api_key, self.vision_model, PRIORITY_ORIENTATION, estimate_request_tokens(prompt, [thumbnail_size], output_tokens=10))
+                response = MODEL.generate_content([prompt, {'mime_type': 'image/jpeg', 'data': image_jpeg}])
                 
                 # 獲取評分
                 score_text = response.text.strip()
@@ -150,7 +238,7 @@ class AIService:
                     cleaned_score_text = re.sub(r'[^\d.]', '', score_text)
                     if not cleaned_score_text:
                         print(f"無法從 {orientation_name} 回應中提取分數: '{score_text}'")
-                        return orientation_name, 1.0
+                        return orientation_name, None
 
                     score = float(cleaned_score_text)
                     # 確保分數在1-10範圍內
@@ -159,7 +247,7 @@ class AIService:
                     return orientation_name, score
                 except ValueError:
                     print(f"無法解析{orientation_name}的分數: {score_text}")
-                    return orientation_name, 1.0
+                    return orientation_name, None
                     
             except Exception as e:
                 error_message = str(e)
@@ -175,8 +263,8 @@ class AIService:
                     
                     print(f"方向檢測 API 限制錯誤，第 {retry_count} 次重試，剩餘 {remaining_retries} 次重試機會")
                     
-                    # 等待重試（方向檢測通常不需要太長時間，縮短等待時間）
-                    wait_time = min(error_info['retry_delay'], 30)  # 最多等待30秒
+                    # 設定共用的退避時間（方向檢測通常不需要太長時間，縮短等待時間），重試時由排程器等待
+                    wait_time = round(self.scheduler.report_rate_limit(api_key, self.vision_model, min(error_info['retry_delay'], 30)))  # 最多等待30秒
                     if process_id and self.progress_tracker:
                         # 簡化的等待訊息
                         self.progress_tracker.update_progress(
@@ -185,40 +273,118 @@ class AIService:
                             30, 
                             f"方向檢測遇到限制，等待 {wait_time} 秒後重試..."
                         )
-                        time.sleep(wait_time)
-                    else:
-                        time.sleep(wait_time)
                     
                     continue  # 重試
                 else:
                     # 非限制錯誤或重試次數已用完
-                    return orientation_name, 1.0
+                    return orientation_name, None
         
         # 重試次數用完
-        return orientation_name, 1.0
+        return orientation_name, None
+    
+    def choose_orientation(self, api_key: str, thumbnails: Dict[str, bytes], process_id: Optional[str] = None, max_retries: int = None) -> Optional[str]:
+        """在一次請求中比較所有候選方向的縮圖，返回最佳方向；無法解析回應時返回 None"""
+        
+        if max_retries is None:
+            max_retries = Config.GEMINI_ORIENTATION_MAX_RETRIES
+        
+        # 以字母標示每張縮圖，模型只需回覆字母，不必理解旋轉方向的名稱
+        labels = {chr(ord('A') + index): name for index, name in enumerate(thumbnails)}
+        prompt = f"""你是一位專業的報紙排版分析師。以下 {len(labels)} 張圖片是同一張報紙旋轉成不同方向的結果，分別標示為 {"、".join(labels)}。
+請依據標題與內文文字是否水平易讀、欄位排列與圖片中的人物或物體方向，選出閱讀方向完全正確的一張。
+
+請「僅僅」回覆一個大寫字母（例如：A），「絕對不要」包含任何其他文字、標點符號、空格或額外說明。"""
+        contents = [prompt]
+        for label, name in labels.items():
+            contents += [f"圖片 {label}：", {'mime_type': 'image/jpeg', 'data': thumbnails[name]}]
+        
+        for retry_attempt in range(max_retries + 1):
+            try:
+                MODEL = self.get_model(api_key, self.vision_model, {
+                    "temperature": self.temperature,
+                    "top_k": self.top_k,
+                    "top_p": self.top_p
+                })
+                
+                thumbnail_size = (Config.ORIENTATION_THUMBNAIL_SIZE, Config.ORIENTATION_THUMBNAIL_SIZE)
+                self.scheduler.acquire(api_key, self.vision_model, PRIORITY_ORIENTATION, estimate_request_tokens(prompt, [thumbnail_size] * len(labels), output_tokens=10))
+                response = MODEL.generate_content(contents)
+                answer_text = response.text.strip()
+                
+                match = re.search(r'(?<![A-Z])([A-Z])(?![A-Z])', answer_text.upper())
+                if not match or match.group(1) not in labels:
+                    print(f"無法從方向選擇回應中解析圖片標示: '{answer_text}'")
+                    return None
+                
+                best_name = labels[match.group(1)]
+                print(f"單次請求選擇方向: {best_name} (原始回應: '{answer_text}')")
+                return best_name
+                
+            except Exception as e:
+                error_message = str(e)
+                print(f"選擇方向時出錯: {error_message}")
+                
+                error_info = self.parse_api_error(error_message)
+                
+                if error_info['is_rate_limit'] and retry_attempt < max_retries:
+                    retry_count = retry_attempt + 1
+                    remaining_retries = max_retries - retry_attempt
+                    
+                    print(f"方向檢測 API 限制錯誤，第 {retry_count} 次重試，剩餘 {remaining_retries} 次重試機會")
+                    
+                    # 設定共用的退避時間，重試時由排程器等待
+                    wait_time = round(self.scheduler.report_rate_limit(api_key, self.vision_model, min(error_info['retry_delay'], 30)))  # 最多等待30秒
+                    if process_id and self.progress_tracker:
+                        self.progress_tracker.update_progress(
+                            process_id, 
+                            "process", 
+                            30, 
+                            f"方向檢測遇到限制，等待 {wait_time} 秒後重試..."
+                        )
+                    
+                    continue  # 重試
+                else:
+                    return None
+        
+        return None
     
-    def check_image_orientation(self, image: np.ndarray, api_key: str, parallel_process: bool = True, process_id: Optional[str] = None) -> str:
-        """檢查圖片方向，返回需要旋轉的方向信息"""
+    def check_image_orientation(self, image: np.ndarray, api_key: str, parallel_process: bool = True, process_id: Optional[str] = None) -> Tuple[str, bool]:
+        """檢查圖片方向，返回 (需要旋轉的方向, 是否確實判定)
+        
+        先以本地文字行分析估計方向；信心不足時只將剩餘的候選方向送 Gemini 評分（ORIENTATION_MODE 為 gemini 時評分全部四個方向）。
+        ORIENTATION_SCORING 為 single 時所有候選方向在一次請求中比較，separate 時每個方向分別評分。
+        沒有密鑰、請求失敗或無法解析回應時使用預設方向並標示為未判定，呼叫端不應快取這類結果
+        """
+        mode = Config.ORIENTATION_MODE
+        candidates = list(ORIENTATIONS)
+        if mode != 'gemini':
+            estimate = estimate_orientation(image)
+            if mode == 'local' or estimate.confidence >= Config.ORIENTATION_MIN_CONFIDENCE:
+                return estimate.direction, True
+            candidates = estimate.candidates
         
         if not api_key:
+            # 信心不足的本地估計不足以旋轉頁面，維持原方向
             print("未設置Gemini API密鑰，跳過方向檢查")
-            return "正確"
+            return "正確", False
         
         try:
-            # 生成四個方向的圖片
-            orientations = {
-                "正確": image,
-                "順時針90度": cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE),
-                "180度": cv2.rotate(image, cv2.ROTATE_180),
-                "逆時針90度": cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-            }
+            # 生成候選方向的縮圖（不複製整頁圖片）
+            orientations = self.encode_orientation_thumbnails(image, candidates)
+            
+            if Config.ORIENTATION_SCORING == 'single':
+                # 所有候選方向放在同一個請求中比較，每頁只需一次 API 呼叫
+                best_name = self.choose_orientation(api_key, orientations, process_id)
+                if best_name is None:
+                    return candidates[0], False
+                return best_name, True
             
             if parallel_process:
-                print("開始並行分析四個方向的圖片...")
+                print(f"開始並行分析 {len(orientations)} 個方向的圖片...")
                 start_time = time.time()
                 
                 # 使用線程池並行處理
-                with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=len(orientations)) as executor:
                     # 創建部分函數，綁定 api_key 和 process_id
                     evaluate_func = partial(self.evaluate_single_orientation, api_key, process_id=process_id)
                     
@@ -237,31 +403,31 @@ class AIService:
                 elapsed_time = time.time() - start_time
                 print(f"並行分析完成，耗時: {elapsed_time:.2f} 秒")
             else:
-                print("開始順序分析四個方向的圖片...")
+                print(f"開始順序分析 {len(orientations)} 個方向的圖片...")
                 start_time = time.time()
                 
                 scores = {}
-                for orientation_name, rotated_image in orientations.items():
+                for orientation_name, image_jpeg in orientations.items():
                     orientation_name, score = self.evaluate_single_orientation(
-                        api_key, orientation_name, rotated_image, process_id
+                        api_key, orientation_name, image_jpeg, process_id
                     )
                     scores[orientation_name] = score
                 
                 elapsed_time = time.time() - start_time
                 print(f"順序分析完成，耗時: {elapsed_time:.2f} 秒")
             
-            # 找出最高分的方向
-            best_orientation = max(scores.items(), key=lambda x: x[1])
+            # 找出最高分的方向（評分失敗的方向以最低分計）；有方向未能評分時結果不算確實判定
+            best_orientation = max(scores.items(), key=lambda x: 1.0 if x[1] is None else x[1])
             best_name, best_score = best_orientation
             
             print(f"所有方向評分: {scores}")
             print(f"最佳方向: {best_name} (分數: {best_score})")
             
-            return best_name
+            return best_name, all(score is not None for score in scores.values())
             
         except Exception as e:
             print(f"檢查圖片方向時出錯: {str(e)}")
-            return "正確"
+            return "正確", False
     
     def apply_rotation_to_image(self, image: np.ndarray, rotation_direction: str) -> np.ndarray:
         """根據旋轉方向旋轉圖片"""
@@ -278,8 +444,106 @@ class AIService:
             print(f"未知的旋轉方向: {rotation_direction}，保持原圖")
             return image
     
-    def analyze_job_from_image(self, api_key: str, image_path: str, process_id: Optional[str] = None, max_retries: int = None) -> List[Dict[str, Any]]:
-        """從圖片中分析工作資訊，支援 API 限制錯誤重試"""
+    def normalize_jobs(self, description_json: Any) -> List[Dict[str, Any]]:
+        """將模型回答的工作資訊整理為列表，補齊缺少的欄位；沒有工作時返回提示項目"""
+        # 包在單一欄位中的列表（例如 {"工作列表": [...]}）取出列表
+        if isinstance(description_json, dict) and len(description_json) == 1:
+            value = next(iter(description_json.values()))
+            if isinstance(value, list):
+                description_json = value
+        
+        # 確保返回的是列表
+        if not isinstance(description_json, list):
+            # 如果返回的是單一物件，轉換為列表
+            if isinstance(description_json, dict):
+                description_json = [description_json]
+            else:
+                description_json = []
+        
+        # 確保每個工作物件都有所有必要欄位
+        for job in description_json:
+            if isinstance(job, dict):
+                for field in self.JOB_FIELDS:
+                    if field not in job:
+                        job[field] = ""
+        
+        # 如果沒有工作，返回一個空的提示
+        if not description_json:
+            description_json = [{
+                "工作": "未識別到工作資訊",
+                "行業": "",
+                "時間": "",
+                "薪資": "",
+                "地點": "",
+                "聯絡方式": "",
+                "其他": "此圖片可能不包含就業相關資訊"
+            }]
+        return description_json
+    
+    def parse_job_answer(self, answer_text: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """解析單一區塊的回答，返回 (工作列表, 是否完整解析)
+        
+        回答被截斷時保留已完整的工作但不算完整解析（不快取）；完全無法解析時將回答文字放在「其他」欄位
+        """
+        description_json, complete = parse_json_answer(answer_text)
+        if description_json is not None:
+            if not complete:
+                print("回應不完整，保留已完整的工作資訊")
+            return self.normalize_jobs(description_json), complete
+        return [{
+            "工作": "",
+            "行業": "",
+            "時間": "",
+            "薪資": "",
+            "地點": "",
+            "聯絡方式": "",
+            "其他": strip_code_fence(answer_text)
+        }], False
+    
+    def parse_batch_answer(self, answer_text: str, labels: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """解析批次請求的回答為 {代號: 工作列表}；無法解析時返回空字典，缺少的代號不會出現在結果中
+        
+        回答被截斷時保留已完整回答的代號，其餘區塊由呼叫端改為單獨分析
+        """
+        answer_json, complete = parse_json_answer(answer_text)
+        if answer_json is None:
+            print("無法解析批次分析的回應，改為單獨分析各區塊")
+            return {}
+        if not complete:
+            print("批次分析的回應不完整，保留已完整回答的區塊")
+        if not isinstance(answer_json, dict):
+            print("批次分析的回應不是以代號為鍵的物件，改為單獨分析各區塊")
+            return {}
+        return {label: self.normalize_jobs(answer_json[label]) for label in labels if label in answer_json}
+    
+    def block_encoding_signature(self) -> str:
+        """目前的區塊請求圖片編碼設定，編碼不同時模型看到的圖片不同，結果分別快取"""
+        if Config.BLOCK_ENCODING == 'compact':
+            return (f"compact:{Config.BLOCK_IMAGE_FORMAT}:{Config.BLOCK_IMAGE_QUALITY}:"
+                    f"{Config.BLOCK_TARGET_TEXT_HEIGHT}:{Config.BLOCK_MIN_TEXT_HEIGHT}")
+        return 'original'
+    
+    def extraction_cache_key(self, image_path: str) -> str:
+        """區塊分析結果的快取鍵：圖片內容、模型、提示詞版本與請求圖片的編碼設定"""
+        return file_content_hash(image_path, self.model_name, str(self.JOB_PROMPT_VERSION), self.block_encoding_signature())
+    
+    def get_cached_jobs(self, cache_key: str) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+        """讀取快取的 (工作列表, 請求圖片的編碼設定)，沒有快取時返回 None"""
+        cached = self.extraction_cache.get(cache_key)
+        if cached is None:
+            return None
+        return cached['jobs'], cached['request']
+    
+    def cache_jobs(self, cache_key: str, jobs: List[Dict[str, Any]], encoding: Dict[str, Any]) -> None:
+        """快取工作列表與產生它的請求圖片編碼設定"""
+        self.extraction_cache.put(cache_key, {'jobs': jobs, 'request': encoding})
+    
+    def analyze_job_from_image(self, api_key: str, image_path: str, process_id: Optional[str] = None, max_retries: int = None,
+                               request_settings: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """從圖片中分析工作資訊，支援 API 限制錯誤重試
+        
+        提供 request_settings 時記錄 {圖片路徑: 請求圖片的編碼設定}（包含快取結果當時使用的設定）
+        """
         
         if max_retries is None:
             max_retries = Config.GEMINI_MAX_RETRIES
@@ -295,109 +559,36 @@ class AIService:
                 "其他": "請在首頁設置API密鑰"
             }]
 
+        # 相同內容的區塊直接使用快取結果，不呼叫 API
+        cache_key = self.extraction_cache_key(image_path)
+        cached = self.get_cached_jobs(cache_key)
+        if cached is not None:
+            print(f"使用快取的分析結果: {os.path.basename(image_path)}")
+            if request_settings is not None:
+                request_settings[image_path] = cached[1]
+            return cached[0]
+
         for retry_attempt in range(max_retries + 1):
             try:
-                # 為每個線程創建獨立的 API 配置
-                genai.configure(api_key=api_key)
-                MODEL = genai.GenerativeModel(self.model_name)
+                MODEL = self.get_model(api_key, self.model_name)
                 
-                # 讀取圖片
-                img = Image.open(image_path)
+                # 讀取圖片並編碼為請求使用的尺寸與格式
+                encoded = self.encode_block(image_path)
+                if request_settings is not None:
+                    request_settings[image_path] = encoded.settings
                 
                 # 調用Gemini API
-                prompt = """請先仔細判斷這張圖片是否包含工作招聘、求職、就業相關的資訊。
-
-如果這張圖片不是工作相關的內容（例如：純粹的新聞報導、廣告、商品資訊、活動公告等），請回答空陣列 []。
-
-如果這張圖片確實包含工作招聘或就業相關資訊，請分析其中的所有工作崗位，並以JSON格式回答，包含一個工作列表，每個工作包含以下欄位：
-- 工作：工作職位或職業名稱
-- 行業：根據工作內容判斷屬於以下哪個行業分類，必須從下列選項中選擇一個：
-    "農、林、漁、牧業"、"礦業及土石採取業"、"製造業"、"電力及燃氣供應業"、"用水供應及污染整治業"、"營建工程業"、"批發及零售業"、"運輸及倉儲業"、"住宿及餐飲業"、"出版影音及資通訊業"、"金融及保險業"、"不動產業"、"專業、科學及技術服務業"、"支援服務業"、"公共行政及國防；強制性社會安全"、"教育業"、"醫療保健及社會工作服務業"、"藝術、娛樂及休閒服務業"、"其他服務業"
-- 時間：工作時間或營業時間
-- 薪資：薪資待遇或收入
-- 地點：工作地點或地址
-- 聯絡方式：電話、地址或其他聯絡資訊
-- 其他：其他相關資訊或備註
-
-請用繁體中文回答，如果某個欄位沒有資訊請填入空字串。行業欄位必須從上述19個分類中選擇最合適的一個。
-請直接回答JSON格式的工作列表，不要包含其他說明文字。
-
-工作相關內容的範例格式：
-[
-    {
-        "工作": "服務員",
-        "行業": "住宿及餐飲業",
-        "時間": "9:00-18:00",
-        "薪資": "時薪160元起",
-        "地點": "台北市信義區",
-        "聯絡方式": "02-1234-5678",
-        "其他": "需輪班"
-    }
-]
-
-非工作相關內容請回答：[]
-
-重要提醒：
-- 只有明確的工作招聘、求職、徵人啟事才算工作相關
-- 純粹的商業廣告、新聞報導、產品介紹不算工作相關
-- 如果圖片內容模糊不清或無法確定，請回答 []"""
+                prompt = self.JOB_PROMPT
                 
-                response = MODEL.generate_content([prompt, img])
+                self.scheduler.acquire(api_key, self.model_name, PRIORITY_EXTRACTION, estimate_request_tokens(prompt, [encoded.size]))
+                response = MODEL.generate_content([prompt, self.block_part(encoded)])
                 
-                # 獲取響應文字
-                description_text = response.text.strip()
+                description_json, parsed = self.parse_job_answer(response.text)
                 
-                # 嘗試解析JSON
-                try:
-                    # 移除可能的markdown格式標記
-                    if description_text.startswith('```json'):
-                        description_text = description_text.replace('```json', '').replace('```', '').strip()
-                    elif description_text.startswith('```'):
-                        description_text = description_text.replace('```', '').strip()
-                    
-                    description_json = json.loads(description_text)
-                    
-                    # 確保返回的是列表
-                    if not isinstance(description_json, list):
-                        # 如果返回的是單一物件，轉換為列表
-                        if isinstance(description_json, dict):
-                            description_json = [description_json]
-                        else:
-                            description_json = []
-                    
-                    # 確保每個工作物件都有所有必要欄位
-                    required_fields = ["工作", "行業", "時間", "薪資", "地點", "聯絡方式", "其他"]
-                    for job in description_json:
-                        if isinstance(job, dict):
-                            for field in required_fields:
-                                if field not in job:
-                                    job[field] = ""
-                    
-                    # 如果沒有工作，返回一個空的提示
-                    if not description_json:
-                        return [{
-                            "工作": "未識別到工作資訊",
-                            "行業": "",
-                            "時間": "",
-                            "薪資": "",
-                            "地點": "",
-                            "聯絡方式": "",
-                            "其他": "此圖片可能不包含就業相關資訊"
-                        }]
-                    
-                    return description_json
-                    
-                except json.JSONDecodeError:
-                    # 如果JSON解析失敗，嘗試從文字中提取資訊
-                    return [{
-                        "工作": "",
-                        "行業": "",
-                        "時間": "",
-                        "薪資": "",
-                        "地點": "",
-                        "聯絡方式": "",
-                        "其他": description_text
-                    }]
+                # 只快取成功解析的結果，API 錯誤與無法解析的回應下次會重新分析
+                if parsed:
+                    self.cache_jobs(cache_key, description_json, encoded.settings)
+                return description_json
             
             except Exception as e:
                 error_message = str(e)
@@ -413,11 +604,11 @@ class AIService:
                     
                     print(f"API 限制錯誤，第 {retry_count} 次重試，剩餘 {remaining_retries} 次重試機會")
                     
+                    # 設定共用的退避時間，其他執行緒的請求也會暫停，重試時由排程器等待
+                    wait_seconds = math.ceil(self.scheduler.report_rate_limit(api_key, self.model_name, error_info['retry_delay']))
+                    
                     # 向前端發送錯誤訊息和重試資訊
-                    if process_id and self.progress_tracker:
-                        self.wait_with_progress_update(process_id, error_info['retry_delay'], error_info)
-                    else:
-                        time.sleep(error_info['retry_delay'])
+                    self.notify_rate_limit(process_id, wait_seconds, error_info)
                     
                     continue  # 重試
                 else:
@@ -448,5 +639,152 @@ class AIService:
             "其他": "未知錯誤"
         }]
 
+    def plan_extraction_batches(self, image_paths: List[str]) -> List[List[str]]:
+        """依序將區塊分組，每組最多 EXTRACTION_BATCH_SIZE 張且圖片總大小不超過 EXTRACTION_BATCH_MAX_BYTES"""
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        batch_bytes = 0
+        for image_path in image_paths:
+            size = os.path.getsize(image_path) if os.path.exists(image_path) else 0
+            if batch and (len(batch) >= Config.EXTRACTION_BATCH_SIZE or batch_bytes + size > Config.EXTRACTION_BATCH_MAX_BYTES):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(image_path)
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def analyze_jobs_batch(self, api_key: str, image_paths: List[str], process_id: Optional[str] = None, max_retries: int = None,
+                           request_settings: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """在一次請求中分析多個區塊，返回 {圖片路徑: 工作列表}
+        
+        已快取與本地預篩判定不含工作廣告的區塊不送出；整批請求失敗或回應中缺少某個區塊時，該區塊改為單獨分析。
+        提供 request_settings 時記錄 {圖片路徑: 請求圖片的編碼設定}
+        """
+        if max_retries is None:
+            max_retries = Config.GEMINI_MAX_RETRIES
+        if request_settings is None:
+            request_settings = {}
+        
+        results, pending, cache_keys = self.split_cached_blocks(image_paths, request_settings) if api_key else ({}, {}, {})
+        
+        if len(pending) > 1:
+            batch_results = self._request_jobs_batch(api_key, pending, process_id, max_retries, request_settings)
+            for label, jobs in batch_results.items():
+                image_path = pending.pop(label)
+                self.cache_jobs(cache_keys[image_path], jobs, request_settings[image_path])
+                results[image_path] = jobs
+            if pending:
+                print(f"批次分析缺少 {len(pending)} 個區塊的結果，改為單獨分析")
+        
+        # 沒有 API 密鑰、只剩一個區塊或批次失敗的區塊單獨分析
+        for image_path in image_paths:
+            if image_path not in results:
+                results[image_path] = self.analyze_job_from_image(api_key, image_path, process_id, max_retries, request_settings)
+        self.job_prefilter.record_results(results)
+        return results
+    
+    def split_cached_blocks(self, image_paths: List[str], request_settings: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str], Dict[str, str]]:
+        """將區塊分為不需送出與待分析兩部分，返回 ({圖片路徑: 快取或預篩結果}, {代號: 圖片路徑}, {圖片路徑: 快取鍵})
+        
+        已快取區塊當時的請求圖片編碼設定記錄在 request_settings；未快取的區塊經本地預篩，
+        判定不含工作廣告的區塊不送出，request_settings 記錄為 skipped 與預篩分數
+        """
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        pending: Dict[str, str] = {}  # 代號 -> 圖片路徑
+        cache_keys: Dict[str, str] = {}
+        for image_path in image_paths:
+            cache_key = self.extraction_cache_key(image_path)
+            cached = self.get_cached_jobs(cache_key)
+            if cached is not None:
+                print(f"使用快取的分析結果: {os.path.basename(image_path)}")
+                results[image_path], request_settings[image_path] = cached
+                continue
+            prefilter = self.job_prefilter.evaluate(image_path)
+            if prefilter is not None and prefilter[1]:
+                print(f"預篩判定不含工作廣告，略過: {os.path.basename(image_path)}")
+                results[image_path] = self.job_prefilter.skipped_result(prefilter[0])
+                request_settings[image_path] = {'encoding': 'skipped', 'prefilter_score': round(prefilter[0], 3)}
+            else:
+                label = f"B{len(pending) + 1}"
+                pending[label] = image_path
+                cache_keys[image_path] = cache_key
+        return results, pending, cache_keys
+    
+    def encode_block(self, image_path: str) -> EncodedBlock:
+        """將區塊檔案編碼為請求的圖片
+        
+        BLOCK_ENCODING 為 compact 時依文字高度縮小並轉為灰階 JPEG/WebP，original 時直接送出檔案的原始位元組
+        """
+        if Config.BLOCK_ENCODING == 'compact':
+            image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            if image is not None:
+                return encode_block_image(
+                    image, Config.BLOCK_TARGET_TEXT_HEIGHT, Config.BLOCK_MIN_TEXT_HEIGHT,
+                    Config.BLOCK_IMAGE_FORMAT, Config.BLOCK_IMAGE_QUALITY
+                )
+        with open(image_path, 'rb') as f:
+            image_bytes = f.read()
+        with Image.open(image_path) as img:
+            settings = {'encoding': 'original', 'format': (img.format or '').lower(),
+                        'width': img.size[0], 'height': img.size[1], 'bytes': len(image_bytes)}
+            return EncodedBlock(image_bytes, Image.MIME.get(img.format, 'image/jpeg'), img.size, settings)
+    
+    def block_part(self, encoded: EncodedBlock) -> Dict[str, Any]:
+        """編碼後的區塊作為請求內容的一部分"""
+        return {'mime_type': encoded.mime_type, 'data': encoded.data}
+    
+    def build_batch_request(self, labelled_paths: Dict[str, str]) -> Tuple[str, List[Any], Dict[str, EncodedBlock]]:
+        """組成批次請求，返回 (提示詞, 請求內容, {代號: 編碼後的區塊})"""
+        prompt = self.BATCH_JOB_PROMPT.format(
+            count=len(labelled_paths), labels="、".join(labelled_paths), job_prompt=self.JOB_PROMPT
+        )
+        contents: List[Any] = [prompt]
+        encoded_blocks = {}
+        for label, image_path in labelled_paths.items():
+            encoded_blocks[label] = self.encode_block(image_path)
+            contents += [f"圖片 {label}：", self.block_part(encoded_blocks[label])]
+        return prompt, contents, encoded_blocks
+    
+    def _request_jobs_batch(self, api_key: str, labelled_paths: Dict[str, str], process_id: Optional[str], max_retries: int,
+                            request_settings: Dict[str, Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """送出批次請求並解析為 {代號: 工作列表}；請求失敗或無法解析時返回空字典"""
+        prompt, contents, encoded_blocks = self.build_batch_request(labelled_paths)
+        image_sizes = [encoded.size for encoded in encoded_blocks.values()]
+        for label, encoded in encoded_blocks.items():
+            request_settings[labelled_paths[label]] = encoded.settings
+        
+        for retry_attempt in range(max_retries + 1):
+            try:
+                MODEL = self.get_model(api_key, self.model_name)
+                self.scheduler.acquire(
+                    api_key, self.model_name, PRIORITY_EXTRACTION,
+                    estimate_request_tokens(prompt, image_sizes, output_tokens=500 * len(labelled_paths))
+                )
+                response = MODEL.generate_content(contents)
+                return self.parse_batch_answer(response.text, list(labelled_paths))
+            
+            except Exception as e:
+                error_message = str(e)
+                print(f"批次分析 {len(labelled_paths)} 個區塊時出錯: {error_message}")
+                
+                error_info = self.parse_api_error(error_message)
+                
+                if error_info['is_rate_limit'] and retry_attempt < max_retries:
+                    retry_count = retry_attempt + 1
+                    remaining_retries = max_retries - retry_attempt
+                    
+                    print(f"API 限制錯誤，第 {retry_count} 次重試，剩餘 {remaining_retries} 次重試機會")
+                    
+                    # 設定共用的退避時間，其他執行緒的請求也會暫停，重試時由排程器等待
+                    wait_seconds = math.ceil(self.scheduler.report_rate_limit(api_key, self.model_name, error_info['retry_delay']))
+                    self.notify_rate_limit(process_id, wait_seconds, error_info)
+                    
+                    continue  # 重試
+                return {}
+        
+        return {}
+
 # 創建全域 AI 服務實例
 ai_service = AIService() 
\ No newline at end of file
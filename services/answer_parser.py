@@ -0,0 +1,90 @@
+"""
+模型回答的 JSON 解析
+容忍 markdown 程式碼區塊、前後的說明文字與多餘的逗號；回答在輸出上限處被截斷時，
+逐字掃描並保留最外層陣列或物件中已完整的項目，不必重新送出請求
+"""
+import re
+import json
+from typing import Any, Optional, Tuple
+
+_CODE_FENCE = re.compile(r'```[a-zA-Z]*\s*(.*?)(?:```|$)', re.DOTALL)
+_CLOSING = {'[': ']', '{': '}'}
+_JSON_START = re.compile(r'[\[{]')
+# 嘗試作為 JSON 開頭的括號位置數上限
+MAX_START_CANDIDATES = 20
+
+def strip_code_fence(text: str) -> str:
+    """取出 markdown 程式碼區塊的內容（沒有結尾標記時取到文字結束），沒有區塊時返回原文字"""
+    match = _CODE_FENCE.search(text)
+    return match.group(1).strip() if match else text.strip()
+
+def _salvage(text: str) -> Tuple[Optional[str], bool]:
+    """逐字掃描從 [ 或 { 開始的 JSON，移除多餘的逗號
+
+    返回 (可解析的 JSON 文字, 是否完整)：完整時為整個值；被截斷時為最外層中最後一個完整項目之前的內容
+    加上結尾括號；連一個完整項目都沒有時為 None
+    """
+    output = []
+    stack = []
+    in_string = escaped = False
+    last_complete = None
+    for char in text:
+        if in_string:
+            output.append(char)
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char in _CLOSING:
+            stack.append(char)
+        elif char in ']}':
+            if not stack or _CLOSING[stack[-1]] != char:
+                break
+            stack.pop()
+            # 移除結尾括號前多餘的逗號
+            while output and output[-1].isspace():
+                output.pop()
+            if output and output[-1] == ',':
+                output.pop()
+        elif char == '"':
+            in_string = True
+        output.append(char)
+
+        if not stack:
+            return ''.join(output), True
+        if len(stack) == 1 and char in ']}':
+            last_complete = len(output)
+
+    if last_complete is None:
+        return None, False
+    return ''.join(output[:last_complete]) + _CLOSING[stack[0]], False
+
+def parse_json_answer(text: str) -> Tuple[Any, bool]:
+    """解析模型回答中的 JSON 陣列或物件，返回 (值, 是否完整)
+
+    回答被截斷時返回已完整的項目（例如工作列表中完整的工作、批次回答中完整的代號）並標示為不完整；
+    找不到任何可用內容時返回 (None, False)
+    """
+    text = strip_code_fence(text)
+    # 說明文字中也可能有括號（例如「[注意]」），依序嘗試前幾個 [ 或 { 的位置
+    starts = [match.start() for match in _JSON_START.finditer(text)][:MAX_START_CANDIDATES]
+    if not starts:
+        return None, False
+    decoder = json.JSONDecoder()
+    for start in starts:
+        try:
+            return decoder.raw_decode(text, start)[0], True
+        except json.JSONDecodeError:
+            pass
+        # 從這個位置起無法直接解析時先嘗試補救，不能補救才換下一個位置（避免把截斷的列表中的一項當成完整回答）
+        salvaged, complete = _salvage(text[start:])
+        if salvaged is not None:
+            try:
+                return json.loads(salvaged), complete
+            except json.JSONDecodeError:
+                pass
+    return None, False
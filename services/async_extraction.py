@@ -0,0 +1,208 @@
+"""
+非同步工作資訊提取引擎
+在單一背景事件迴圈中以 GenerativeServiceAsyncClient 送出工作資訊提取請求，所有上傳共用同一個並行上限；
+等待回應的請求只是一個協程，不佔用執行緒，請求內容是區塊檔案的原始位元組，不保存解碼後的圖片
+"""
+import os
+import math
+import asyncio
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Awaitable
+from config.settings import Config
+from services import gemini_client
+from services.ai_service import ai_service
+from services.rate_limiter import estimate_request_tokens, PRIORITY_EXTRACTION
+
+class AsyncExtractionEngine:
+    """在背景事件迴圈中執行工作資訊提取，快取、提示詞與回答解析沿用 AIService"""
+
+    def __init__(self, ai_service, max_concurrency: int):
+        self.ai_service = ai_service
+        self.max_concurrency = max(1, max_concurrency)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._start_lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # 已排入但尚未完成的工作數上限（所有上傳合計），提交的執行緒在名額用完時阻塞
+        self.max_pending = self.max_concurrency * 2
+        self._pending = threading.BoundedSemaphore(self.max_pending)
+        # 依 API 密鑰保存的非同步連線與模型（只在事件迴圈中使用，不需要鎖）
+        self._clients: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._requests = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """第一次使用時啟動背景事件迴圈的執行緒"""
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                threading.Thread(target=loop.run_forever, name='async-extraction', daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coroutine: Awaitable) -> concurrent.futures.Future:
+        """將協程排入背景事件迴圈，返回可在其他執行緒等待的 Future
+
+        未完成的工作達 max_pending 時阻塞直到有工作完成，避免分割遠快於分析時累積過多待分析的區塊；
+        不可在事件迴圈的執行緒中呼叫
+        """
+        self._pending.acquire()
+        try:
+            future = asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+        except Exception:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def submit(self, api_key: str, image_paths: List[str], process_id: Optional[str] = None) -> concurrent.futures.Future:
+        """提交一組區塊的分析，Future 的結果為 {圖片路徑: 工作列表}"""
+        return self.run(self.analyze_jobs_batch(api_key, image_paths, process_id))
+
+    def get_model(self, api_key: str, model_name: str) -> gemini_client.GeminiModel:
+        """取得綁定 API 密鑰的模型，連線在事件迴圈中建立並由所有協程共用"""
+        entry = self._clients.get(api_key)
+        if entry is None:
+            entry = self._clients[api_key] = {'client': self.ai_service.create_client(api_key, asynchronous=True), 'models': {}}
+            while len(self._clients) > Config.GEMINI_CLIENT_POOL_SIZE:
+                self._clients.popitem(last=False)
+        self._clients.move_to_end(api_key)
+
+        model = entry['models'].get(model_name)
+        if model is None:
+            model = gemini_client.GeminiModel(model_name, async_client=entry['client'])
+            entry['models'][model_name] = model
+        return model
+
+    async def _generate(self, api_key: str, contents: List[Any], tokens: int, process_id: Optional[str], max_retries: int) -> str:
+        """送出一次請求並返回回應文字；429 時設定共用的退避時間後重試，其他錯誤或重試次數用完時拋出例外"""
+        model_name = self.ai_service.model_name
+        for retry_attempt in range(max_retries + 1):
+            # 先取得發送名額再佔用並行上限，等待配額的請求不佔用名額，in_flight 只計已送出的請求
+            await self.ai_service.scheduler.acquire_async(api_key, model_name, PRIORITY_EXTRACTION, tokens)
+            async with self._semaphore:
+                self._in_flight += 1
+                self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+                self._requests += 1
+                try:
+                    response = await self.get_model(api_key, model_name).generate_content_async(contents)
+                    return response.text
+                except Exception as e:
+                    error_info = self.ai_service.parse_api_error(str(e))
+                    if not error_info['is_rate_limit'] or retry_attempt >= max_retries:
+                        raise
+                    print(f"API 限制錯誤，第 {retry_attempt + 1} 次重試，剩餘 {max_retries - retry_attempt} 次重試機會")
+                    # 重試時由排程器等待退避結束，不另外佔用執行緒倒數
+                    wait_seconds = math.ceil(self.ai_service.scheduler.report_rate_limit(api_key, model_name, error_info['retry_delay']))
+                    self.ai_service.notify_rate_limit(process_id, wait_seconds, error_info)
+                finally:
+                    self._in_flight -= 1
+
+    async def analyze_job_from_image(self, api_key: str, image_path: str, process_id: Optional[str] = None,
+                                     max_retries: Optional[int] = None, request_settings: Optional[Dict[str, Dict[str, Any]]] = None,
+                                     cache_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """AIService.analyze_job_from_image 的協程版本；提供 cache_key 時表示已確認沒有快取結果"""
+        if max_retries is None:
+            max_retries = Config.GEMINI_MAX_RETRIES
+        if not api_key:
+            return self.ai_service.analyze_job_from_image(api_key, image_path)
+
+        if cache_key is None:
+            cache_key = await asyncio.to_thread(self.ai_service.extraction_cache_key, image_path)
+            cached = await asyncio.to_thread(self.ai_service.get_cached_jobs, cache_key)
+            if cached is not None:
+                print(f"使用快取的分析結果: {os.path.basename(image_path)}")
+                if request_settings is not None:
+                    request_settings[image_path] = cached[1]
+                return cached[0]
+
+        try:
+            encoded = await asyncio.to_thread(self.ai_service.encode_block, image_path)
+            if request_settings is not None:
+                request_settings[image_path] = encoded.settings
+            prompt = self.ai_service.JOB_PROMPT
+            answer_text = await self._generate(
+                api_key, [prompt, self.ai_service.block_part(encoded)], estimate_request_tokens(prompt, [encoded.size]),
+                process_id, max_retries
+            )
+        except Exception as e:
+            error_message = str(e)
+            print(f"獲取圖片描述時出錯: {error_message}")
+            if self.ai_service.parse_api_error(error_message)['is_rate_limit']:
+                error_message = f"API 請求頻率超限，已重試 {max_retries} 次仍失敗"
+            return [{
+                "工作": "獲取描述時出錯",
+                "行業": "",
+                "時間": "",
+                "薪資": "",
+                "地點": "",
+                "聯絡方式": "",
+                "其他": error_message
+            }]
+
+        description_json, parsed = self.ai_service.parse_job_answer(answer_text)
+        if parsed:
+            await asyncio.to_thread(self.ai_service.cache_jobs, cache_key, description_json, encoded.settings)
+        return description_json
+
+    async def analyze_jobs_batch(self, api_key: str, image_paths: List[str], process_id: Optional[str] = None,
+                                 max_retries: Optional[int] = None,
+                                 request_settings: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """AIService.analyze_jobs_batch 的協程版本：已快取與預篩略過的區塊不送出，批次失敗或缺少的區塊同時改為單獨請求"""
+        if max_retries is None:
+            max_retries = Config.GEMINI_MAX_RETRIES
+        if request_settings is None:
+            request_settings = {}
+
+        results, pending, cache_keys = {}, {}, {}
+        if api_key:
+            results, pending, cache_keys = await asyncio.to_thread(self.ai_service.split_cached_blocks, image_paths, request_settings)
+
+        if len(pending) > 1:
+            batch_results = {}
+            try:
+                prompt, contents, encoded_blocks = await asyncio.to_thread(self.ai_service.build_batch_request, pending)
+                for label, encoded in encoded_blocks.items():
+                    request_settings[pending[label]] = encoded.settings
+                image_sizes = [encoded.size for encoded in encoded_blocks.values()]
+                answer_text = await self._generate(
+                    api_key, contents, estimate_request_tokens(prompt, image_sizes, output_tokens=500 * len(pending)),
+                    process_id, max_retries
+                )
+                batch_results = self.ai_service.parse_batch_answer(answer_text, list(pending))
+            except Exception as e:
+                print(f"批次分析 {len(pending)} 個區塊時出錯: {str(e)}")
+            for label, jobs in batch_results.items():
+                image_path = pending.pop(label)
+                await asyncio.to_thread(self.ai_service.cache_jobs, cache_keys[image_path], jobs, request_settings[image_path])
+                results[image_path] = jobs
+            if pending:
+                print(f"批次分析缺少 {len(pending)} 個區塊的結果，改為單獨分析")
+
+        # 沒有 API 密鑰、只剩一個區塊或批次失敗的區塊單獨分析
+        remaining = [image_path for image_path in image_paths if image_path not in results]
+        descriptions = await asyncio.gather(*(
+            self.analyze_job_from_image(api_key, image_path, process_id, max_retries, request_settings, cache_keys.get(image_path))
+            for image_path in remaining
+        ))
+        results.update(zip(remaining, descriptions))
+        self.ai_service.job_prefilter.record_results(results)
+        return {image_path: results[image_path] for image_path in image_paths}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取引擎統計資訊"""
+        return {
+            'engine': Config.EXTRACTION_ENGINE,
+            'running': self._loop is not None,
+            'max_concurrency': self.max_concurrency,
+            'max_pending': self.max_pending,
+            'in_flight': self._in_flight,
+            'peak_in_flight': self._peak_in_flight,
+            'requests': self._requests
+        }
+
+# 創建全域非同步工作資訊提取引擎實例（第一次提交時才啟動事件迴圈）
+async_extraction_engine = AsyncExtractionEngine(ai_service, Config.ASYNC_EXTRACTION_CONCURRENCY)
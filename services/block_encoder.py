@@ -0,0 +1,87 @@
+"""
+區塊請求圖片編碼
+依區塊中文字的高度決定送 Gemini 的圖片尺寸：縮小到文字仍清晰可讀的大小，
+若再稍微縮小即可少用一個 768x768 的圖片區塊（token 計價單位）時就縮到該尺寸，
+再轉為灰階、拉伸對比後以 JPEG 或 WebP 編碼，減少請求大小、上傳時間與 token
+"""
+from collections import namedtuple
+from typing import Optional, Dict, Any
+import cv2
+import numpy as np
+from services.rate_limiter import image_tokens
+
+BLOCK_IMAGE_FORMATS = {'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+                       'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY)}
+
+# data：編碼後的位元組；mime_type：請求使用的類型；size：(寬, 高)；settings：實際使用的編碼設定（隨結果記錄）
+EncodedBlock = namedtuple('EncodedBlock', ['data', 'mime_type', 'size', 'settings'])
+
+def estimate_text_height(gray: np.ndarray, min_components: int = 10) -> Optional[float]:
+    """估計區塊中文字的高度（像素），無法估計時返回 None
+
+    以連通區域的長邊作為字元尺寸：中文字常被拆成數個筆畫區域，取第 75 百分位數接近完整字元的大小，
+    超過區塊長邊 1/8 的是框線、圖片或大標題，不列入計算
+    """
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 15)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    sizes = np.maximum(stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT])
+    sizes = sizes[(sizes >= 4) & (sizes <= max(gray.shape) / 8)]
+    if len(sizes) < min_components:
+        return None
+    return float(np.percentile(sizes, 75))
+
+def choose_scale(width: int, height: int, text_height: Optional[float], target_text_height: float,
+                 min_text_height: float, max_side: int) -> float:
+    """選擇縮放比例（不放大）
+
+    先讓文字高度縮到 target_text_height 且長邊不超過 max_side；在文字不小於 min_text_height 的範圍內，
+    若縮小到某個圖片區塊邊界可以減少 token，改用 token 最少的最大比例
+    """
+    scale = min(1.0, max_side / max(width, height))
+    if text_height is None:
+        return scale
+    scale = min(scale, target_text_height / text_height)
+    min_scale = min(scale, min_text_height / text_height)
+
+    # 候選比例：長或寬剛好等於 768 的倍數，或兩邊都不超過 384（單一區塊）
+    candidates = {scale, 384 / max(width, height)}
+    for side in (width, height):
+        candidates.update(768 * tiles / side for tiles in range(1, int(side * scale / 768) + 1))
+    candidates = [candidate for candidate in candidates if min_scale <= candidate <= scale]
+    return min(candidates, key=lambda candidate: (image_tokens(int(width * candidate), int(height * candidate)), -candidate))
+
+def normalize_contrast(gray: np.ndarray, low_percentile: float = 1.0, high_percentile: float = 99.0) -> np.ndarray:
+    """將第 low_percentile 到第 high_percentile 百分位數的亮度拉伸到 0-255（泛黃紙張變白、淡墨變深）"""
+    low, high = np.percentile(gray, (low_percentile, high_percentile))
+    if high - low < 1:
+        return gray
+    lut = np.clip((np.arange(256) - low) * 255.0 / (high - low), 0, 255).astype(np.uint8)
+    return cv2.LUT(gray, lut)
+
+def encode_block_image(image: np.ndarray, target_text_height: float = 20, min_text_height: float = 16,
+                       image_format: str = 'jpeg', quality: int = 80, max_side: int = 2048) -> EncodedBlock:
+    """將區塊編碼為送 Gemini 的灰階壓縮圖片"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    height, width = gray.shape
+    text_height = estimate_text_height(gray)
+    scale = choose_scale(width, height, text_height, target_text_height, min_text_height, max_side)
+    if scale < 1:
+        gray = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+    gray = normalize_contrast(gray)
+
+    extension, mime_type, quality_flag = BLOCK_IMAGE_FORMATS[image_format]
+    data = cv2.imencode(extension, gray, [quality_flag, quality])[1].tobytes()
+    size = (gray.shape[1], gray.shape[0])
+    settings: Dict[str, Any] = {
+        'encoding': 'compact',
+        'format': image_format,
+        'quality': quality,
+        'grayscale': True,
+        'scale': round(scale, 4),
+        'width': size[0],
+        'height': size[1],
+        'text_height': round(text_height, 1) if text_height is not None else None,
+        'target_text_height': target_text_height,
+        'bytes': len(data)
+    }
+    return EncodedBlock(data, mime_type, size, settings)
@@ -0,0 +1,52 @@
+"""
+Gemini 請求封裝
+以 google.ai.generativelanguage 的公開 GenerativeServiceClient / GenerativeServiceAsyncClient 直接送出
+GenerateContentRequest，連線由呼叫端依 API 密鑰建立並傳入，不依賴 google.generativeai 的全域設定或內部屬性
+"""
+from typing import Any, Dict, List, Optional
+import google.ai.generativelanguage as glm
+
+class GeminiResponse:
+    """回應的文字內容（與 SDK 回應的 text 屬性相同用法）"""
+
+    def __init__(self, response: glm.GenerateContentResponse):
+        self.raw = response
+
+    @property
+    def text(self) -> str:
+        """第一個候選回答的文字；被安全設定擋下或沒有候選回答時拋出 ValueError"""
+        if not self.raw.candidates:
+            raise ValueError(f"回應沒有候選回答: {self.raw.prompt_feedback}")
+        parts = self.raw.candidates[0].content.parts
+        if not parts:
+            raise ValueError(f"回應沒有內容，結束原因: {self.raw.candidates[0].finish_reason.name}")
+        return ''.join(part.text for part in parts)
+
+def to_part(content: Any) -> glm.Part:
+    """請求內容的一部分：文字，或 {'mime_type': ..., 'data': ...} 形式的圖片"""
+    if isinstance(content, str):
+        return glm.Part(text=content)
+    return glm.Part(inline_data=glm.Blob(mime_type=content['mime_type'], data=content['data']))
+
+class GeminiModel:
+    """綁定連線、模型名稱與生成設定的模型，所有執行緒（或事件迴圈中的協程）共用"""
+
+    def __init__(self, model_name: str, generation_config: Optional[Dict[str, Any]] = None, client=None, async_client=None):
+        self.model_name = model_name if '/' in model_name else f'models/{model_name}'
+        self.generation_config = dict(generation_config or {})
+        self.client = client
+        self.async_client = async_client
+
+    def build_request(self, contents: List[Any]) -> glm.GenerateContentRequest:
+        """將文字與圖片組成單一使用者訊息的請求"""
+        return glm.GenerateContentRequest(
+            model=self.model_name,
+            contents=[glm.Content(role='user', parts=[to_part(content) for content in contents])],
+            generation_config=glm.GenerationConfig(**self.generation_config)
+        )
+
+    def generate_content(self, contents: List[Any]) -> GeminiResponse:
+        return GeminiResponse(self.client.generate_content(self.build_request(contents)))
+
+    async def generate_content_async(self, contents: List[Any]) -> GeminiResponse:
+        return GeminiResponse(await self.async_client.generate_content(self.build_request(contents)))
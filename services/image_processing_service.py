@@ -4,18 +4,20 @@
 """
 import os
 import cv2
-import time
 import base64
-import tempfile
-import shutil
-import concurrent.futures
+import threading
 import gc
-from functools import partial
+import fitz  # PyMuPDF
 from typing import List, Dict, Any, Optional
+from image_processor import render_debug_artifacts, debug_artifact_names
+from utils.pdf_utils import load_page_image
 from models.storage import image_storage
 from services.ai_service import ai_service
+from services.async_extraction import async_extraction_engine
+from services.result_cache import orientation_cache, image_content_hash
+from config.settings import Config
 from services.progress_tracker import progress_tracker
-from image_processor import process_image as original_process_image
+from services.segmentation_engine import segmentation_engine
 
 class ImageProcessingService:
     """圖像處理服務類"""
@@ -23,15 +25,29 @@ class ImageProcessingService:
     def __init__(self):
         self.storage = image_storage
         self.ai_service = ai_service
+        self.async_extraction_engine = async_extraction_engine
         self.progress_tracker = progress_tracker
+        self.segmentation_engine = segmentation_engine
+        self.orientation_cache = orientation_cache
+        # 延遲產生處理步驟圖像時避免同一頁被重複渲染
+        self._debug_render_lock = threading.Lock()
         # 設置 AI 服務的進度追蹤器
         self.ai_service.set_progress_tracker(progress_tracker)
     
     def process_image_data(self, image, process_id: str, image_name: str, 
                           progress_start: int = 10, progress_range: int = 50,
                           api_key: str = "", auto_rotate: bool = True,
-                          results_folder: str = "results") -> List[str]:
-        """處理圖像並儲存結果"""
+                          results_folder: str = "results", debug_artifacts: str = "full",
+                          page_source: Optional[Dict[str, Any]] = None,
+                          resolution_scale: float = 1.0) -> List[str]:
+        """處理圖像並儲存結果
+        
+        debug_artifacts 控制處理步驟圖像：full 立即產生、lazy 只記錄區塊幾何資訊，
+        待查看或下載時再從 page_source（原始檔案路徑、頁碼與 DPI）重新渲染、off 不產生
+        resolution_scale 為 PDF 頁面渲染 DPI 相對於原本固定 DPI 的比例，分割門檻依此縮放
+        """
+        if debug_artifacts == "lazy" and page_source is None:
+            debug_artifacts = "off"
         
         # 更新進度：開始圖像處理
         self.progress_tracker.update_progress(process_id, "process", progress_start, f"開始處理圖像: {image_name}")
@@ -48,9 +64,19 @@ class ImageProcessingService:
             elif '_file' in process_id:
                 original_process_id = process_id.split('_file')[0]
             
-            rotation_direction = self.ai_service.check_image_orientation(
-                image, api_key, parallel_process=True, process_id=original_process_id
-            )
+            # 內容完全相同的頁面直接使用快取的方向；有無 Gemini 參與的結果分開保存
+            orientation_source = 'gemini' if api_key and Config.ORIENTATION_MODE != 'local' else 'local'
+            orientation_key = f"{orientation_source}:{image_content_hash(image)}"
+            rotation_direction = self.orientation_cache.get(orientation_key)
+            if rotation_direction is not None:
+                print(f"使用快取的方向檢測結果: {rotation_direction}")
+            else:
+                rotation_direction, decided = self.ai_service.check_image_orientation(
+                    image, api_key, parallel_process=True, process_id=original_process_id
+                )
+                # 失敗時的預設方向不快取，修正密鑰或服務恢復後重新上傳會再次檢測
+                if decided:
+                    self.orientation_cache.put(orientation_key, rotation_direction)
             print(f"檢測到需要旋轉方向: {rotation_direction}")
             direction_done_progress = progress_start + int(progress_range * 0.6)  # 60%完成方向檢測
             self.progress_tracker.update_progress(process_id, "process", direction_done_progress, f"方向檢測完成: {rotation_direction}")
@@ -60,263 +86,260 @@ class ImageProcessingService:
             direction_done_progress = progress_start + int(progress_range * 0.6)
             self.progress_tracker.update_progress(process_id, "process", direction_done_progress, "跳過方向檢測")
         
-        # 創建臨時目錄進行處理
-        temp_dir = tempfile.mkdtemp()
+        # 使用原始圖片進行處理（不旋轉）
+        print("使用原始圖片進行區塊分割處理...")
+        segment_start_progress = progress_start + int(progress_range * 0.65)
+        self.progress_tracker.update_progress(process_id, "process", segment_start_progress, "執行區塊分割處理")
         
-        try:
-            # 使用原始圖片進行處理（不旋轉）
-            print("使用原始圖片進行區塊分割處理...")
-            segment_start_progress = progress_start + int(progress_range * 0.65)
-            self.progress_tracker.update_progress(process_id, "process", segment_start_progress, "執行區塊分割處理")
-            
-            # 使用執行緒池來執行 CPU 密集型任務，避免阻塞伺服器
-            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(original_process_image, image, temp_dir, image_name)
-                future.result()  # 等待圖像處理完成
-            
-            segment_done_progress = progress_start + int(progress_range * 0.8)
-            self.progress_tracker.update_progress(process_id, "process", segment_done_progress, "區塊分割處理完成")
-            
-            # 將處理結果儲存到本地檔案系統
-            
-            # 創建此次處理的結果目錄
-            # 提取原始process_id（去除_page或_file後綴）
-            base_process_id = process_id
-            if '_page' in process_id:
-                base_process_id = process_id.split('_page')[0]
-            elif '_file' in process_id:
-                base_process_id = process_id.split('_file')[0]
-            
-            process_result_dir = os.path.join(results_folder, base_process_id, process_id)
-            os.makedirs(process_result_dir, exist_ok=True)
-            
-            # 遍歷臨時目錄中的所有圖片檔案
-            processed_files = []
-            total_files = len([f for f in os.listdir(temp_dir) if f.endswith(('.jpg', '.jpeg', '.png'))])
-            processed_count = 0
-            
-            file_process_start_progress = progress_start + int(progress_range * 0.85)
-            self.progress_tracker.update_progress(process_id, "process", file_process_start_progress, f"處理 {total_files} 個輸出檔案")
-            
-            for filename in os.listdir(temp_dir):
-                if filename.endswith(('.jpg', '.jpeg', '.png')):
-                    file_path = os.path.join(temp_dir, filename)
-                    
-                    # 讀取圖片
-                    processed_image = cv2.imread(file_path)
-                    if processed_image is not None:
-                        # 對處理後的圖片應用旋轉
-                        rotated_image = self.ai_service.apply_rotation_to_image(processed_image, rotation_direction)
-                        
-                        # 將旋轉後的圖片保存到結果目錄
-                        result_file_path = os.path.join(process_result_dir, filename)
-                        cv2.imwrite(result_file_path, rotated_image)
-                        
-                        # 獲取檔案大小（不再生成 base64）
-                        file_size = os.path.getsize(result_file_path)
-                        
-                        # 只儲存檔案路徑和元數據（移除 base64 以節省記憶體）
-                        self.storage.store_image(process_id, filename, {
-                            'file_path': result_file_path,
-                            'format': 'jpg',
-                            'size': file_size
-                        })
-                        processed_files.append(filename)
-                        processed_count += 1
-                        
-                        # 立即釋放圖像記憶體
-                        del processed_image, rotated_image
-                        
-                        # 更新進度
-                        file_process_progress = file_process_start_progress + int((processed_count / total_files) * (progress_range * 0.15))
-                        self.progress_tracker.update_progress(process_id, "process", file_process_progress, f"已處理 {processed_count}/{total_files} 個檔案")
-                    else:
-                        print(f"無法讀取處理後的圖片: {filename}")
-            
-            print(f"處理完成，共處理了 {len(processed_files)} 張圖片")
-            final_progress = progress_start + progress_range
-            if rotation_direction != "正確":
-                print(f"所有圖片已根據檢測結果進行旋轉: {rotation_direction}")
-                self.progress_tracker.update_progress(process_id, "process", final_progress, f"圖片旋轉完成: {rotation_direction}")
-            else:
-                print("圖片方向正確，無需旋轉")
-                self.progress_tracker.update_progress(process_id, "process", final_progress, "圖片處理完成")
-            
-            # 強制垃圾回收以釋放記憶體
-            del image  # 明確刪除原始圖像
-            gc.collect()
-            print(f"圖像處理完成，已執行記憶體清理")
-            
-            return processed_files
-            
-        finally:
-            # 清理臨時目錄
-            shutil.rmtree(temp_dir, ignore_errors=True)
-    
-    def analyze_images_batch(self, process_id: str, image_names: List[str], 
-                           api_key: str, already_processed: int = 0, 
-                           total_global_images: Optional[int] = None,
-                           parallel_process: bool = True) -> Dict[str, List[Dict[str, Any]]]:
-        """批量分析多張圖片"""
+        # 交給多進程分割引擎執行 CPU 密集型任務，區塊直接以記憶體中的裁切返回
+        segmentation = self.segmentation_engine.segment(image, image_name, include_debug=(debug_artifacts == "full"),
+                                                         resolution_scale=resolution_scale)
         
-        if not api_key:
-            return {name: [{
-                "工作": "未設置Gemini API密鑰",
-                "行業": "",
-                "時間": "",
-                "薪資": "",
-                "地點": "",
-                "聯絡方式": "",
-                "其他": "請在首頁設置API密鑰"
-            }] for name in image_names}
+        segment_done_progress = progress_start + int(progress_range * 0.8)
+        self.progress_tracker.update_progress(process_id, "process", segment_done_progress, "區塊分割處理完成")
         
-        # 如果沒有提供全局總數，使用當前圖片數量
-        if total_global_images is None:
-            total_global_images = len(image_names)
-            already_processed = 0
+        # 將處理結果儲存到本地檔案系統
         
-        # 更新進度：開始 AI 分析
-        self.progress_tracker.update_progress(process_id, "analyze", 60, f"開始 AI 分析 {len(image_names)} 張圖片")
+        # 創建此次處理的結果目錄
+        # 提取原始process_id（去除_page或_file後綴）
+        base_process_id = process_id
+        if '_page' in process_id:
+            base_process_id = process_id.split('_page')[0]
+        elif '_file' in process_id:
+            base_process_id = process_id.split('_file')[0]
         
-        if parallel_process:
-            print(f"開始並行處理 {len(image_names)} 張圖片的描述...")
-            start_time = time.time()
-            
-            # 使用並行處理
+        process_result_dir = os.path.join(results_folder, base_process_id, process_id)
+        os.makedirs(process_result_dir, exist_ok=True)
+        
+        # 區塊與除錯圖像都只編碼一次，直接寫入結果目錄
+        outputs = [(region.name, region.crop) for region in segmentation['regions']]
+        outputs.extend(segmentation['debug_images'].items())
+        
+        processed_files = []
+        total_files = len(outputs)
+        processed_count = 0
+        
+        file_process_start_progress = progress_start + int(progress_range * 0.85)
+        self.progress_tracker.update_progress(process_id, "process", file_process_start_progress, f"處理 {total_files} 個輸出檔案")
+        
+        for filename, output_image in outputs:
+            # 對處理後的圖片應用旋轉
+            rotated_image = self.ai_service.apply_rotation_to_image(output_image, rotation_direction)
             
-            # 創建部分函數，固定參數
-            analyze_func = partial(self._analyze_single_image, api_key, process_id)
+            # 將旋轉後的圖片保存到結果目錄
+            result_file_path = os.path.join(process_result_dir, filename)
+            if not cv2.imwrite(result_file_path, rotated_image):
+                print(f"無法保存處理後的圖片: {filename}")
+                continue
             
-            with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, len(image_names))) as executor:
-                # 提交所有任務
-                future_to_image = {
-                    executor.submit(analyze_func, image_name): image_name
-                    for image_name in image_names
-                }
-                
-                results = {}
-                completed_count = 0
-                
-                # 收集結果
-                for future in concurrent.futures.as_completed(future_to_image):
-                    completed_count += 1
-                    try:
-                        image_name, description = future.result()
-                        results[image_name] = description
-                        
-                        # 更新 AI 分析進度 (60-95%) - 使用全局進度
-                        global_completed = already_processed + completed_count
-                        progress = 60 + int((global_completed / total_global_images) * 35)
-                        self.progress_tracker.update_progress(process_id, "analyze", progress, f"已分析 {global_completed}/{total_global_images} 張圖片")
-                        
-                    except Exception as e:
-                        image_name = future_to_image[future]
-                        print(f"處理 {image_name} 時出錯: {str(e)}")
-                        results[image_name] = [{
-                            "工作": "處理失敗",
-                            "行業": "",
-                            "時間": "",
-                            "薪資": "",
-                            "地點": "",
-                            "聯絡方式": "",
-                            "其他": str(e)
-                        }]
+            # 獲取檔案大小（不再生成 base64）
+            file_size = os.path.getsize(result_file_path)
             
-            end_time = time.time()
-            print(f"並行描述處理完成，耗時: {end_time - start_time:.2f}秒")
-        else:
-            # 序列處理
-            print(f"開始序列處理 {len(image_names)} 張圖片的描述...")
-            start_time = time.time()
+            # 只儲存檔案路徑和元數據（移除 base64 以節省記憶體）
+            self.storage.store_image(process_id, filename, {
+                'file_path': result_file_path,
+                'format': 'jpg',
+                'size': file_size
+            })
+            processed_files.append(filename)
+            processed_count += 1
             
-            results = {}
-            for i, image_name in enumerate(image_names, 1):
-                print(f"處理圖片 {i}/{len(image_names)}: {image_name}")
-                
-                # 更新 AI 分析進度 (60-95%) - 使用全局進度
-                global_completed = already_processed + i
-                progress = 60 + int((global_completed - 1) / total_global_images * 35)
-                self.progress_tracker.update_progress(process_id, "analyze", progress, f"分析圖片 {global_completed}/{total_global_images}: {image_name}")
-                
-                try:
-                    image_name, description = self._analyze_single_image(api_key, process_id, image_name)
-                    results[image_name] = description
-                except Exception as e:
-                    print(f"處理 {image_name} 時出錯: {str(e)}")
-                    results[image_name] = [{
-                        "工作": "處理失敗",
-                        "行業": "",
-                        "時間": "",
-                        "薪資": "",
-                        "地點": "",
-                        "聯絡方式": "",
-                        "其他": str(e)
-                    }]
+            # 立即釋放旋轉後的圖像記憶體
+            del rotated_image
             
-            end_time = time.time()
-            print(f"序列描述處理完成，耗時: {end_time - start_time:.2f}秒")
+            # 更新進度
+            file_process_progress = file_process_start_progress + int((processed_count / total_files) * (progress_range * 0.15))
+            self.progress_tracker.update_progress(process_id, "process", file_process_progress, f"已處理 {processed_count}/{total_files} 個檔案")
         
-        # AI 分析完成
-        self.progress_tracker.update_progress(process_id, "analyze", 95, "AI 分析完成")
+        if debug_artifacts == "lazy":
+            self._store_lazy_debug_artifacts(process_id, process_result_dir, image_name,
+                                             segmentation['geometry'], rotation_direction, page_source)
         
-        # 強制垃圾回收以釋放 AI 分析過程中的記憶體
+        print(f"處理完成，共處理了 {len(processed_files)} 張圖片")
+        final_progress = progress_start + progress_range
+        if rotation_direction != "正確":
+            print(f"所有圖片已根據檢測結果進行旋轉: {rotation_direction}")
+            self.progress_tracker.update_progress(process_id, "process", final_progress, f"圖片旋轉完成: {rotation_direction}")
+        else:
+            print("圖片方向正確，無需旋轉")
+            self.progress_tracker.update_progress(process_id, "process", final_progress, "圖片處理完成")
+        
+        # 強制垃圾回收以釋放記憶體
+        del image, segmentation, outputs  # 明確刪除原始圖像及其裁切視圖
         gc.collect()
-        print(f"AI 分析完成，已執行記憶體清理")
+        print(f"圖像處理完成，已執行記憶體清理")
         
-        return results
+        return processed_files
     
-    def _analyze_single_image(self, api_key: str, process_id: str, image_name: str) -> tuple:
-        """分析單張圖片 - 內部方法"""
+    def _store_lazy_debug_artifacts(self, process_id: str, process_result_dir: str, image_name: str,
+                                    geometry: Dict[str, Any], rotation_direction: str,
+                                    page_source: Dict[str, Any]) -> None:
+        """只記錄處理步驟圖像的渲染資訊，不編碼任何圖像"""
+        render_spec = {
+            'source': page_source,
+            'geometry': geometry,
+            'image_name': image_name,
+            'rotation_direction': rotation_direction
+        }
+        for filename in debug_artifact_names(geometry, image_name):
+            self.storage.store_image(process_id, filename, {
+                'file_path': os.path.join(process_result_dir, filename),
+                'format': 'jpg',
+                'size': 0,
+                'lazy': True,
+                'render_spec': render_spec
+            })
+    
+    def render_lazy_debug_artifacts(self, process_id: str) -> None:
+        """產生延遲模式下尚未渲染的處理步驟圖像（每頁只渲染一次）"""
+        with self._debug_render_lock:
+            pending = {filename: image_data for filename, image_data in self.storage.get_process_images(process_id).items()
+                       if image_data.get('lazy')}
+            if not pending:
+                return
+            
+            render_spec = next(iter(pending.values()))['render_spec']
+            print(f"渲染處理步驟圖像: {render_spec['image_name']}")
+            image = self._load_page_source(render_spec['source'])
+            artifacts = render_debug_artifacts(image, render_spec['geometry'], render_spec['image_name']) if image is not None else {}
+            
+            for filename, image_data in pending.items():
+                artifact = artifacts.get(filename)
+                if artifact is not None:
+                    rotated_artifact = self.ai_service.apply_rotation_to_image(artifact, render_spec['rotation_direction'])
+                    os.makedirs(os.path.dirname(image_data['file_path']), exist_ok=True)
+                    if cv2.imwrite(image_data['file_path'], rotated_artifact):
+                        image_data['size'] = os.path.getsize(image_data['file_path'])
+                    del rotated_artifact
+                else:
+                    print(f"無法渲染處理步驟圖像: {filename}")
+                image_data['lazy'] = False
+                image_data.pop('render_spec', None)
+            
+            del image, artifacts
+            gc.collect()
+    
+    def _load_page_source(self, page_source: Dict[str, Any]):
+        """重新載入原始頁面圖像（PDF 頁面以相同 DPI 重新載入）"""
+        file_path = page_source['path']
+        if not os.path.exists(file_path):
+            print(f"原始檔案已不存在: {file_path}")
+            return None
         
-        # 檢查圖片是否存在
-        image_data = self.storage.get_image(process_id, image_name)
-        if not image_data:
-            return image_name, [{
-                "工作": "圖片不存在",
-                "行業": "",
-                "時間": "",
-                "薪資": "",
-                "地點": "",
-                "聯絡方式": "",
-                "其他": ""
-            }]
+        if page_source.get('page_number') is None:
+            return cv2.imread(file_path)
         
-        try:
-            # 使用檔案路徑進行分析，傳遞 process_id 以支援重試機制
-            if 'file_path' in image_data and os.path.exists(image_data['file_path']):
-                # 提取原始的 process_id（移除 _page 或 _file 後綴）以便進度追蹤
-                original_process_id = process_id
-                if '_page' in process_id:
-                    original_process_id = process_id.split('_page')[0]
-                elif '_file' in process_id:
-                    original_process_id = process_id.split('_file')[0]
-                    
-                description = self.ai_service.analyze_job_from_image(
-                    api_key, 
-                    image_data['file_path'], 
-                    original_process_id  # 傳遞 process_id 以支援進度更新和重試
-                )
+        with fitz.open(file_path) as pdf_document:
+            page = pdf_document.load_page(page_source['page_number'])
+            return load_page_image(page, page_source['dpi'])
+    
+    def plan_image_groups(self, process_id: str, image_names: List[str]) -> List[List[str]]:
+        """依 AIService.plan_extraction_batches 將圖片分組；找不到檔案的圖片各自一組（分析時返回錯誤訊息）"""
+        name_by_path = {}
+        image_groups = []
+        for image_name in image_names:
+            image_data = self.storage.get_image(process_id, image_name)
+            if image_data and 'file_path' in image_data and image_data['file_path'] not in name_by_path:
+                name_by_path[image_data['file_path']] = image_name
+            else:
+                image_groups.append([image_name])
+        for batch in self.ai_service.plan_extraction_batches(list(name_by_path)):
+            image_groups.append([name_by_path[image_path] for image_path in batch])
+        return image_groups
+    
+    def _resolve_image_group(self, process_id: str, image_names: List[str]):
+        """找出一組圖片的檔案路徑，返回 ({找不到的檔名: 錯誤結果}, {檔案路徑: 檔名})"""
+        results = {}
+        name_by_path = {}
+        for image_name in image_names:
+            # 檢查圖片是否存在
+            image_data = self.storage.get_image(process_id, image_name)
+            if not image_data:
+                results[image_name] = [{
+                    "工作": "圖片不存在",
+                    "行業": "",
+                    "時間": "",
+                    "薪資": "",
+                    "地點": "",
+                    "聯絡方式": "",
+                    "其他": ""
+                }]
+            elif 'file_path' in image_data and os.path.exists(image_data['file_path']):
+                name_by_path[image_data['file_path']] = image_name
             else:
-                return image_name, [{
+                results[image_name] = [{
                     "工作": "無法讀取圖片",
                     "行業": "", "時間": "", "薪資": "",
                     "地點": "", "聯絡方式": "", "其他": "圖片檔案不存在"
                 }]
-            
+        return results, name_by_path
+    
+    def _original_process_id(self, process_id: str) -> str:
+        """提取原始的 process_id（移除 _page 或 _file 後綴）以便進度追蹤"""
+        if '_page' in process_id:
+            return process_id.split('_page')[0]
+        if '_file' in process_id:
+            return process_id.split('_file')[0]
+        return process_id
+    
+    def _collect_group_results(self, process_id: str, name_by_path: Dict[str, str], descriptions: Dict[str, List[Dict[str, Any]]],
+                               request_settings: Dict[str, Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """將 {檔案路徑: 工作列表} 轉為 {檔名: 工作列表}，並將請求圖片的編碼設定記錄在圖片資料中"""
+        results = {}
+        for image_path, description in descriptions.items():
+            image_name = name_by_path[image_path]
             print(f"處理完成圖片: {image_name}, 找到 {len(description)} 個工作")
-            return image_name, description
-            
+            results[image_name] = description
+            image_data = self.storage.get_image(process_id, image_name)
+            if image_data is not None and image_path in request_settings:
+                image_data['request_encoding'] = request_settings[image_path]
+        return results
+    
+    def _group_error_results(self, name_by_path: Dict[str, str], error: Exception) -> Dict[str, List[Dict[str, Any]]]:
+        """整組分析失敗時每張圖片的錯誤結果"""
+        print(f"獲取圖片描述時出錯: {str(error)}")
+        return {image_name: [{
+            "工作": "獲取描述時出錯",
+            "行業": "",
+            "時間": "",
+            "薪資": "",
+            "地點": "",
+            "聯絡方式": "",
+            "其他": str(error)
+        }] for image_name in name_by_path.values()}
+    
+    def analyze_image_group(self, api_key: str, process_id: str, image_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """分析一組圖片（同一次 AI 請求），返回 {檔名: 工作列表}"""
+        results, name_by_path = self._resolve_image_group(process_id, image_names)
+        if not name_by_path:
+            return results
+        
+        try:
+            # 使用檔案路徑進行分析，傳遞 process_id 以支援重試機制
+            request_settings = {}
+            descriptions = self.ai_service.analyze_jobs_batch(
+                api_key, list(name_by_path), self._original_process_id(process_id), request_settings=request_settings
+            )
+            results.update(self._collect_group_results(process_id, name_by_path, descriptions, request_settings))
         except Exception as e:
-            print(f"獲取圖片描述時出錯: {str(e)}")
-            return image_name, [{
-                "工作": "獲取描述時出錯",
-                "行業": "",
-                "時間": "",
-                "薪資": "",
-                "地點": "",
-                "聯絡方式": "",
-                "其他": str(e)
-            }]
+            results.update(self._group_error_results(name_by_path, e))
+        return results
+    
+    async def analyze_image_group_async(self, api_key: str, process_id: str, image_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """analyze_image_group 的協程版本，在非同步提取引擎的事件迴圈中執行"""
+        results, name_by_path = self._resolve_image_group(process_id, image_names)
+        if not name_by_path:
+            return results
+        
+        try:
+            request_settings = {}
+            descriptions = await self.async_extraction_engine.analyze_jobs_batch(
+                api_key, list(name_by_path), self._original_process_id(process_id), request_settings=request_settings
+            )
+            results.update(self._collect_group_results(process_id, name_by_path, descriptions, request_settings))
+        except Exception as e:
+            results.update(self._group_error_results(name_by_path, e))
+        return results
 
 # 創建全域圖像處理服務實例
 image_processing_service = ImageProcessingService() 
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+本地工作廣告預篩
+在呼叫 Gemini 之前以版面特徵估計區塊含有文字廣告的可能性：分割留下的插圖、照片碎片、
+空白與分區標題幾乎沒有排成行列的字元，直接判定為非工作區塊，不送出請求。
+只看版面、不辨識文字，無法區分新聞與商品廣告，門檻應只略過明顯不含文字的區塊
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+import cv2
+import numpy as np
+from config.settings import Config
+
+# 排列成行列的字元佔區塊面積達此比例時分數為 1（文字廣告通常在 0.1 以上）
+FULL_SCORE_GLYPH_AREA = 0.15
+# 字元候選超過此數量時一定是文字區塊，不再逐一比對（也避免兩兩比對的矩陣過大）
+MAX_GLYPH_CANDIDATES = 1500
+# shadow 模式下等待分析結果的區塊數上限，分析失敗而沒有回報結果的區塊依先後淘汰
+MAX_SHADOW_PATHS = 2000
+
+def _glyph_candidates(binary: np.ndarray) -> np.ndarray:
+    """返回可能是字元或筆畫的連通區域 stats：大小適中、不是實心色塊也不是細長線條"""
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    stats = stats[1:]
+    widths, heights = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    sides, shorts = np.maximum(widths, heights), np.minimum(widths, heights)
+    fill = stats[:, cv2.CC_STAT_AREA] / np.maximum(1, widths * heights)
+    is_glyph = (sides >= 5) & (sides <= min(binary.shape) / 2) & (fill > 0.1) & (fill < 0.85) & (shorts * 6 >= sides)
+    return stats[is_glyph]
+
+def _aligned_glyph_area(stats: np.ndarray, area: int) -> float:
+    """至少與兩個大小相近的字元候選排在同一行或同一列的候選，其外框佔區塊面積的比例"""
+    if len(stats) < 3:
+        return 0.0
+    boxes = stats[:, :4].astype(np.float32)
+    centers_x, centers_y = boxes[:, 0] + boxes[:, 2] / 2, boxes[:, 1] + boxes[:, 3] / 2
+    sizes = np.maximum(boxes[:, 2], boxes[:, 3])
+    pair_sizes = np.maximum(sizes[:, None], sizes[None])
+    similar = np.abs(sizes[:, None] - sizes[None]) <= 0.3 * pair_sizes
+    dx, dy = np.abs(centers_x[:, None] - centers_x[None]), np.abs(centers_y[:, None] - centers_y[None])
+    aligned = similar & (((dy < 0.25 * pair_sizes) & (dx < 2 * pair_sizes)) | ((dx < 0.25 * pair_sizes) & (dy < 2 * pair_sizes)))
+    np.fill_diagonal(aligned, False)
+    is_text = aligned.sum(axis=1) >= 2
+    return float((boxes[is_text, 2] * boxes[is_text, 3]).sum() / area)
+
+def score_job_block(image: np.ndarray, long_side: int = 512) -> float:
+    """區塊含有文字廣告的分數（0 到 1）
+
+    縮小到長邊 long_side 像素後分別以深色字與淺色字（反白）二值化，
+    取排列成行列的字元面積較大者；幾乎沒有對比的區塊（空白、色塊）為 0
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = long_side / max(gray.shape[:2])
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    low, high = np.percentile(gray, (1, 99))
+    if high - low < 30:
+        return 0.0
+
+    glyph_area = 0.0
+    for polarity in (cv2.THRESH_BINARY_INV, cv2.THRESH_BINARY):
+        binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, polarity, 31, int((high - low) * 0.12))
+        stats = _glyph_candidates(binary)
+        if len(stats) > MAX_GLYPH_CANDIDATES:
+            return 1.0
+        glyph_area = max(glyph_area, _aligned_glyph_area(stats, gray.size))
+    return min(1.0, glyph_area / FULL_SCORE_GLYPH_AREA)
+
+def has_jobs(jobs: List[Dict[str, Any]]) -> bool:
+    """分析結果是否包含工作（未識別、出錯或無法解析的結果不算）"""
+    return any(job.get('工作') not in ('', '未識別到工作資訊', '獲取描述時出錯') for job in jobs if isinstance(job, dict))
+
+class JobPrefilter:
+    """依 JOB_PREFILTER_MODE 與 JOB_PREFILTER_THRESHOLD 決定是否略過區塊，並累計略過數與召回損失
+
+    on：分數低於門檻的區塊不送出；shadow：只計分，仍然送出，之後統計這些區塊中模型找到工作的數量
+    （即開啟預篩會漏掉的區塊），用於在調整門檻前衡量召回損失；off：不計分
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shadow_paths: "OrderedDict[str, float]" = OrderedDict()  # shadow 模式下低於門檻、等待分析結果的區塊
+        self._scored = 0
+        self._skipped = 0
+        self._shadow_below_threshold = 0
+        self._shadow_with_jobs = 0
+        self._seconds = 0.0
+
+    def evaluate(self, image_path: str) -> Optional[Tuple[float, bool]]:
+        """為區塊計分，返回 (分數, 是否略過)；關閉或無法讀取圖片時返回 None（照常送出）"""
+        mode = Config.JOB_PREFILTER_MODE
+        if mode not in ('on', 'shadow'):
+            return None
+        start = time.perf_counter()
+        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return None
+        score = score_job_block(image)
+        below_threshold = score < Config.JOB_PREFILTER_THRESHOLD
+
+        with self._lock:
+            self._scored += 1
+            self._seconds += time.perf_counter() - start
+            if below_threshold and mode == 'on':
+                self._skipped += 1
+            elif below_threshold:
+                self._shadow_below_threshold += 1
+                self._shadow_paths[image_path] = score
+                while len(self._shadow_paths) > MAX_SHADOW_PATHS:
+                    self._shadow_paths.popitem(last=False)
+        return score, below_threshold and mode == 'on'
+
+    def record_results(self, results: Dict[str, List[Dict[str, Any]]]) -> None:
+        """記錄 shadow 模式下低於門檻的區塊實際是否含有工作"""
+        with self._lock:
+            for image_path, jobs in results.items():
+                if self._shadow_paths.pop(image_path, None) is not None and has_jobs(jobs):
+                    self._shadow_with_jobs += 1
+                    print(f"預篩分數低於門檻但模型找到工作: {image_path}")
+
+    def skipped_result(self, score: float) -> List[Dict[str, Any]]:
+        """略過的區塊的分析結果"""
+        return [{
+            "工作": "未識別到工作資訊",
+            "行業": "",
+            "時間": "",
+            "薪資": "",
+            "地點": "",
+            "聯絡方式": "",
+            "其他": f"本地預篩判定不含工作廣告（分數 {score:.2f}），未送出分析"
+        }]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取預篩統計資訊（本次啟動後的累計）"""
+        with self._lock:
+            return {
+                'mode': Config.JOB_PREFILTER_MODE,
+                'threshold': Config.JOB_PREFILTER_THRESHOLD,
+                'scored': self._scored,
+                'skipped': self._skipped,
+                'skip_rate': round(self._skipped / self._scored, 3) if self._scored else 0.0,
+                'shadow_below_threshold': self._shadow_below_threshold,
+                'shadow_below_threshold_with_jobs': self._shadow_with_jobs,
+                'shadow_pending': len(self._shadow_paths),
+                'avg_ms': round(self._seconds / self._scored * 1000, 1) if self._scored else 0.0
+            }
+
+# 創建全域工作廣告預篩實例
+job_prefilter = JobPrefilter()
@@ -0,0 +1,215 @@
+"""
+背景任務佇列服務
+將上傳檔案的處理工作交給背景工作執行緒，HTTP 請求只負責排入佇列
+"""
+import os
+import json
+import time
+import queue
+import threading
+from typing import Callable, Dict, Any, Optional, List
+from config.settings import Config
+
+class QueueFullError(Exception):
+    """任務佇列已滿"""
+    pass
+
+class JobQueue:
+    """有界、可持久化的本地任務佇列"""
+
+    # 不寫入磁碟的欄位（例如 API 密鑰）
+    TRANSIENT_FIELDS = ('api_key',)
+
+    def __init__(self, queue_folder: str, max_size: int, num_workers: int):
+        self.queue_folder = queue_folder
+        self.max_size = max_size
+        self.num_workers = max(1, num_workers)
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max_size)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._handler: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._workers: List[threading.Thread] = []
+        self._started = False
+
+    def set_handler(self, handler: Callable[[Dict[str, Any]], None]) -> None:
+        """設置處理任務的函數"""
+        self._handler = handler
+
+    def start(self) -> None:
+        """啟動工作執行緒並恢復上次未完成的任務"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        os.makedirs(self.queue_folder, exist_ok=True)
+        self._recover_pending_jobs()
+
+        for index in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{index + 1}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        print(f"任務佇列已啟動：{self.num_workers} 個工作執行緒，佇列上限 {self.max_size}")
+
+    def enqueue(self, process_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """將任務加入佇列，佇列已滿時拋出 QueueFullError"""
+        job = {
+            'process_id': process_id,
+            'status': 'queued',
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'error': '',
+            'payload': payload
+        }
+
+        with self._lock:
+            self._jobs[process_id] = job
+
+        # 先寫入磁碟再排入佇列，避免工作執行緒已完成任務後才留下記錄
+        self._persist(job)
+        try:
+            self._queue.put_nowait(process_id)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(process_id, None)
+            self._remove_persisted(process_id)
+            raise QueueFullError(f"任務佇列已滿（上限 {self.max_size}）")
+
+        return self.get_job(process_id)
+
+    def get_job(self, process_id: str) -> Optional[Dict[str, Any]]:
+        """獲取任務狀態（不包含任務內容）"""
+        with self._lock:
+            job = self._jobs.get(process_id)
+            if not job:
+                return None
+            job_info = {key: value for key, value in job.items() if key != 'payload'}
+            if job['status'] == 'queued':
+                queued_ids = [pid for pid, item in self._jobs.items() if item['status'] == 'queued']
+                queued_ids.sort(key=lambda pid: self._jobs[pid]['created_at'])
+                job_info['queue_position'] = queued_ids.index(process_id) + 1
+            return job_info
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取佇列統計資訊"""
+        with self._lock:
+            status_counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                status_counts[job['status']] = status_counts.get(job['status'], 0) + 1
+        return {
+            'max_size': self.max_size,
+            'workers': self.num_workers,
+            'pending': self._queue.qsize(),
+            'jobs': status_counts
+        }
+
+    def _worker_loop(self) -> None:
+        """工作執行緒主迴圈"""
+        while True:
+            process_id = self._queue.get()
+            try:
+                with self._lock:
+                    job = self._jobs.get(process_id)
+                if not job:
+                    continue
+
+                self._update_job(job, status='running', started_at=time.time())
+                try:
+                    if self._handler is None:
+                        raise RuntimeError("任務佇列尚未設置處理函數")
+                    self._handler(job['payload'])
+                    self._update_job(job, status='completed', finished_at=time.time())
+                except Exception as e:
+                    print(f"處理任務 {process_id} 時發生錯誤: {str(e)}")
+                    self._update_job(job, status='failed', finished_at=time.time(), error=str(e))
+                finally:
+                    self._remove_persisted(process_id)
+                    self._prune_finished_jobs()
+            finally:
+                self._queue.task_done()
+
+    def _update_job(self, job: Dict[str, Any], **changes) -> None:
+        """更新任務狀態並同步到磁碟"""
+        with self._lock:
+            job.update(changes)
+        if job['status'] in ('queued', 'running'):
+            self._persist(job)
+
+    def _prune_finished_jobs(self, max_age_seconds: int = 3600) -> None:
+        """移除已結束超過指定時間的任務記錄"""
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            expired = [pid for pid, job in self._jobs.items()
+                       if job['finished_at'] and job['finished_at'] < cutoff]
+            for pid in expired:
+                del self._jobs[pid]
+
+    def _job_file_path(self, process_id: str) -> str:
+        return os.path.join(self.queue_folder, f"{process_id}.json")
+
+    def _persist(self, job: Dict[str, Any]) -> None:
+        """將任務寫入磁碟，供重新啟動後恢復"""
+        payload = {key: value for key, value in job['payload'].items() if key not in self.TRANSIENT_FIELDS}
+        record = {key: value for key, value in job.items() if key != 'payload'}
+        record['payload'] = payload
+
+        try:
+            os.makedirs(self.queue_folder, exist_ok=True)
+            file_path = self._job_file_path(job['process_id'])
+            temp_path = file_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(temp_path, file_path)
+        except Exception as e:
+            print(f"寫入任務記錄失敗 {job['process_id']}: {str(e)}")
+
+    def _remove_persisted(self, process_id: str) -> None:
+        file_path = self._job_file_path(process_id)
+        if os.path.exists(file_path):
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                print(f"移除任務記錄失敗 {process_id}: {str(e)}")
+
+    def _recover_pending_jobs(self) -> None:
+        """恢復上次未完成的任務（中斷的任務會重新執行）"""
+        recovered = 0
+        for filename in sorted(os.listdir(self.queue_folder)):
+            if not filename.endswith('.json'):
+                continue
+            file_path = os.path.join(self.queue_folder, filename)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+            except Exception as e:
+                print(f"讀取任務記錄失敗 {filename}: {str(e)}")
+                continue
+
+            payload = record.get('payload', {})
+            missing_files = [item['path'] for item in payload.get('files', []) if not os.path.exists(item['path'])]
+            if missing_files:
+                print(f"任務 {record.get('process_id')} 的上傳檔案已不存在，捨棄此任務")
+                os.remove(file_path)
+                continue
+
+            # API 密鑰不會寫入磁碟，恢復時改用環境變數
+            payload.setdefault('api_key', os.environ.get('GEMINI_API_KEY', ''))
+
+            try:
+                self.enqueue(record['process_id'], payload)
+                recovered += 1
+            except QueueFullError:
+                print(f"任務佇列已滿，無法恢復任務 {record.get('process_id')}")
+                break
+
+        if recovered:
+            print(f"已恢復 {recovered} 個未完成的任務")
+
+# 創建全域任務佇列實例
+job_queue = JobQueue(
+    queue_folder=Config.JOB_QUEUE_FOLDER,
+    max_size=Config.JOB_QUEUE_MAX_SIZE,
+    num_workers=Config.JOB_QUEUE_WORKERS
+)
@@ -0,0 +1,106 @@
+"""
+本地圖片方向估計
+在縮小的頁面上以文字行的走向判斷文字軸向，再以文字行上下的筆畫分布判斷上下方向，
+不需要呼叫 API；信心不足時由 AIService 以 Gemini 評分剩餘的候選方向
+"""
+import math
+from collections import namedtuple
+from typing import Tuple
+import cv2
+import numpy as np
+
+# 方向名稱與 AIService.apply_rotation_to_image 相同（表示要把圖片轉正需要的旋轉）
+ORIENTATIONS = ("正確", "順時針90度", "180度", "逆時針90度")
+
+# direction：最可能的方向；confidence：0 到 1；candidates：信心不足時仍需比較的方向（依可能性排序）
+OrientationEstimate = namedtuple('OrientationEstimate', ['direction', 'confidence', 'candidates'])
+
+def _binarize(image: np.ndarray, long_side: int) -> np.ndarray:
+    """轉為灰階、縮小到長邊 long_side 像素後二值化（文字為白色）"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = long_side / max(gray.shape[:2])
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 15)
+
+def _glyph_mask(binary: np.ndarray) -> Tuple[np.ndarray, float]:
+    """只保留字元大小的連通區域，返回 (遮罩, 字元尺寸中位數)；找不到字元時尺寸為 0"""
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    sizes = np.maximum(stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT])
+    max_glyph = max(binary.shape) / 40
+    is_glyph = (sizes >= 3) & (sizes <= max_glyph)
+    is_glyph[0] = False
+    glyph_sizes = sizes[is_glyph & (sizes >= 4)]
+    if len(glyph_sizes) == 0:
+        return np.zeros_like(binary), 0.0
+    return is_glyph[labels].astype(np.uint8) * 255, float(np.median(glyph_sizes))
+
+def _horizontal_lines(glyphs: np.ndarray, glyph_size: float) -> np.ndarray:
+    """將字元水平相連成文字行，返回像文字行的區域 stats（寬至少為高的 4 倍、高度接近字高）"""
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (int(glyph_size * 1.5) | 1, 1))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(cv2.dilate(glyphs, kernel), connectivity=8)
+    widths, heights = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+    is_line = (widths >= 4 * heights) & (heights >= 0.4 * glyph_size) & (heights <= 2.5 * glyph_size)
+    return stats[1:][is_line]
+
+def _upright_score(glyphs: np.ndarray, lines: np.ndarray) -> float:
+    """水平文字行的上下方向分數，正值表示目前方向朝上
+
+    拉丁字母與數字的上伸部與越南文聲調符號多於下伸部，文字行主體上方的筆畫會多於下方；
+    以各行寬度加權平均 (上方 - 下方) / (上方 + 下方)
+    """
+    total = weight = 0.0
+    for x, y, width, height, _ in lines:
+        profile = np.count_nonzero(glyphs[y:y + height, x:x + width], axis=1).astype(np.float64)
+        core = np.flatnonzero(profile >= 0.5 * profile.max())
+        above, below = profile[:core[0]].sum(), profile[core[-1] + 1:].sum()
+        if above + below > 0:
+            total += width * (above - below) / (above + below)
+            weight += width
+    return total / weight if weight else 0.0
+
+def estimate_orientation(image: np.ndarray, long_side: int = 1600, axis_ratio: float = 4.0,
+                         upright_margin: float = 0.3, upright_prior: float = 0.05) -> OrientationEstimate:
+    """估計圖片需要的旋轉方向
+
+    文字軸向：比較水平與垂直相連的文字行總長度，比例達 axis_ratio 時軸向信心為 1。
+    上下方向：_upright_score 的絕對值達 upright_margin 時信心為 1。
+    中文版面的上下方向訊號較弱，分數不足時信心會偏低，交由呼叫端以模型比較同軸的兩個方向；
+    倒置的掃描很少見，水平文字的分數高於 -upright_prior 時以正確為優先候選
+    """
+    binary = _binarize(image, long_side)
+    glyphs, glyph_size = _glyph_mask(binary)
+    del binary
+    if glyph_size == 0:
+        return OrientationEstimate("正確", 0.0, list(ORIENTATIONS))
+
+    # 垂直文字行以轉置後的水平行計算；順時針旋轉後垂直文字變為水平
+    rotated_glyphs = cv2.rotate(glyphs, cv2.ROTATE_90_CLOCKWISE)
+    horizontal_lines = _horizontal_lines(glyphs, glyph_size)
+    vertical_lines = _horizontal_lines(rotated_glyphs, glyph_size)
+    horizontal_length = float(horizontal_lines[:, cv2.CC_STAT_WIDTH].sum())
+    vertical_length = float(vertical_lines[:, cv2.CC_STAT_WIDTH].sum())
+    if horizontal_length + vertical_length == 0:
+        return OrientationEstimate("正確", 0.0, list(ORIENTATIONS))
+
+    log_ratio = math.log((horizontal_length + 1) / (vertical_length + 1))
+    axis_confidence = min(1.0, abs(log_ratio) / math.log(axis_ratio))
+
+    if log_ratio >= 0:
+        score = _upright_score(glyphs, horizontal_lines)
+        # 倒置的掃描很少見，分數接近 0 時以正確為優先候選
+        direction = "正確" if score > -upright_prior else "180度"
+        upright_confidence = min(1.0, abs(score) / upright_margin)
+        candidates = [direction, "180度" if direction == "正確" else "正確"]
+    else:
+        score = _upright_score(rotated_glyphs, vertical_lines)
+        direction = "順時針90度" if score >= 0 else "逆時針90度"
+        upright_confidence = min(1.0, abs(score) / upright_margin)
+        candidates = [direction, "逆時針90度" if direction == "順時針90度" else "順時針90度"]
+
+    confidence = min(axis_confidence, upright_confidence)
+    if axis_confidence < 1.0:
+        # 軸向不確定時四個方向都需要比較
+        candidates += [name for name in ORIENTATIONS if name not in candidates]
+    print(f"本地方向估計: {direction}（信心 {confidence:.2f}，水平/垂直文字行 {horizontal_length:.0f}/{vertical_length:.0f}，上下分數 {score:+.2f}）")
+    return OrientationEstimate(direction, confidence, candidates)
@@ -0,0 +1,226 @@
+"""
+Gemini 請求排程服務
+以每個 API 密鑰與模型的權杖桶（每分鐘請求數與 token 數，Gemini 的配額以密鑰計算）主動控制送出速度，
+遇到 429 時使用同一個密鑰的所有執行緒共用同一個退避時間，等待中的請求依優先順序（方向檢測優先於工作資訊提取）送出
+"""
+import math
+import asyncio
+import time
+import hashlib
+import heapq
+import itertools
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from config.settings import Config
+
+# 優先順序：數字越小越先送出
+PRIORITY_ORIENTATION = 0
+PRIORITY_EXTRACTION = 1
+
+# Gemini 圖片的 token 計算：兩邊都不超過 384 像素時為 258 個 token，否則每個 768x768 區塊 258 個 token
+IMAGE_TILE_TOKENS = 258
+
+def image_tokens(width: int, height: int) -> int:
+    """一張圖片的 token 數"""
+    if width <= 384 and height <= 384:
+        return IMAGE_TILE_TOKENS
+    return math.ceil(width / 768) * math.ceil(height / 768) * IMAGE_TILE_TOKENS
+
+def estimate_request_tokens(prompt: str, image_sizes: List[tuple], output_tokens: int = 500) -> int:
+    """估計一次請求使用的 token 數（中文約每字一個 token，加上圖片與預期的輸出）"""
+    return len(prompt) + sum(image_tokens(width, height) for width, height in image_sizes) + output_tokens
+
+class TokenBucket:
+    """權杖桶：每秒補充 rate 個權杖，最多累積 capacity 個"""
+
+    def __init__(self, per_minute: float, capacity: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """取得 amount 個權杖還需要等待的秒數（超過容量的請求以容量計算）"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self, now: float) -> None:
+        """清空權杖（收到 429 時，退避結束後從零開始補充）"""
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+def key_label(api_key: str) -> str:
+    """統計資訊中代表 API 密鑰的短雜湊（不顯示密鑰本身）"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:8] if api_key else '-'
+
+class _ModelLimiter:
+    """單一 API 密鑰與模型的權杖桶、退避狀態與等待佇列
+
+    請求數的權杖桶只能累積 1 個權杖，請求平均分散送出，任何一分鐘內都不會超過配額而觸發 429；
+    token 數的權杖桶可累積 burst_seconds 秒的配額，讓單一的大型請求也能送出
+    """
+
+    def __init__(self, rpm: int, tpm: int, burst_seconds: float):
+        self.requests = TokenBucket(max(rpm - 1, 1), 1) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, tpm / 60.0 * burst_seconds) if tpm > 0 else None
+        self.backoff_until = 0.0
+        self.waiters: List[tuple] = []
+        self.sent = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+        self.last_used = time.monotonic()
+
+    def is_idle(self, now: float, idle_seconds: float) -> bool:
+        """沒有等待者、不在退避中且已閒置 idle_seconds 秒（權杖桶早已補滿，刪除後重建的狀態相同）"""
+        return not self.waiters and self.backoff_until <= now and now - self.last_used >= idle_seconds
+
+class RequestScheduler:
+    """全程序共用的 Gemini 請求排程器，每個 API 密鑰與模型各自排隊與計算配額"""
+
+    # 協程等待者沒有排在最前面時檢查的間隔
+    ASYNC_POLL_SECONDS = 0.05
+    # 閒置超過此秒數的密鑰與模型狀態在建立新狀態時刪除
+    IDLE_LIMITER_SECONDS = 600
+
+    def __init__(self, rpm: int, tpm: int, burst_seconds: float = 10.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.burst_seconds = burst_seconds
+        self._condition = threading.Condition()
+        self._limiters: Dict[Tuple[str, str], _ModelLimiter] = {}
+        self._sequence = itertools.count()
+
+    def _limiter(self, api_key: str, model: str) -> _ModelLimiter:
+        """取得 API 密鑰與模型的限制狀態（呼叫端需持有鎖）"""
+        limiter = self._limiters.get((api_key, model))
+        if limiter is None:
+            now = time.monotonic()
+            for key in [key for key, idle in self._limiters.items() if idle.is_idle(now, self.IDLE_LIMITER_SECONDS)]:
+                del self._limiters[key]
+            limiter = self._limiters[(api_key, model)] = _ModelLimiter(self.rpm, self.tpm, self.burst_seconds)
+        limiter.last_used = time.monotonic()
+        return limiter
+
+    def _try_take(self, limiter: _ModelLimiter, ticket: tuple, tokens: int) -> Optional[float]:
+        """輪到 ticket 且權杖足夠時取得權杖並返回 0，否則返回還需要等待的秒數（不在最前面時為 None）
+
+        呼叫端需持有鎖
+        """
+        if limiter.waiters[0] != ticket:
+            return None
+        now = time.monotonic()
+        timeout = max(
+            limiter.backoff_until - now,
+            limiter.requests.wait_time(1, now) if limiter.requests else 0.0,
+            limiter.tokens.wait_time(tokens, now) if limiter.tokens and tokens else 0.0
+        )
+        if timeout <= 0:
+            if limiter.requests:
+                limiter.requests.consume(1, now)
+            if limiter.tokens and tokens:
+                limiter.tokens.consume(tokens, now)
+            return 0.0
+        return timeout
+
+    def _leave(self, limiter: _ModelLimiter, ticket: tuple) -> None:
+        """將 ticket 移出等待佇列並喚醒其他等待者（呼叫端需持有鎖）"""
+        limiter.waiters.remove(ticket)
+        heapq.heapify(limiter.waiters)
+        self._condition.notify_all()
+
+    def acquire(self, api_key: str, model: str, priority: int = PRIORITY_EXTRACTION, tokens: int = 0) -> float:
+        """等待到可以送出請求為止，返回等待的秒數
+
+        同一密鑰與模型的請求依 (優先順序, 到達順序) 排隊，只有排在最前面的請求可以取得權杖；
+        不同密鑰的配額互不影響
+        """
+        start = time.monotonic()
+        with self._condition:
+            limiter = self._limiter(api_key, model)
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(limiter.waiters, ticket)
+            try:
+                while True:
+                    timeout = self._try_take(limiter, ticket, tokens)
+                    if timeout == 0:
+                        break
+                    self._condition.wait(timeout)
+            finally:
+                self._leave(limiter, ticket)
+
+            waited = time.monotonic() - start
+            limiter.sent += 1
+            limiter.total_wait += waited
+        return waited
+
+    async def acquire_async(self, api_key: str, model: str, priority: int = PRIORITY_EXTRACTION, tokens: int = 0) -> float:
+        """acquire 的協程版本，等待時不佔用執行緒，與執行緒中的請求共用同一個佇列與權杖桶
+
+        執行緒的等待者會被喚醒，協程的等待者則在不是最前面時每 ASYNC_POLL_SECONDS 秒檢查一次
+        """
+        start = time.monotonic()
+        with self._condition:
+            limiter = self._limiter(api_key, model)
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(limiter.waiters, ticket)
+        try:
+            while True:
+                with self._condition:
+                    timeout = self._try_take(limiter, ticket, tokens)
+                if timeout == 0:
+                    break
+                await asyncio.sleep(self.ASYNC_POLL_SECONDS if timeout is None else timeout)
+        finally:
+            with self._condition:
+                self._leave(limiter, ticket)
+
+        with self._condition:
+            waited = time.monotonic() - start
+            limiter.sent += 1
+            limiter.total_wait += waited
+        return waited
+
+    def report_rate_limit(self, api_key: str, model: str, retry_delay: float) -> float:
+        """收到 429 時設定該密鑰與模型共用的退避時間，返回距離退避結束的秒數"""
+        with self._condition:
+            limiter = self._limiter(api_key, model)
+            now = time.monotonic()
+            limiter.backoff_until = max(limiter.backoff_until, now + retry_delay)
+            limiter.rate_limited += 1
+            for bucket in (limiter.requests, limiter.tokens):
+                if bucket:
+                    bucket.drain(now)
+            self._condition.notify_all()
+            return limiter.backoff_until - now
+
+    def backoff_remaining(self, api_key: str, model: str) -> float:
+        """距離密鑰與模型退避結束的秒數"""
+        with self._condition:
+            return max(0.0, self._limiter(api_key, model).backoff_until - time.monotonic())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取各密鑰與模型的排程統計資訊，密鑰以 key_label 的短雜湊表示"""
+        with self._condition:
+            now = time.monotonic()
+            keys: Dict[str, Dict[str, Any]] = {}
+            for (api_key, model), limiter in self._limiters.items():
+                keys.setdefault(key_label(api_key), {})[model] = {
+                    'sent': limiter.sent,
+                    'waiting': len(limiter.waiters),
+                    'rate_limited': limiter.rate_limited,
+                    'backoff_seconds': round(max(0.0, limiter.backoff_until - now), 1),
+                    'average_wait_seconds': round(limiter.total_wait / limiter.sent, 2) if limiter.sent else 0.0
+                }
+        return {'rpm_limit': self.rpm, 'tpm_limit': self.tpm, 'keys': keys}
+
+# 創建全域 Gemini 請求排程器實例
+gemini_scheduler = RequestScheduler(rpm=Config.GEMINI_RPM_LIMIT, tpm=Config.GEMINI_TPM_LIMIT)
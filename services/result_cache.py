@@ -0,0 +1,157 @@
+"""
+結果快取服務
+以內容雜湊為鍵保存 Gemini 分析結果，重複出現的區塊（每日刊登的分類廣告、重新上傳的同一期報紙）不需再次呼叫 API；
+以頁面內容雜湊為鍵保存方向檢測結果，完全相同的頁面不需再次檢測方向
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+import numpy as np
+from config.settings import Config
+
+def file_content_hash(file_path: str, *parts: str) -> str:
+    """計算檔案內容與額外欄位（例如模型名稱、提示詞版本）的 SHA-256 雜湊"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def image_content_hash(image: np.ndarray) -> str:
+    """頁面像素與尺寸的雜湊，只有內容完全相同的頁面才會相同
+
+    方向結果只在頁面完全相同時重用：相似的版面（同一版型的另一期、重新掃描）方向可能不同，
+    誤用快取會把整頁轉錯方向；旋轉後的頁面尺寸或像素順序不同，雜湊也不同
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.shape}:{image.dtype}".encode('utf-8'))
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+class ResultCache:
+    """有容量上限、以 SQLite 持久化的 LRU 結果快取，可設定結果的有效時間"""
+
+    def __init__(self, db_path: str, max_entries: int, enabled: bool = True, max_age_seconds: Optional[float] = None):
+        self.db_path = db_path
+        self.max_entries = max(1, max_entries)
+        self.enabled = enabled
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """第一次使用時才開啟資料庫（呼叫端需持有鎖）"""
+        if self._connection is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+            self._connection.commit()
+        return self._connection
+
+    def get(self, key: str) -> Optional[Any]:
+        """讀取快取結果並更新最近使用時間，不存在或已過期時返回 None"""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                connection = self._connect()
+                now = time.time()
+                row = connection.execute('SELECT value, created_at FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None and self.max_age_seconds is not None and now - row[1] > self.max_age_seconds:
+                    connection.execute('DELETE FROM results WHERE key = ?', (key,))
+                    connection.commit()
+                    self._evictions += 1
+                    row = None
+                if row is None:
+                    self._misses += 1
+                    return None
+                connection.execute('UPDATE results SET last_used = ? WHERE key = ?', (now, key))
+                connection.commit()
+                self._hits += 1
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"讀取結果快取失敗: {str(e)}")
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        """寫入快取結果，超過容量時淘汰最久未使用的項目"""
+        if not self.enabled:
+            return
+        try:
+            with self._lock:
+                connection = self._connect()
+                now = time.time()
+                connection.execute(
+                    'INSERT OR REPLACE INTO results (key, value, created_at, last_used) VALUES (?, ?, ?, ?)',
+                    (key, json.dumps(value, ensure_ascii=False), now, now)
+                )
+                count = connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+                if count > self.max_entries:
+                    evicted = connection.execute(
+                        'DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)',
+                        (count - self.max_entries,)
+                    ).rowcount
+                    self._evictions += evicted
+                connection.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"寫入結果快取失敗: {str(e)}")
+
+    def clear(self) -> None:
+        """清除所有快取結果與統計"""
+        with self._lock:
+            connection = self._connect()
+            connection.execute('DELETE FROM results')
+            connection.commit()
+            self._hits = self._misses = self._evictions = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取快取統計資訊（命中與未命中次數為本次啟動後的累計）"""
+        entries = 0
+        if self.enabled:
+            try:
+                with self._lock:
+                    entries = self._connect().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            except sqlite3.Error as e:
+                print(f"讀取結果快取統計失敗: {str(e)}")
+        lookups = self._hits + self._misses
+        return {
+            'enabled': self.enabled,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'max_age_hours': round(self.max_age_seconds / 3600, 1) if self.max_age_seconds is not None else None,
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0
+        }
+
+# 創建全域工作資訊提取結果快取實例
+extraction_cache = ResultCache(
+    db_path=os.path.join(Config.CACHE_FOLDER, 'extraction_cache.sqlite3'),
+    max_entries=Config.EXTRACTION_CACHE_MAX_ENTRIES,
+    enabled=Config.EXTRACTION_CACHE_ENABLED
+)
+
+# 創建全域方向檢測結果快取實例
+orientation_cache = ResultCache(
+    db_path=os.path.join(Config.CACHE_FOLDER, 'orientation_cache.sqlite3'),
+    max_entries=Config.ORIENTATION_CACHE_MAX_ENTRIES,
+    enabled=Config.ORIENTATION_CACHE_ENABLED,
+    max_age_seconds=Config.ORIENTATION_CACHE_TTL_HOURS * 3600
+)
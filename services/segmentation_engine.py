@@ -0,0 +1,121 @@
+"""
+區塊分割引擎
+使用多進程池並行執行區塊分割，頁面像素透過共享記憶體傳給子進程，避免序列化大型陣列
+子進程只回傳區塊幾何資訊，裁切與除錯圖像在主進程中直接從原圖產生
+"""
+import os
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Optional, Tuple, Dict, Any
+import numpy as np
+from config.settings import Config
+from image_processor import detect_regions, segment_image
+
+def _detect_shared_regions(shm_name: str, shape: Tuple[int, ...], dtype: str,
+                           analysis_scale: float, resolution_scale: float = 1.0) -> Dict[str, Any]:
+    """子進程入口：從共享記憶體讀取頁面並計算區塊幾何資訊"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        try:
+            return detect_regions(image, analysis_scale=analysis_scale, resolution_scale=resolution_scale)
+        finally:
+            # 釋放對共享記憶體的引用後才能關閉
+            del image
+    finally:
+        shm.close()
+
+def _default_worker_count() -> int:
+    """依可用的 CPU 核心數決定子進程數量"""
+    if Config.SEGMENTATION_WORKERS > 0:
+        return Config.SEGMENTATION_WORKERS
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+class SegmentationEngine:
+    """多核心區塊分割引擎"""
+
+    def __init__(self, max_workers: Optional[int] = None, analysis_scale: Optional[float] = None):
+        self.max_workers = max_workers or _default_worker_count()
+        # 輪廓偵測在縮小圖上執行，裁切仍使用原解析度頁面
+        self.analysis_scale = analysis_scale or Config.SEGMENTATION_ANALYSIS_SCALE
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        """延遲建立進程池（使用 spawn，避免在多執行緒的伺服器中 fork）"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                print(f"區塊分割進程池已建立，共 {self.max_workers} 個子進程")
+            return self._executor
+
+    def _reset_executor(self) -> None:
+        """進程池損壞時（例如子進程被終止）丟棄並於下次重建"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def submit(self, image: np.ndarray, analysis_scale: Optional[float] = None,
+               resolution_scale: float = 1.0) -> concurrent.futures.Future:
+        """提交一頁進行區塊偵測，返回結果為幾何資訊的 Future
+
+        resolution_scale 為頁面解析度相對於分割門檻基準的比例（見 detect_regions）
+        """
+        image = np.ascontiguousarray(image)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        try:
+            shared_image = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+            shared_image[...] = image
+            del shared_image
+
+            future = self._get_executor().submit(
+                _detect_shared_regions, shm.name, image.shape, image.dtype.str,
+                analysis_scale or self.analysis_scale, resolution_scale
+            )
+        except Exception:
+            shm.close()
+            shm.unlink()
+            raise
+
+        def release_shared_memory(_):
+            shm.close()
+            shm.unlink()
+
+        future.add_done_callback(release_shared_memory)
+        return future
+
+    def detect(self, image: np.ndarray, analysis_scale: Optional[float] = None,
+               resolution_scale: float = 1.0) -> Dict[str, Any]:
+        """在子進程中計算區塊幾何資訊並等待完成"""
+        try:
+            return self.submit(image, analysis_scale, resolution_scale).result()
+        except BrokenProcessPool:
+            print("區塊分割進程池已損壞，重建後重試")
+            self._reset_executor()
+            return self.submit(image, analysis_scale, resolution_scale).result()
+
+    def segment(self, image: np.ndarray, image_name: str, include_debug: bool = True,
+                analysis_scale: Optional[float] = None, resolution_scale: float = 1.0) -> Dict[str, Any]:
+        """分割圖像並在記憶體中返回區塊（格式同 image_processor.segment_image）"""
+        geometry = self.detect(image, analysis_scale, resolution_scale)
+        return segment_image(image, image_name, include_debug=include_debug, geometry=geometry)
+
+    def shutdown(self) -> None:
+        """關閉進程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+# 創建全域區塊分割引擎實例
+segmentation_engine = SegmentationEngine()
@@ -158,6 +158,13 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // 顯示通知
+    // 將伺服器傳回的錯誤訊息轉為可安全放入通知的文字
+    function escapeHtml(text) {
+        const element = document.createElement('div');
+        element.textContent = text;
+        return element.innerHTML;
+    }
+
     function showNotification(message, type = 'info') {
         // 創建或獲取通知容器
         let notificationContainer = document.getElementById('notification-container');
@@ -330,6 +337,38 @@ document.addEventListener('DOMContentLoaded', function() {
         showNotification('已重新連接到伺服器', 'success');
     });
     
+    // 輪詢背景任務狀態，直到任務完成或失敗（SocketIO 斷線時也能得知結果）
+    function waitForJobCompletion(statusUrl, intervalMs = 3000) {
+        return new Promise((resolve, reject) => {
+            const poll = async () => {
+                try {
+                    const statusResponse = await fetch(statusUrl);
+                    if (!statusResponse.ok) {
+                        // 任務不存在（伺服器重新啟動後被捨棄或已被清除）或伺服器錯誤時停止查詢
+                        reject(new Error(statusResponse.status === 404
+                            ? '找不到處理任務，可能因伺服器重新啟動或檔案已被清除，請重新上傳'
+                            : `查詢任務狀態失敗（HTTP ${statusResponse.status}）`));
+                        return;
+                    }
+                    const job = await statusResponse.json();
+                    if (job.status === 'completed') {
+                        resolve(job);
+                        return;
+                    }
+                    if (job.status === 'failed') {
+                        reject(new Error(job.error || '處理失敗'));
+                        return;
+                    }
+                } catch (error) {
+                    // 網路暫時中斷時繼續查詢
+                    console.warn('查詢任務狀態失敗:', error);
+                }
+                setTimeout(poll, intervalMs);
+            };
+            setTimeout(poll, intervalMs);
+        });
+    }
+    
     // 開始處理
     async function startProcessing() {
         try {
@@ -481,31 +520,47 @@ document.addEventListener('DOMContentLoaded', function() {
             // 添加處理選項和 process_id
             const autoRotate = document.getElementById('auto-rotate').checked;
             const parallelProcess = document.getElementById('parallel-process').checked;
+            const debugArtifacts = document.getElementById('debug-artifacts').value;
             formData.append('auto_rotate', autoRotate);
             formData.append('parallel_process', parallelProcess);
+            formData.append('debug_artifacts', debugArtifacts);
             formData.append('process_id', currentProcessId);
             
-            // 實際提交表單
+            // 實際提交表單（伺服器將任務排入佇列後立即回應）
             const response = await fetch('/upload', {
                 method: 'POST',
                 body: formData
             });
             
-            if (response.ok) {
-                // 確保進度條達到100%
-                progressBar.style.width = '100%';
-                updateStep('complete', 'completed');
-                
-                setTimeout(() => {
-                    // 清理監聽器和離開房間
-                    socket.off('progress_update');
-                    socket.emit('leave_process', { process_id: currentProcessId });
-                    window.location.href = response.url;
-                }, 1000);
-            } else {
+            if (!response.ok) {
                 throw new Error('處理失敗');
             }
             
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!contentType.includes('application/json')) {
+                // 驗證失敗時伺服器會重定向回首頁並顯示訊息
+                socket.off('progress_update');
+                socket.emit('leave_process', { process_id: currentProcessId });
+                window.location.href = response.url;
+                return;
+            }
+            
+            const jobData = await response.json();
+            
+            // 等待背景任務完成
+            await waitForJobCompletion(jobData.status_url);
+            
+            // 確保進度條達到100%
+            progressBar.style.width = '100%';
+            updateStep('complete', 'completed');
+            
+            setTimeout(() => {
+                // 清理監聽器和離開房間
+                socket.off('progress_update');
+                socket.emit('leave_process', { process_id: currentProcessId });
+                window.location.href = jobData.results_url;
+            }, 1000);
+            
         } catch (error) {
             // 清理監聽器和離開房間
             socket.off('progress_update');
@@ -514,7 +569,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (processingModal) {
                 processingModal.hide();
             }
-            showNotification('處理過程中發生錯誤，請重試', 'danger');
+            showNotification(`處理過程中發生錯誤：${escapeHtml(error.message || '請重試')}`, 'danger');
             console.error('Upload error:', error);
         }
     }
@@ -269,7 +269,7 @@ function switchToImageTab(imageId) {
     setTimeout(findAndScrollToImage, 100);
 }
 
-function showStepImageModal(filename, stepNumber, base64Data, format) {
+function showStepImageModal(filename, stepNumber, imageSrc) {
     // 顯示處理步驟圖像模態框
     const stepImageModal = new bootstrap.Modal(document.getElementById('stepImageModal'));
     stepImageModal.show();
@@ -286,7 +286,7 @@ function showStepImageModal(filename, stepNumber, base64Data, format) {
     
     // 設置圖像
     const stepModalImage = document.getElementById('stepModalImage');
-    stepModalImage.src = `data:image/${format};base64,${base64Data}`;
+    stepModalImage.src = imageSrc;
 }
 
 // 下載相關函數
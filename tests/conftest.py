@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共用的測試設定
+
+fake_gemini 以固定或依請求內容產生的回答取代 Gemini，建立不需網路與 API 配額的 AIService
+"""
+
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from services.ai_service import AIService  # noqa: E402
+from services import gemini_client  # noqa: E402
+from services.rate_limiter import RequestScheduler  # noqa: E402
+from services.result_cache import ResultCache  # noqa: E402
+
+
+class FakeGemini:
+    """GeminiModel 的替身，記錄每次請求的內容（文字與 {'mime_type', 'data'} 圖片的列表）
+
+    answer 為固定的回應文字，或以請求內容計算回應文字的函數（拋出的例外視為 API 錯誤）；
+    可在測試中途替換 answer
+    """
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.requests = []
+
+    def __call__(self, model_name, generation_config=None, client=None, async_client=None):
+        # 取代 GeminiModel 類別：所有模型都由同一個替身回答
+        return self
+
+    def generate_content(self, contents):
+        self.requests.append(contents)
+        text = self.answer(contents) if callable(self.answer) else self.answer
+        return type('Response', (), {'text': text})()
+
+    async def generate_content_async(self, contents):
+        return self.generate_content(contents)
+
+
+@pytest.fixture
+def fake_gemini(tmp_path, monkeypatch):
+    """fake_gemini(answer) 返回 (AIService, FakeGemini)：服務使用暫存目錄的結果快取且不限制請求速率"""
+    def build(answer):
+        fake = FakeGemini(answer)
+        monkeypatch.setattr(gemini_client, 'GeminiModel', fake)
+        service = AIService()
+        service.extraction_cache = ResultCache(str(tmp_path / 'cache.sqlite3'), max_entries=100)
+        service.scheduler = RequestScheduler(rpm=0, tpm=0)
+        return service, fake
+    return build
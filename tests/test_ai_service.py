@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI 服務測試
+
+確認 Gemini 模型依 API 密鑰共用連線，不使用會被其他執行緒覆蓋的全域設定，
+以及多個區塊合併為一次請求後能正確拆回各區塊的結果，回答被截斷時保留已完整的區塊
+"""
+
+import os
+import re
+import sys
+import json
+import time
+
+import cv2
+import google.generativeai as genai
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from config.settings import Config  # noqa: E402
+from services.ai_service import AIService  # noqa: E402
+
+
+def test_model_pool_reuses_clients_per_key(monkeypatch):
+    def fail_configure(**kwargs):
+        raise AssertionError('不應使用全域設定')
+
+    monkeypatch.setattr(genai, 'configure', fail_configure)
+    monkeypatch.setattr(Config, 'GEMINI_CLIENT_POOL_SIZE', 2)
+    service = AIService()
+    config = {'temperature': 0.0, 'top_k': 1}
+
+    first = service.get_model('key-a', 'gemini-test', config)
+    assert service.get_model('key-a', 'gemini-test', dict(config)) is first
+    other_model = service.get_model('key-a', 'gemini-other')
+    assert other_model is not first and other_model.client is first.client
+
+    second_key = service.get_model('key-b', 'gemini-test', config)
+    assert second_key.client is not first.client
+
+    # 超過上限時淘汰最久未使用的密鑰
+    service.get_model('key-c', 'gemini-test', config)
+    assert list(service._clients) == ['key-b', 'key-c']
+
+
+def label_answer(drop=(), single='[]'):
+    """依請求中的區塊代號回答的函數；drop 中的代號不回答，single 為單一區塊請求的回答"""
+    def answer(contents):
+        labels = [part for part in contents if isinstance(part, str) and part.startswith('圖片 ')]
+        if not labels:
+            return single
+        jobs = {}
+        for label in labels:
+            label = re.match(r'圖片 (B\d+)', label).group(1)
+            if label not in drop:
+                jobs[label] = [{'工作': f'職位{label}'}]
+        return '```json\n' + json.dumps(jobs, ensure_ascii=False) + '\n```'
+    return answer
+
+
+@pytest.fixture
+def batch_service(fake_gemini, monkeypatch):
+    """依區塊代號回答的服務，返回 (服務, 替身)"""
+    monkeypatch.setattr(Config, 'JOB_PREFILTER_MODE', 'off')  # 測試用的單色區塊不含文字
+    return fake_gemini(label_answer())
+
+
+def write_blocks(tmp_path, count):
+    paths = []
+    for index in range(count):
+        path = str(tmp_path / f'block{index}.jpg')
+        cv2.imwrite(path, np.full((40, 60, 3), index * 20, dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+
+def test_batch_results_are_split_by_label(tmp_path, batch_service):
+    service, fake = batch_service
+    paths = write_blocks(tmp_path, 3)
+    results = service.analyze_jobs_batch('key', paths)
+    assert len(fake.requests) == 1
+    assert [results[path][0]['工作'] for path in paths] == ['職位B1', '職位B2', '職位B3']
+    assert results[paths[0]][0]['薪資'] == ''
+
+    # 再次分析時全部使用快取
+    assert service.analyze_jobs_batch('key', paths) == results
+    assert len(fake.requests) == 1
+
+
+def test_missing_labels_fall_back_to_single_requests(tmp_path, batch_service):
+    service, fake = batch_service
+    fake.answer = label_answer(drop=('B2',), single='[{"工作": "單獨分析"}]')
+    paths = write_blocks(tmp_path, 3)
+    results = service.analyze_jobs_batch('key', paths)
+    assert len(fake.requests) == 2
+    assert results[paths[1]][0]['工作'] == '單獨分析'
+    assert results[paths[2]][0]['工作'] == '職位B3'
+
+
+def test_batches_respect_count_and_size_limits(tmp_path, monkeypatch):
+    paths = write_blocks(tmp_path, 5)
+    service = AIService()
+    monkeypatch.setattr(Config, 'EXTRACTION_BATCH_SIZE', 2)
+    assert service.plan_extraction_batches(paths) == [paths[0:2], paths[2:4], paths[4:5]]
+
+    monkeypatch.setattr(Config, 'EXTRACTION_BATCH_SIZE', 10)
+    monkeypatch.setattr(Config, 'EXTRACTION_BATCH_MAX_BYTES', os.path.getsize(paths[0]) * 3 - 1)
+    assert [len(batch) for batch in service.plan_extraction_batches(paths)] == [2, 2, 1]
+
+
+def test_request_settings_are_recorded_and_cached(tmp_path, batch_service, monkeypatch):
+    service, fake = batch_service
+    monkeypatch.setattr(Config, 'BLOCK_ENCODING', 'compact')
+    paths = write_blocks(tmp_path, 2)
+    settings = {}
+    service.analyze_jobs_batch('key', paths, request_settings=settings)
+    images = [part for part in fake.requests[0] if isinstance(part, dict)]
+    assert [part['mime_type'] for part in images] == ['image/jpeg', 'image/jpeg']
+    assert settings[paths[0]]['encoding'] == 'compact' and settings[paths[0]]['bytes'] == len(images[0]['data'])
+
+    # 快取的結果也帶有當時的編碼設定
+    cached_settings = {}
+    service.analyze_jobs_batch('key', paths, request_settings=cached_settings)
+    assert cached_settings == settings
+    assert len(fake.requests) == 1
+
+    # 改變編碼設定時不使用舊的快取結果
+    monkeypatch.setattr(Config, 'BLOCK_ENCODING', 'original')
+    original_settings = {}
+    service.analyze_jobs_batch('key', paths, request_settings=original_settings)
+    assert len(fake.requests) == 2
+    assert original_settings[paths[0]]['encoding'] == 'original'
+
+
+def test_truncated_batch_answer_keeps_complete_labels(tmp_path, batch_service):
+    service, fake = batch_service
+    answers = ['好的：\n```json\n{"B1": [{"工作": "司機",}], "B2": [], "B3": [{"工作": "作業',
+               '[{"工作": "作業員"}, {"工作": "清潔']
+    fake.answer = lambda contents: answers[len(fake.requests) - 1]
+    paths = write_blocks(tmp_path, 3)
+    results = service.analyze_jobs_batch('key', paths)
+
+    # 只有被截斷的 B3 改為單獨請求，單獨請求的回答也被截斷時保留完整的工作但不快取
+    assert len(fake.requests) == 2
+    assert results[paths[0]][0]['工作'] == '司機' and results[paths[0]][0]['薪資'] == ''
+    assert results[paths[1]][0]['工作'] == '未識別到工作資訊'
+    assert [job['工作'] for job in results[paths[2]]] == ['作業員']
+    assert service.get_cached_jobs(service.extraction_cache_key(paths[0])) is not None
+    assert service.get_cached_jobs(service.extraction_cache_key(paths[2])) is None
+
+
+def test_rate_limited_request_waits_once_in_scheduler(tmp_path, batch_service):
+    service, fake = batch_service
+
+    def rate_limited_once(contents):
+        if len(fake.requests) == 1:
+            raise Exception('429 Resource has been exhausted. retry_delay { seconds: 1 }')
+        return '[{"工作": "司機"}]'
+
+    updates = []
+    fake.answer = rate_limited_once
+    service.progress_tracker = type('Tracker', (), {'update_progress': lambda self, *args: updates.append(args)})()
+    path = write_blocks(tmp_path, 1)[0]
+    start = time.monotonic()
+    jobs = service.analyze_job_from_image('key', path, process_id='pid')
+    elapsed = time.monotonic() - start
+
+    # 只由排程器等待 retry_delay 一次，進度只通知一次
+    assert jobs[0]['工作'] == '司機'
+    assert 0.9 <= elapsed < 1.8
+    assert len(updates) == 1 and '1 秒' in updates[0][3]
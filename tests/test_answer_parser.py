@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型回答 JSON 解析測試
+
+確認程式碼區塊、說明文字與多餘的逗號不影響解析，被截斷的回答保留已完整的項目
+"""
+
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from services.answer_parser import parse_json_answer, strip_code_fence  # noqa: E402
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('[]', []),
+    ('```json\n[{"工作": "服務員"}]\n```', [{'工作': '服務員'}]),
+    ('以下是結果：\n[{"工作": "服務員"}]\n如有需要請告訴我。', [{'工作': '服務員'}]),
+    ('[{"工作": "服務員",},]', [{'工作': '服務員'}]),
+    ('[注意] 結果如下 {"B1": []}', {'B1': []}),
+])
+def test_complete_answers(text, expected):
+    assert parse_json_answer(text) == (expected, True)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('[{"工作": "服務員"}, {"工作": "廚', [{'工作': '服務員'}]),
+    ('```json\n{"B1": [{"工作": "司機"}], "B2": [{"工作"', {'B1': [{'工作': '司機'}]}),
+    # 字串中的括號與跳脫的引號不影響判斷項目是否完整
+    ('[{"其他": "輪班 [早/晚] \\"可議\\""}, {"工作": "', [{'其他': '輪班 [早/晚] "可議"'}]),
+])
+def test_truncated_answers_keep_complete_items(text, expected):
+    assert parse_json_answer(text) == (expected, False)
+
+
+@pytest.mark.parametrize('text', ['', '圖片中沒有工作資訊', '[{"工作": "服務', '[注意]'])
+def test_unusable_answers(text):
+    assert parse_json_answer(text) == (None, False)
+
+
+def test_strip_code_fence():
+    assert strip_code_fence('```json\n[1]\n```') == '[1]'
+    assert strip_code_fence('```\n[1, 2') == '[1, 2'
+    assert strip_code_fence(' [1] ') == '[1]'
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+非同步工作資訊提取引擎測試
+
+以本地模擬 Gemini 伺服器確認 asyncio 引擎透過 GenerativeServiceAsyncClient 送出請求、
+同時等待的請求數不超過並行上限，以及 429 時會依共用的退避時間重試
+"""
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from config.settings import Config  # noqa: E402
+from services.ai_service import AIService  # noqa: E402
+from services.async_extraction import AsyncExtractionEngine  # noqa: E402
+from services.rate_limiter import RequestScheduler  # noqa: E402
+from services.result_cache import ResultCache  # noqa: E402
+from benchmarks.fake_gemini_server import FakeGeminiServer  # noqa: E402
+
+
+@pytest.fixture
+def fake_server():
+    server = FakeGeminiServer(latency=0.2)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch, fake_server):
+    monkeypatch.setattr(Config, 'JOB_PREFILTER_MODE', 'off')  # 測試用的單色區塊不含文字
+    service = AIService()
+    service.create_client = fake_server.create_client  # 連到模擬伺服器
+    service.scheduler = RequestScheduler(rpm=0, tpm=0)
+    service.extraction_cache = ResultCache(str(tmp_path / 'cache.sqlite3'), max_entries=100)
+    return service
+
+
+def write_blocks(directory, count):
+    paths = []
+    for index in range(count):
+        path = str(directory / f'block{index}.png')
+        cv2.imwrite(path, np.full((40, 60, 3), index, dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+
+def test_requests_wait_concurrently_up_to_limit(tmp_path, fake_server, service):
+    engine = AsyncExtractionEngine(service, max_concurrency=10)
+    blocks = write_blocks(tmp_path, 30)
+    start = time.monotonic()
+    futures = [engine.submit('key', [block]) for block in blocks]
+    results = [future.result(timeout=30) for future in futures]
+    elapsed = time.monotonic() - start
+
+    assert [list(result) for result in results] == [[block] for block in blocks]
+    assert all(result[block][0]['工作'] == '模擬工作' for result, block in zip(results, blocks))
+    # 30 個 0.2 秒的請求，每次 10 個同時等待
+    assert fake_server.requests == 30
+    assert fake_server.peak_in_flight == 10
+    assert elapsed < 3.0
+    assert engine.get_stats()['peak_in_flight'] == 10
+
+    # 結果已快取，相同的區塊不再送出
+    engine.submit('key', blocks[:2]).result(timeout=30)
+    assert fake_server.requests == 30
+
+
+def test_batch_request_is_split_by_label(tmp_path, fake_server, service, monkeypatch):
+    monkeypatch.setattr(Config, 'EXTRACTION_BATCH_SIZE', 8)
+    engine = AsyncExtractionEngine(service, max_concurrency=4)
+    blocks = write_blocks(tmp_path, 3)
+    result = engine.submit('key', blocks).result(timeout=30)
+    assert [result[block][0]['工作'] for block in blocks] == ['模擬工作 B1', '模擬工作 B2', '模擬工作 B3']
+    assert fake_server.requests == 1
+
+
+def test_rate_limited_requests_are_retried(tmp_path, fake_server, service):
+    fake_server.rate_limit_ratio = 0.5
+    service.scheduler.report_rate_limit = lambda api_key, model, delay: 0.0  # 不實際等待 retry_delay
+    engine = AsyncExtractionEngine(service, max_concurrency=8)
+    blocks = write_blocks(tmp_path, 8)
+    results = [engine.submit('key', [block]).result(timeout=30) for block in blocks]
+    assert fake_server.rate_limited > 0
+    assert all(result[block][0]['工作'] in ('模擬工作', '獲取描述時出錯') for result, block in zip(results, blocks))
+    assert sum(result[block][0]['工作'] == '模擬工作' for result, block in zip(results, blocks)) >= 6
+
+
+def test_submit_blocks_when_pending_work_is_full(tmp_path, fake_server, service):
+    engine = AsyncExtractionEngine(service, max_concurrency=1)
+    blocks = write_blocks(tmp_path, 3)
+    futures = [engine.submit('key', [block]) for block in blocks[:engine.max_pending]]
+    # 名額用完時等到有工作完成才排入
+    futures.append(engine.submit('key', [blocks[-1]]))
+    assert any(future.done() for future in futures[:-1])
+    assert all(future.result(timeout=30)[block][0]['工作'] == '模擬工作' for future, block in zip(futures, blocks))
+
+
+def test_scheduler_token_is_taken_before_concurrency_slot(tmp_path, fake_server, service):
+    engine = AsyncExtractionEngine(service, max_concurrency=1)
+    free_slots = []
+    acquire_async = service.scheduler.acquire_async
+
+    async def recording_acquire(*args):
+        free_slots.append(engine._semaphore._value)
+        return await acquire_async(*args)
+
+    service.scheduler.acquire_async = recording_acquire
+    block = write_blocks(tmp_path, 1)[0]
+    engine.submit('key', [block]).result(timeout=30)
+    # 等待配額時沒有佔用並行上限
+    assert free_slots == [1]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+區塊請求圖片編碼測試
+
+確認依文字高度縮小的比例不低於最小文字高度、能少用圖片區塊時會縮到區塊邊界，
+以及編碼後的圖片是較小的灰階圖片並記錄實際使用的設定
+"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from services.block_encoder import choose_scale, encode_block_image, estimate_text_height  # noqa: E402
+from services.rate_limiter import image_tokens  # noqa: E402
+
+
+def text_block(width=1200, height=900, font_scale=1.5):
+    """淡黃底色上的多行文字區塊"""
+    block = np.full((height, width, 3), (200, 230, 240), dtype=np.uint8)
+    for y in range(60, height - 20, 60):
+        cv2.putText(block, 'JOB 0800-1700 TEL 02-1234', (20, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (40, 40, 40), 3)
+    return block
+
+
+def test_text_height_is_estimated():
+    gray = cv2.cvtColor(text_block(), cv2.COLOR_BGR2GRAY)
+    assert 25 <= estimate_text_height(gray) <= 50
+    assert estimate_text_height(np.full((200, 200), 255, dtype=np.uint8)) is None
+
+
+def test_scale_targets_text_height_without_upscaling():
+    assert choose_scale(600, 300, 40.0, 20, 16, 2048) == pytest.approx(0.5)
+    assert choose_scale(600, 300, 10.0, 20, 16, 2048) == 1.0
+    assert choose_scale(4000, 300, None, 20, 16, 2048) == pytest.approx(2048 / 4000)
+
+
+def test_scale_snaps_to_fewer_tiles_within_min_text_height():
+    # 800x700 需要 2 個圖片區塊，縮到寬 768 只需 1 個，文字仍有 19.2 像素
+    scale = choose_scale(800, 700, 20.0, 20, 16, 2048)
+    assert scale == pytest.approx(768 / 800)
+    assert image_tokens(int(800 * scale), int(700 * scale)) < image_tokens(800, 700)
+    # 縮到 1 個區塊會讓文字小於最小高度（寬 768 時文字只剩 15.4 像素）時不縮小
+    assert choose_scale(1000, 700, 20.0, 20, 16, 2048) == 1.0
+
+
+@pytest.mark.parametrize('image_format,mime_type', [('jpeg', 'image/jpeg'), ('webp', 'image/webp')])
+def test_encoded_block_is_small_grayscale_with_settings(image_format, mime_type):
+    block = text_block()
+    original_bytes = len(cv2.imencode('.jpg', block)[1])
+    encoded = encode_block_image(block, target_text_height=20, image_format=image_format)
+
+    assert encoded.mime_type == mime_type
+    assert len(encoded.data) < original_bytes
+    decoded = cv2.imdecode(np.frombuffer(encoded.data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert (decoded.shape[1], decoded.shape[0]) == encoded.size
+    assert encoded.size[0] < block.shape[1]
+    # 底色拉伸為白色
+    assert np.median(decoded) > 240
+    assert encoded.settings['format'] == image_format
+    assert encoded.settings['scale'] < 1
+    assert encoded.settings['bytes'] == len(encoded.data)
+    assert (encoded.settings['width'], encoded.settings['height']) == encoded.size
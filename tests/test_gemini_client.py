@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gemini 請求封裝測試
+
+確認文字與圖片組成的請求內容、生成設定，以及經由 GenerativeServiceClient 送到本地模擬伺服器後取得回應文字
+"""
+
+import os
+import sys
+import json
+
+import google.ai.generativelanguage as glm
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from services.gemini_client import GeminiModel, GeminiResponse  # noqa: E402
+from benchmarks.fake_gemini_server import FakeGeminiServer  # noqa: E402
+
+
+def test_request_carries_parts_and_generation_config():
+    model = GeminiModel('gemini-test', {'temperature': 0.0, 'top_k': 1, 'max_output_tokens': 64})
+    request = model.build_request(['說明', {'mime_type': 'image/webp', 'data': b'pixels'}])
+
+    assert request.model == 'models/gemini-test'
+    parts = request.contents[0].parts
+    assert request.contents[0].role == 'user'
+    assert parts[0].text == '說明'
+    assert parts[1].inline_data.mime_type == 'image/webp' and parts[1].inline_data.data == b'pixels'
+    assert request.generation_config.top_k == 1 and request.generation_config.max_output_tokens == 64
+
+
+def test_empty_response_raises():
+    with pytest.raises(ValueError):
+        GeminiResponse(glm.GenerateContentResponse()).text
+
+
+def test_generate_content_through_client():
+    server = FakeGeminiServer(latency=0)
+    server.start()
+    try:
+        model = GeminiModel('gemini-test', client=server.create_client('key'))
+        response = model.generate_content(['圖片 B1：', {'mime_type': 'image/png', 'data': b'block'}])
+    finally:
+        server.stop()
+
+    assert json.loads(response.text)['B1'][0]['工作'] == '模擬工作 B1'
+    assert server.requests == 1 and server.image_bytes == len(b'block')
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+區塊分割測試
+
+確認向量化的包含關係過濾與原本逐對比較的實作結果完全一致
+"""
+
+import os
+import sys
+import glob
+import random
+
+import cv2
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from image_processor import (  # noqa: E402
+    is_contained_bbox,
+    find_candidate_bboxes,
+    filter_contained_initial,
+    filter_contained_final,
+    covered_area,
+    detect_regions,
+    scale_bbox_to_full,
+    build_block_mask,
+    close_block_mask,
+    render_debug_artifacts,
+)
+
+SAMPLE_IMAGES = sorted(glob.glob(os.path.join(PROJECT_ROOT, 'newspaper', '*.jpg')))
+
+
+def reference_filter_initial(bboxes):
+    """原本第一次包含過濾的逐對比較實作"""
+    temp_bboxes = list(bboxes)
+    kept = []
+    for i in range(len(temp_bboxes)):
+        bbox_i = temp_bboxes[i]
+        if bbox_i is None:
+            continue
+        is_contained_by_others = False
+        for j, other_bbox in enumerate(temp_bboxes):
+            if i != j and other_bbox is not None and is_contained_bbox(bbox_i, other_bbox):
+                if bbox_i[2] * bbox_i[3] >= other_bbox[2] * other_bbox[3]:
+                    temp_bboxes[j] = None
+                else:
+                    is_contained_by_others = True
+                    break
+        if not is_contained_by_others:
+            kept.append(i)
+    return kept
+
+
+def reference_filter_final(bboxes):
+    """原本最終包含檢查的逐對比較實作"""
+    indices_to_keep = set(range(len(bboxes)))
+    for i in range(len(bboxes)):
+        if i not in indices_to_keep:
+            continue
+        for j in range(len(bboxes)):
+            if i == j or j not in indices_to_keep:
+                continue
+            if is_contained_bbox(bboxes[i], bboxes[j]):
+                indices_to_keep.discard(i)
+                break
+    return sorted(indices_to_keep)
+
+
+@pytest.fixture(scope='module', params=SAMPLE_IMAGES, ids=os.path.basename)
+def sample_bboxes(request):
+    image = cv2.imread(request.param)
+    assert image is not None, f"無法讀取樣本圖片: {request.param}"
+    return find_candidate_bboxes(image)
+
+
+def test_initial_filter_matches_reference(sample_bboxes):
+    assert filter_contained_initial(sample_bboxes) == reference_filter_initial(sample_bboxes)
+
+
+def test_final_filter_matches_reference(sample_bboxes):
+    # 與實際流程相同：先做第一次過濾，再混入原始候選框（包含大量重疊）做最終檢查
+    initial = [sample_bboxes[i] for i in filter_contained_initial(sample_bboxes)]
+    candidates = initial + sample_bboxes
+    assert filter_contained_final(candidates) == reference_filter_final(candidates)
+
+
+def test_filters_match_reference_on_shuffled_order(sample_bboxes):
+    # 兩種過濾都與順序有關，打亂順序後仍需與原實作一致
+    rng = random.Random(42)
+    for _ in range(5):
+        shuffled = list(sample_bboxes)
+        rng.shuffle(shuffled)
+        assert filter_contained_initial(shuffled) == reference_filter_initial(shuffled)
+        assert filter_contained_final(shuffled) == reference_filter_final(shuffled)
+
+
+def test_filters_match_reference_near_tolerance():
+    # 隨機產生落在容差邊界附近的邊界框（含相同大小、互相包含的情況）
+    rng = random.Random(0)
+    for _ in range(50):
+        bboxes = []
+        for _ in range(rng.randint(0, 40)):
+            if bboxes and rng.random() < 0.5:
+                x, y, w, h = rng.choice(bboxes)
+                bboxes.append((x + rng.randint(-12, 12), y + rng.randint(-12, 12),
+                               max(1, w + rng.randint(-24, 24)), max(1, h + rng.randint(-24, 24))))
+            else:
+                bboxes.append((rng.randint(0, 500), rng.randint(0, 500), rng.randint(1, 300), rng.randint(1, 300)))
+        assert filter_contained_initial(bboxes) == reference_filter_initial(bboxes)
+        assert filter_contained_final(bboxes) == reference_filter_final(bboxes)
+
+
+def reference_covered_pixels(bbox_missing, block_bboxes):
+    """原本為每個候選區域配置遮罩並逐一繪製初始區塊的重疊計算"""
+    orig_x, orig_y, orig_w, orig_h = bbox_missing
+    temp_overlap_mask = np.zeros((orig_h, orig_w), dtype=np.uint8)
+    for bx, by, bw, bh in block_bboxes:
+        x_start, y_start = max(orig_x, bx) - orig_x, max(orig_y, by) - orig_y
+        x_end = min(orig_x + orig_w, bx + bw) - orig_x
+        y_end = min(orig_y + orig_h, by + bh) - orig_y
+        if x_end > x_start and y_end > y_start:
+            temp_overlap_mask[y_start:y_end, x_start:x_end] = 255
+    return cv2.countNonZero(temp_overlap_mask)
+
+
+def test_covered_area_matches_reference():
+    rng = random.Random(1)
+    width, height = 800, 600
+    for _ in range(20):
+        block_bboxes = [(rng.randint(0, width - 50), rng.randint(0, height - 50), rng.randint(1, 200), rng.randint(1, 200))
+                        for _ in range(rng.randint(1, 30))]
+
+        for _ in range(20):
+            x, y = rng.randint(0, width - 1), rng.randint(0, height - 1)
+            bbox = (x, y, rng.randint(1, width - x), rng.randint(1, height - y))
+            assert covered_area(bbox, block_bboxes) == reference_covered_pixels(bbox, block_bboxes)
+
+
+def test_scale_bbox_to_full_covers_downscaled_box():
+    assert scale_bbox_to_full((10, 20, 30, 40), 1.0, (100, 100)) == (10, 20, 30, 40)
+    # 向外取整，確保原圖上的裁切完整包含縮小圖上的區塊
+    assert scale_bbox_to_full((3, 5, 7, 9), 0.3, (1000, 1000)) == (10, 16, 24, 31)
+    # 超出原圖範圍的部分會被裁切
+    assert scale_bbox_to_full((40, 40, 20, 20), 0.5, (100, 100)) == (80, 80, 20, 20)
+
+
+def test_downscaled_analysis_returns_full_resolution_regions():
+    image = cv2.imread(SAMPLE_IMAGES[0])
+    geometry = detect_regions(image, analysis_scale=0.5)
+    height, width = image.shape[:2]
+    assert geometry['regions']
+    for (x, y, w, h), filename in geometry['regions']:
+        assert x >= 0 and y >= 0 and w > 0 and h > 0
+        assert x + w <= width and y + h <= height
+        assert filename.endswith(f'{x}_{y}_{x + w}_{y + h}.jpg')
+
+
+def reference_close_block_mask(mask, kernel_size=30, iterations=3):
+    """原本以 cv2.dilate / cv2.erode 逐像素執行的閉運算"""
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    mask = cv2.dilate(mask, kernel, iterations=iterations)
+    return cv2.erode(mask, kernel, iterations=iterations)
+
+
+@pytest.mark.parametrize('image_path', SAMPLE_IMAGES, ids=os.path.basename)
+def test_close_block_mask_matches_reference_on_samples(image_path):
+    geometry = detect_regions(cv2.imread(image_path))
+    expected = reference_close_block_mask(build_block_mask(geometry))
+    closed = close_block_mask(geometry)
+    assert np.array_equal(closed, expected)
+
+    # 未填充區域輪廓必須完全相同
+    expected_contours, _ = cv2.findContours(cv2.bitwise_not(expected), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    missing_contours, _ = cv2.findContours(cv2.bitwise_not(closed), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    assert len(missing_contours) == len(expected_contours)
+    for contour, expected_contour in zip(missing_contours, expected_contours):
+        assert np.array_equal(contour, expected_contour)
+
+
+def test_close_block_mask_matches_reference_on_random_layouts():
+    rng = random.Random(3)
+    for _ in range(100):
+        kernel_size, iterations = rng.choice([3, 4, 15, 30, 31]), rng.randint(1, 3)
+        bboxes = [(rng.randint(0, 300), rng.randint(0, 300), rng.randint(1, 150), rng.randint(1, 150))
+                  for _ in range(rng.randint(1, 15))]
+        min_x, min_y = min(b[0] for b in bboxes), min(b[1] for b in bboxes)
+        geometry = {
+            'initial_bboxes': bboxes,
+            'mask_origin': (min_x, min_y),
+            'mask_size': (max(b[0] + b[2] for b in bboxes) - min_x, max(b[1] + b[3] for b in bboxes) - min_y)
+        }
+        expected = reference_close_block_mask(build_block_mask(geometry), kernel_size, iterations)
+        assert np.array_equal(close_block_mask(geometry, kernel_size, iterations), expected)
+
+
+def test_debug_mask_uses_detection_closing():
+    image = cv2.imread(SAMPLE_IMAGES[0])
+    geometry = detect_regions(image, analysis_scale=0.5, resolution_scale=0.8)
+    assert geometry['kernel_size'] == 12
+
+    artifacts = render_debug_artifacts(image, geometry, 'page')
+    unprocessed, processed = artifacts['page_mask_unprocessed.jpg'], artifacts['page_mask_processed.jpg']
+    assert processed.shape == unprocessed.shape
+    # 與 detect_regions 尋找未填充區域的遮罩相同，只放大到原圖座標
+    closed = reference_close_block_mask(build_block_mask(geometry['analysis_mask']), kernel_size=12)
+    expected = cv2.resize(closed, (unprocessed.shape[1], unprocessed.shape[0]), interpolation=cv2.INTER_NEAREST)
+    assert np.array_equal(processed, expected)
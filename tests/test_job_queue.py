@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+背景任務佇列測試
+
+確認佇列已滿時拒絕任務並清除已儲存的檔案、寫入磁碟的任務記錄不包含 API 密鑰，
+以及重新啟動後恢復未完成的任務（上傳檔案已不存在的任務會被捨棄，API 密鑰改用環境變數）
+"""
+
+import io
+import os
+import sys
+import json
+import threading
+
+import pytest
+from flask import Flask
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from config.settings import Config  # noqa: E402
+from routes import main_bp, upload_bp  # noqa: E402
+from services.job_queue import JobQueue, QueueFullError  # noqa: E402
+
+
+def make_payload(tmp_path, process_id, api_key='secret-key'):
+    upload = tmp_path / f'{process_id}.png'
+    upload.write_bytes(b'pixels')
+    return {
+        'process_id': process_id,
+        'files': [{'path': str(upload), 'original_filename': 'page.png'}],
+        'api_key': api_key
+    }
+
+
+def read_record(queue_folder, process_id):
+    with open(os.path.join(queue_folder, f'{process_id}.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_full_queue_rejects_job_and_removes_its_record(tmp_path):
+    queue_folder = str(tmp_path / 'queue')
+    job_queue = JobQueue(queue_folder, max_size=1, num_workers=1)
+    job_queue.enqueue('first', make_payload(tmp_path, 'first'))
+
+    with pytest.raises(QueueFullError):
+        job_queue.enqueue('second', make_payload(tmp_path, 'second'))
+    assert job_queue.get_job('second') is None
+    assert sorted(os.listdir(queue_folder)) == ['first.json']
+    assert job_queue.get_job('first')['queue_position'] == 1
+
+
+def test_full_queue_upload_removes_saved_files(tmp_path, monkeypatch):
+    upload_module = sys.modules[upload_bp.import_name]
+    full_queue = JobQueue(str(tmp_path / 'queue'), max_size=1, num_workers=1)
+    full_queue.enqueue('waiting', make_payload(tmp_path, 'waiting'))
+    monkeypatch.setattr(upload_module, 'job_queue', full_queue)
+    monkeypatch.setattr(Config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+
+    app = Flask(__name__, template_folder=os.path.join(PROJECT_ROOT, 'templates'))
+    app.config.update(SECRET_KEY='test', TESTING=True)
+    app.register_blueprint(main_bp)
+    app.register_blueprint(upload_bp)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['gemini_api_key'] = 'secret-key'
+
+    response = client.post('/upload', data={
+        'process_id': 'rejected',
+        'files': (io.BytesIO(b'pixels'), 'page.png')
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 302
+    assert not os.path.exists(os.path.join(Config.UPLOAD_FOLDER, 'rejected'))
+    assert full_queue.get_job('rejected') is None
+
+
+def test_persisted_job_omits_api_key(tmp_path):
+    queue_folder = str(tmp_path / 'queue')
+    job_queue = JobQueue(queue_folder, max_size=5, num_workers=1)
+    payload = make_payload(tmp_path, 'job')
+    job_queue.enqueue('job', payload)
+
+    record = read_record(queue_folder, 'job')
+    assert record['status'] == 'queued'
+    assert record['payload']['files'] == payload['files']
+    for field in JobQueue.TRANSIENT_FIELDS:
+        assert field not in record['payload']
+    assert 'secret-key' not in json.dumps(record)
+    # 記憶體中的任務仍保留密鑰供工作執行緒使用
+    assert payload['api_key'] == 'secret-key'
+
+
+def test_restart_recovers_pending_jobs(tmp_path, monkeypatch):
+    queue_folder = str(tmp_path / 'queue')
+    previous = JobQueue(queue_folder, max_size=5, num_workers=1)
+    previous.enqueue('kept', make_payload(tmp_path, 'kept'))
+    lost = make_payload(tmp_path, 'lost')
+    previous.enqueue('lost', lost)
+    os.remove(lost['files'][0]['path'])
+
+    monkeypatch.setenv('GEMINI_API_KEY', 'env-key')
+    handled = []
+    done = threading.Event()
+
+    def handler(payload):
+        handled.append(payload)
+        done.set()
+
+    restarted = JobQueue(queue_folder, max_size=5, num_workers=1)
+    restarted.set_handler(handler)
+    restarted.start()
+    assert done.wait(timeout=10)
+
+    # 上傳檔案已不存在的任務被捨棄，其餘任務以環境變數的密鑰重新執行
+    assert [payload['process_id'] for payload in handled] == ['kept']
+    assert handled[0]['api_key'] == 'env-key'
+    assert restarted.get_job('lost') is None
+    assert not os.path.exists(os.path.join(queue_folder, 'lost.json'))
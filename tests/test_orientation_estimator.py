@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地方向估計測試
+
+以樣本報紙確認文字軸向判斷正確（正確答案一定在前兩個候選方向中），
+以及 AIService 只在本地信心不足時才把候選方向送 Gemini 評分
+"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from config.settings import Config  # noqa: E402
+from services.ai_service import AIService  # noqa: E402
+from services.image_processing_service import ImageProcessingService  # noqa: E402
+from services.result_cache import ResultCache  # noqa: E402
+from services.orientation_estimator import ORIENTATIONS, estimate_orientation  # noqa: E402
+
+# newspaper33.jpg 是正的，其他樣本需要順時針旋轉 90 度才會轉正
+UPRIGHT_SAMPLE = os.path.join(PROJECT_ROOT, 'newspaper', 'newspaper33.jpg')
+SIDEWAYS_SAMPLE = os.path.join(PROJECT_ROOT, 'newspaper', 'newspaper1.jpg')
+
+# (套用在正確圖片上的旋轉, 要轉正需要的方向)
+ROTATIONS = [
+    (None, "正確"),
+    (cv2.ROTATE_90_CLOCKWISE, "逆時針90度"),
+    (cv2.ROTATE_180, "180度"),
+    (cv2.ROTATE_90_COUNTERCLOCKWISE, "順時針90度"),
+]
+
+
+@pytest.fixture(scope='module')
+def upright_image():
+    image = cv2.imread(UPRIGHT_SAMPLE)
+    if image is None:
+        pytest.skip('沒有樣本圖片')
+    return image
+
+
+@pytest.fixture(scope='module')
+def sideways_image():
+    image = cv2.imread(SIDEWAYS_SAMPLE)
+    if image is None:
+        pytest.skip('沒有樣本圖片')
+    return image
+
+
+@pytest.mark.parametrize('rotation,expected', ROTATIONS)
+def test_truth_is_among_same_axis_candidates(upright_image, rotation, expected):
+    image = upright_image if rotation is None else cv2.rotate(upright_image, rotation)
+    estimate = estimate_orientation(image)
+    assert expected in estimate.candidates[:2]
+    assert len(set(estimate.candidates)) == len(estimate.candidates)
+    assert 0.0 <= estimate.confidence <= 1.0
+    if estimate.confidence >= Config.ORIENTATION_MIN_CONFIDENCE:
+        assert estimate.direction == expected
+
+
+def test_sideways_sample_is_on_vertical_axis(sideways_image):
+    estimate = estimate_orientation(sideways_image)
+    assert set(estimate.candidates[:2]) == {"順時針90度", "逆時針90度"}
+
+
+def test_blank_image_has_no_confidence():
+    estimate = estimate_orientation(np.full((800, 600, 3), 255, dtype=np.uint8))
+    assert estimate.direction == "正確"
+    assert estimate.confidence == 0.0
+    assert sorted(estimate.candidates) == sorted(ORIENTATIONS)
+
+
+def make_scoring_service(monkeypatch, best):
+    """將 Gemini 評分替換為記錄呼叫的假評分，best 方向得最高分"""
+    service = AIService()
+    evaluated = []
+
+    def fake_evaluate(api_key, orientation_name, rotated_image, process_id=None, max_retries=None):
+        evaluated.append(orientation_name)
+        return orientation_name, 9.0 if orientation_name == best else 2.0
+
+    monkeypatch.setattr(service, 'evaluate_single_orientation', fake_evaluate)
+    return service, evaluated
+
+
+def test_auto_mode_scores_only_remaining_candidates(monkeypatch, sideways_image):
+    monkeypatch.setattr(Config, 'ORIENTATION_MODE', 'auto')
+    monkeypatch.setattr(Config, 'ORIENTATION_SCORING', 'separate')
+    monkeypatch.setattr(Config, 'ORIENTATION_MIN_CONFIDENCE', 1.1)  # 強制使用 Gemini
+    service, evaluated = make_scoring_service(monkeypatch, "順時針90度")
+    assert service.check_image_orientation(sideways_image, 'key', parallel_process=False) == ("順時針90度", True)
+    assert sorted(evaluated) == sorted(["順時針90度", "逆時針90度"])
+
+
+def test_local_mode_and_missing_key_never_call_gemini(monkeypatch, sideways_image):
+    service, evaluated = make_scoring_service(monkeypatch, "180度")
+    monkeypatch.setattr(Config, 'ORIENTATION_MIN_CONFIDENCE', 1.1)
+
+    monkeypatch.setattr(Config, 'ORIENTATION_MODE', 'local')
+    assert service.check_image_orientation(sideways_image, 'key')[0] in ("順時針90度", "逆時針90度")
+    monkeypatch.setattr(Config, 'ORIENTATION_MODE', 'auto')
+    # 沒有密鑰時不採用信心不足的本地估計，也不算確實判定
+    assert service.check_image_orientation(sideways_image, '') == ("正確", False)
+    monkeypatch.setattr(Config, 'ORIENTATION_MIN_CONFIDENCE', 0.0)
+    direction, decided = service.check_image_orientation(sideways_image, '')
+    assert direction in ("順時針90度", "逆時針90度") and decided
+    assert evaluated == []
+
+
+def test_gemini_mode_scores_all_orientations(monkeypatch, sideways_image):
+    monkeypatch.setattr(Config, 'ORIENTATION_MODE', 'gemini')
+    monkeypatch.setattr(Config, 'ORIENTATION_SCORING', 'separate')
+    service, evaluated = make_scoring_service(monkeypatch, "180度")
+    assert service.check_image_orientation(sideways_image, 'key', parallel_process=False) == ("180度", True)
+    assert sorted(evaluated) == sorted(ORIENTATIONS)
+
+
+def test_orientation_thumbnails_are_small_rotated_jpegs(monkeypatch, sideways_image):
+    monkeypatch.setattr(Config, 'ORIENTATION_THUMBNAIL_SIZE', 512)
+    thumbnails = AIService().encode_orientation_thumbnails(sideways_image, list(ORIENTATIONS))
+    assert list(thumbnails) == list(ORIENTATIONS)
+    height, width = sideways_image.shape[:2]
+    for name, data in thumbnails.items():
+        thumbnail = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        assert max(thumbnail.shape[:2]) == 512
+        # 90 度旋轉後長寬互換
+        is_landscape = thumbnail.shape[1] > thumbnail.shape[0]
+        assert is_landscape == ((width > height) != (name in ("順時針90度", "逆時針90度")))
+
+
+@pytest.mark.parametrize('answer,expected', [('C', ("180度", True)), ('答案：B。', ("順時針90度", True)), ('無法判斷', ("正確", False))])
+def test_single_request_scoring_parses_label(monkeypatch, fake_gemini, sideways_image, answer, expected):
+    monkeypatch.setattr(Config, 'ORIENTATION_MODE', 'gemini')
+    monkeypatch.setattr(Config, 'ORIENTATION_SCORING', 'single')
+    service, fake = fake_gemini(answer)
+    # 無法解析時採用第一個候選方向，標示為未判定
+    assert service.check_image_orientation(sideways_image, 'key') == expected
+    assert len(fake.requests) == 1
+    images = [part for part in fake.requests[0] if isinstance(part, dict)]
+    assert len(images) == len(ORIENTATIONS)
+    assert all(part['mime_type'] == 'image/jpeg' for part in images)
+
+
+def invalid_key(contents):
+    """請求失敗（例如密鑰無效）的回答"""
+    raise RuntimeError('400 API key not valid')
+
+
+class EmptySegmentation:
+    """不分割的分割引擎替身，只測試方向檢測"""
+
+    def segment(self, image, image_name, include_debug=True, resolution_scale=1.0):
+        return {'regions': [], 'debug_images': {}, 'geometry': None}
+
+
+@pytest.mark.parametrize('scoring,answer,cached', [
+    ('single', 'C', True),
+    ('single', '無法判斷', False),
+    ('single', invalid_key, False),
+    ('separate', invalid_key, False),
+    ('separate', '不是分數', False),
+])
+def test_only_decided_orientations_are_cached(tmp_path, monkeypatch, fake_gemini, sideways_image, scoring, answer, cached):
+    monkeypatch.setattr(Config, 'ORIENTATION_MODE', 'gemini')
+    monkeypatch.setattr(Config, 'ORIENTATION_SCORING', scoring)
+    monkeypatch.setattr(Config, 'GEMINI_ORIENTATION_MAX_RETRIES', 0)
+
+    service = ImageProcessingService()
+    service.ai_service, _ = fake_gemini(answer)
+    service.orientation_cache = ResultCache(str(tmp_path / 'orientation.sqlite3'), max_entries=10)
+    service.segmentation_engine = EmptySegmentation()
+    service.process_image_data(sideways_image, 'test_page1', 'page', api_key='key', debug_artifacts='off',
+                               results_folder=str(tmp_path / 'results'))
+
+    # 失敗時的預設方向不寫入快取，修正密鑰後重新上傳會再次檢測
+    assert service.orientation_cache.get_stats()['entries'] == (1 if cached else 0)
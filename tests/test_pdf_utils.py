@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF 頁面渲染測試
+
+確認零複製的 Pixmap 轉換與原本 pix.samples 複製後轉換的結果完全一致，
+DPI 選擇與掃描頁直接解碼的結果與渲染一致
+"""
+
+import os
+import sys
+import glob
+
+import cv2
+import fitz
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from utils.pdf_utils import (  # noqa: E402
+    PageBufferPool,
+    pixmap_to_bgr,
+    render_page,
+    default_page_dpi,
+    native_image_dpi,
+    plan_page_dpi,
+    embedded_scan_image,
+    decode_scan_image,
+    load_page_image,
+)
+
+SAMPLE_PDFS = sorted(glob.glob(os.path.join(PROJECT_ROOT, 'newspaper', '*.pdf')))
+
+
+def reference_pixmap_to_bgr(pix):
+    """原本先複製 pix.samples 再轉換色彩的實作"""
+    image = np.frombuffer(pix.samples, dtype=np.uint8).reshape((pix.height, pix.width, pix.n))
+    if pix.n == 1:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if pix.n == 3:
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    return cv2.cvtColor(image, cv2.COLOR_RGBA2BGR)
+
+
+@pytest.fixture(scope='module')
+def sample_page():
+    if not SAMPLE_PDFS:
+        pytest.skip('沒有樣本 PDF')
+    with fitz.open(SAMPLE_PDFS[0]) as pdf_document:
+        yield pdf_document.load_page(0)
+
+
+@pytest.mark.parametrize('colorspace,alpha', [(fitz.csRGB, False), (fitz.csRGB, True), (fitz.csGRAY, False)])
+def test_pixmap_to_bgr_matches_reference(sample_page, colorspace, alpha):
+    pix = sample_page.get_pixmap(dpi=72, colorspace=colorspace, alpha=alpha)
+    assert np.array_equal(pixmap_to_bgr(pix), reference_pixmap_to_bgr(pix))
+
+
+def test_render_page_reuses_released_buffer(sample_page):
+    pool = PageBufferPool(max_buffers=1)
+    first = render_page(sample_page, 100, pool)
+    expected = first.copy()
+    address = first.ctypes.data
+    pool.release(first)
+
+    second = render_page(sample_page, 100, pool)
+    assert second.ctypes.data == address
+    assert np.array_equal(second, expected)
+
+    # 尺寸不同時配置新的緩衝區
+    third = render_page(sample_page, 72, pool)
+    assert third.ctypes.data != address
+    assert third.shape[:2] != second.shape[:2]
+
+
+def test_buffer_pool_ignores_views_and_respects_limit():
+    pool = PageBufferPool(max_buffers=1)
+    page = np.zeros((10, 10, 3), dtype=np.uint8)
+    pool.release(page[2:5])
+    assert not np.shares_memory(pool.acquire((3, 10, 3)), page)
+
+    pool.release(page)
+    pool.release(np.zeros((10, 10, 3), dtype=np.uint8))
+    assert pool.acquire((10, 10, 3)) is page
+    assert pool.acquire((10, 10, 3)) is not page
+
+
+def make_text_page(fontsize):
+    """產生整頁都是指定字級文字的 A4 向量頁面"""
+    pdf_document = fitz.open()
+    page = pdf_document.new_page(width=595, height=842)
+    line = 'Job opening 0912-345-678 salary negotiable ' * 3
+    y = 40
+    while y < 800:
+        page.insert_text((30, y), line, fontsize=fontsize)
+        y += fontsize * 1.6
+    return pdf_document, page
+
+
+def test_native_image_dpi_of_scanned_page(sample_page):
+    # 樣本 PDF 每頁都是一張 200 DPI 的掃描圖
+    assert native_image_dpi(sample_page) == pytest.approx(200, abs=1)
+    pdf_document, page = make_text_page(10)
+    assert native_image_dpi(page) is None
+    pdf_document.close()
+
+
+def test_plan_page_dpi_stays_within_bounds(sample_page):
+    plan = plan_page_dpi(sample_page)
+    assert plan.dpi <= 200
+    assert 150 <= plan.dpi <= default_page_dpi(sample_page)
+    assert plan.resolution_scale == pytest.approx(plan.dpi / default_page_dpi(sample_page))
+
+
+def test_plan_page_dpi_follows_text_size():
+    small_document, small_page = make_text_page(6)
+    large_document, large_page = make_text_page(16)
+    small_plan = plan_page_dpi(small_page, min_dpi=50)
+    large_plan = plan_page_dpi(large_page, min_dpi=50)
+    assert large_plan.dpi < small_plan.dpi <= default_page_dpi(small_page)
+
+    # 無法估計字高的空白頁維持原本的 DPI
+    blank_document = fitz.open()
+    blank_page = blank_document.new_page()
+    assert plan_page_dpi(blank_page) == (default_page_dpi(blank_page), 1.0)
+    for pdf_document in (small_document, large_document, blank_document):
+        pdf_document.close()
+
+
+def make_scan_document(image_rotate=0, page_rotation=0):
+    """產生單頁、內容只有一張整頁 JPEG 的掃描 PDF（150 DPI）"""
+    rng = np.random.default_rng(0)
+    scan = np.full((600, 450, 3), 255, dtype=np.uint8)
+    for _ in range(40):
+        x, y = rng.integers(0, 400), rng.integers(0, 560)
+        cv2.rectangle(scan, (int(x), int(y)), (int(x) + 40, int(y) + 30), tuple(int(v) for v in rng.integers(0, 200, 3)), -1)
+    cv2.putText(scan, 'TOP', (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 3)
+    jpeg = cv2.imencode('.jpg', scan, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+
+    pdf_document = fitz.open()
+    width, height = (288, 216) if image_rotate in (90, 270) else (216, 288)
+    page = pdf_document.new_page(width=width, height=height)
+    page.insert_image(page.rect, stream=jpeg, rotate=image_rotate, keep_proportion=False)
+    page.set_rotation(page_rotation)
+    return pdf_document
+
+
+@pytest.mark.parametrize('image_rotate', [0, 90, 180, 270])
+@pytest.mark.parametrize('page_rotation', [0, 90])
+def test_decode_scan_image_matches_render(image_rotate, page_rotation):
+    pdf_document = make_scan_document(image_rotate, page_rotation)
+    page = pdf_document[0]
+    scan_image = embedded_scan_image(page)
+    assert scan_image is not None
+    assert scan_image.dpi == pytest.approx(150)
+
+    decoded = decode_scan_image(page, scan_image)
+    rendered = render_page(page, 150)
+    assert abs(decoded.shape[0] - rendered.shape[0]) <= 1 and abs(decoded.shape[1] - rendered.shape[1]) <= 1
+    height, width = min(decoded.shape[0], rendered.shape[0]), min(decoded.shape[1], rendered.shape[1])
+    difference = np.abs(decoded[:height, :width].astype(np.int16) - rendered[:height, :width].astype(np.int16))
+    assert difference.mean() < 3
+
+    # DPI 等於原始解析度時直接解碼，否則照常渲染
+    assert load_page_image(page, 150).shape == decoded.shape
+    assert load_page_image(page, 100).shape == render_page(page, 100).shape
+    pdf_document.close()
+
+
+def test_embedded_scan_image_requires_image_only_page(sample_page):
+    assert embedded_scan_image(sample_page) is not None
+
+    # 掃描圖上還有文字時需要渲染才能保留文字，但仍可得知掃描解析度
+    pdf_document = make_scan_document()
+    page = pdf_document[0]
+    page.insert_text((20, 20), 'overlay', fontsize=10)
+    assert embedded_scan_image(page) is None
+    assert native_image_dpi(page) == pytest.approx(150)
+    pdf_document.close()
+
+    text_document, text_page = make_text_page(10)
+    assert embedded_scan_image(text_page) is None
+    text_document.close()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gemini 請求排程測試
+
+確認請求依每分鐘配額平均送出、429 的退避時間由使用同一個 API 密鑰的所有執行緒共用，
+以及等待中的方向檢測請求優先於工作資訊提取請求
+"""
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from services.rate_limiter import (  # noqa: E402
+    RequestScheduler,
+    key_label,
+    estimate_request_tokens,
+    PRIORITY_ORIENTATION,
+    PRIORITY_EXTRACTION,
+)
+
+
+def run_threads(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+
+def test_requests_are_paced_to_quota():
+    # 每分鐘 600 次 = 每秒 10 次，可累積 1 次
+    scheduler = RequestScheduler(rpm=600, tpm=0, burst_seconds=0.1)
+    start = time.monotonic()
+    sent = []
+    run_threads([lambda: sent.append(scheduler.acquire('key', 'model')) for _ in range(6)])
+    elapsed = time.monotonic() - start
+    assert len(sent) == 6
+    assert 0.4 <= elapsed < 1.5
+    assert scheduler.get_stats()['keys'][key_label('key')]['model']['sent'] == 6
+
+
+def test_token_quota_limits_large_requests():
+    scheduler = RequestScheduler(rpm=0, tpm=60000, burst_seconds=0.1)  # 每秒 1000 token，可累積 100
+    start = time.monotonic()
+    for _ in range(3):
+        scheduler.acquire('key', 'model', tokens=100)
+    assert 0.15 <= time.monotonic() - start < 1.0
+
+
+def test_rate_limit_backoff_is_shared():
+    scheduler = RequestScheduler(rpm=0, tpm=0)
+    assert scheduler.report_rate_limit('key', 'model', 0.3) == pytest.approx(0.3, abs=0.05)
+    start = time.monotonic()
+    run_threads([lambda: scheduler.acquire('key', 'model') for _ in range(3)])
+    assert time.monotonic() - start >= 0.25
+    # 其他模型與其他密鑰不受影響
+    start = time.monotonic()
+    scheduler.acquire('key', 'other')
+    scheduler.acquire('other-key', 'model')
+    assert time.monotonic() - start < 0.1
+    assert scheduler.get_stats()['keys'][key_label('key')]['model']['rate_limited'] == 1
+
+
+def test_orientation_requests_go_first():
+    scheduler = RequestScheduler(rpm=0, tpm=0)
+    scheduler.report_rate_limit('key', 'model', 0.3)
+    order = []
+
+    def request(name, priority):
+        scheduler.acquire('key', 'model', priority)
+        order.append(name)
+
+    extraction = [threading.Thread(target=request, args=(f'extract{i}', PRIORITY_EXTRACTION)) for i in range(3)]
+    for thread in extraction:
+        thread.start()
+    time.sleep(0.05)
+    orientation = threading.Thread(target=request, args=('orientation', PRIORITY_ORIENTATION))
+    orientation.start()
+    for thread in extraction + [orientation]:
+        thread.join(timeout=5)
+    assert order[0] == 'orientation'
+    assert sorted(order[1:]) == ['extract0', 'extract1', 'extract2']
+
+
+def test_keys_have_separate_quotas():
+    # 每分鐘 120 次 = 每秒 2 次，每個密鑰各自可立即送出 1 次
+    scheduler = RequestScheduler(rpm=120, tpm=0)
+    start = time.monotonic()
+    run_threads([lambda key=key: scheduler.acquire(key, 'model') for key in ('a', 'b', 'c')])
+    assert time.monotonic() - start < 0.2
+    assert set(scheduler.get_stats()['keys']) == {key_label('a'), key_label('b'), key_label('c')}
+    assert 'a' not in scheduler.get_stats()['keys']
+
+
+def test_estimate_request_tokens_counts_image_tiles():
+    assert estimate_request_tokens('', [(300, 200)], output_tokens=0) == 258
+    assert estimate_request_tokens('', [(1000, 700)], output_tokens=0) == 2 * 258
+    assert estimate_request_tokens('提示詞', [], output_tokens=10) == 13
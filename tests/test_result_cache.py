@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+結果快取測試
+
+確認 LRU 淘汰、重新開啟後仍保留結果，以及相同內容的區塊不會再次呼叫 Gemini
+"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from services.result_cache import ResultCache, file_content_hash, image_content_hash  # noqa: E402
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'), max_entries=2)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    assert cache.get('a') == [1]  # a 變成最近使用
+    cache.put('c', [3])
+
+    assert cache.get('b') is None
+    assert cache.get('a') == [1] and cache.get('c') == [3]
+    stats = cache.get_stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['evictions']) == (2, 3, 1, 1)
+
+
+def test_cache_persists_across_instances(tmp_path):
+    db_path = str(tmp_path / 'cache.sqlite3')
+    ResultCache(db_path, max_entries=10).put('key', [{'工作': '服務員'}])
+    assert ResultCache(db_path, max_entries=10).get('key') == [{'工作': '服務員'}]
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'), max_entries=10, enabled=False)
+    cache.put('key', [1])
+    assert cache.get('key') is None
+    assert not os.path.exists(tmp_path / 'cache.sqlite3')
+
+
+def test_content_hash_depends_on_content_and_parts(tmp_path):
+    first, second = tmp_path / 'a.png', tmp_path / 'b.png'
+    first.write_bytes(b'same pixels')
+    second.write_bytes(b'same pixels')
+    assert file_content_hash(str(first), 'model', '1') == file_content_hash(str(second), 'model', '1')
+    assert file_content_hash(str(first), 'model', '1') != file_content_hash(str(first), 'model', '2')
+    second.write_bytes(b'other pixels')
+    assert file_content_hash(str(first), 'model', '1') != file_content_hash(str(second), 'model', '1')
+
+
+ANSWER = '[{"工作": "服務員", "行業": "住宿及餐飲業"}]'
+
+
+def write_block(path, value):
+    cv2.imwrite(str(path), np.full((40, 60, 3), value, dtype=np.uint8))
+    return str(path)
+
+
+def test_repeated_block_is_served_from_cache(tmp_path, fake_gemini):
+    service, fake = fake_gemini(ANSWER)
+    first = service.analyze_job_from_image('key', write_block(tmp_path / 'first.png', 200))
+    # 另一次上傳中內容相同的區塊
+    again = service.analyze_job_from_image('key', write_block(tmp_path / 'again.png', 200))
+    assert again == first
+    assert first[0]['工作'] == '服務員' and first[0]['其他'] == ''
+    assert len(fake.requests) == 1
+
+    service.analyze_job_from_image('key', write_block(tmp_path / 'other.png', 100))
+    assert len(fake.requests) == 2
+    assert service.extraction_cache.get_stats()['hits'] == 1
+
+
+def test_unparsable_responses_are_not_cached(tmp_path, fake_gemini):
+    service, fake = fake_gemini('不是 JSON')
+    block = write_block(tmp_path / 'block.png', 200)
+    service.analyze_job_from_image('key', block)
+    service.analyze_job_from_image('key', block)
+    assert len(fake.requests) == 2
+
+
+def test_cache_expires_old_results(tmp_path, monkeypatch):
+    import services.result_cache as result_cache_module
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'), max_entries=10, max_age_seconds=60)
+    now = [1000.0]
+    monkeypatch.setattr(result_cache_module.time, 'time', lambda: now[0])
+    cache.put('page', '順時針90度')
+    now[0] += 30
+    assert cache.get('page') == '順時針90度'
+    now[0] += 31
+    assert cache.get('page') is None
+    assert cache.get_stats()['entries'] == 0
+
+
+def test_image_content_hash_identifies_identical_pages_only():
+    rng = np.random.default_rng(0)
+    page = np.full((800, 600, 3), 255, dtype=np.uint8)
+    for _ in range(30):
+        x, y = int(rng.integers(0, 500)), int(rng.integers(0, 700))
+        cv2.rectangle(page, (x, y), (x + 80, y + 60), (0, 0, 0), -1)
+
+    assert image_content_hash(page) == image_content_hash(page.copy())
+    # 旋轉後的頁面需要不同的方向，雜湊也必須不同
+    assert image_content_hash(cv2.rotate(page, cv2.ROTATE_90_CLOCKWISE)) != image_content_hash(page)
+    assert image_content_hash(cv2.rotate(page, cv2.ROTATE_180)) != image_content_hash(page)
+    # 版面相似但內容不同（縮圖的差異雜湊可能相同）的頁面不會重用方向
+    similar = page.copy()
+    cv2.putText(similar, 'NO 2', (20, 780), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+    assert image_content_hash(similar) != image_content_hash(page)
@@ -2,6 +2,11 @@
 工具函數模組
 """
 from .file_utils import allowed_file, is_valid_job, get_storage_info, cleanup_old_files, cleanup_by_count, get_page_sort_key
+from .pdf_utils import (
+    DpiPlan, PageBufferPool, pixmap_to_bgr, render_page,
+    default_page_dpi, native_image_dpi, estimate_glyph_size, plan_page_dpi,
+    ScanImage, embedded_scan_image, decode_scan_image, load_page_image
+)
 
 __all__ = [
     'allowed_file',
@@ -9,5 +14,17 @@ __all__ = [
     'get_storage_info',
     'cleanup_old_files',
     'cleanup_by_count',
-    'get_page_sort_key'
+    'get_page_sort_key',
+    'PageBufferPool',
+    'pixmap_to_bgr',
+    'render_page',
+    'DpiPlan',
+    'default_page_dpi',
+    'native_image_dpi',
+    'estimate_glyph_size',
+    'plan_page_dpi',
+    'ScanImage',
+    'embedded_scan_image',
+    'decode_scan_image',
+    'load_page_image'
 ] 
\ No newline at end of file
@@ -0,0 +1,248 @@
+"""
+PDF 頁面渲染工具函數
+"""
+import re
+import math
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+# Pixmap 色彩通道數對應的 OpenCV 轉換代碼
+_BGR_CONVERSIONS = {
+    1: cv2.COLOR_GRAY2BGR,
+    3: cv2.COLOR_RGB2BGR,
+    4: cv2.COLOR_RGBA2BGR
+}
+
+# 頁面渲染計畫：dpi 為實際渲染解析度，resolution_scale 為相對於 default_page_dpi 的比例
+# （分割門檻依此比例縮放，使較低 DPI 的頁面與原本的分割結果一致）
+DpiPlan = namedtuple('DpiPlan', ['dpi', 'resolution_scale'])
+
+# 掃描頁的嵌入圖片：xref、原始解析度與擺放方向 (轉置, 水平翻轉, 垂直翻轉)
+ScanImage = namedtuple('ScanImage', ['xref', 'dpi', 'orientation'])
+
+class PageBufferPool:
+    """重複使用相同尺寸的頁面緩衝區，減少逐頁配置大型陣列"""
+
+    def __init__(self, max_buffers: int = 2):
+        self.max_buffers = max_buffers
+        self._free: Dict[Tuple[int, ...], List[np.ndarray]] = {}
+        self._free_count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """取得指定尺寸的緩衝區（內容未初始化）"""
+        with self._lock:
+            buffers = self._free.get(shape)
+            if buffers:
+                self._free_count -= 1
+                return buffers.pop()
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, buffer: Optional[np.ndarray]) -> None:
+        """歸還緩衝區；呼叫後不可再使用該陣列或其視圖"""
+        if buffer is None or buffer.base is not None:
+            return
+        with self._lock:
+            if self._free_count >= self.max_buffers:
+                return
+            self._free.setdefault(buffer.shape, []).append(buffer)
+            self._free_count += 1
+
+def pixmap_to_bgr(pix, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """將 PyMuPDF Pixmap 轉換為 OpenCV BGR 圖像
+
+    直接以 samples_mv 讀取 Pixmap 的記憶體（不像 pix.samples 會先複製一份），
+    色彩轉換的結果寫入 out（若提供且尺寸相符），因此每頁只需要一個 BGR 緩衝區。
+    """
+    samples = np.ndarray((pix.height, pix.width, pix.n), dtype=np.uint8,
+                         buffer=pix.samples_mv, strides=(pix.stride, pix.n, 1))
+    return cv2.cvtColor(samples, _BGR_CONVERSIONS[pix.n], dst=out)
+
+def render_page(page, dpi: int, buffer_pool: Optional[PageBufferPool] = None) -> np.ndarray:
+    """以指定 DPI 渲染 PDF 頁面為 BGR 圖像，提供 buffer_pool 時重複使用其緩衝區"""
+    pix = page.get_pixmap(dpi=dpi, alpha=False, annots=True)
+    out = buffer_pool.acquire((pix.height, pix.width, 3)) if buffer_pool is not None else None
+    image = pixmap_to_bgr(pix, out)
+    # Pixmap 的記憶體在轉換完成後即可釋放
+    del pix
+    return image
+
+def default_page_dpi(page, base_dpi: int = 300, min_long_side: int = 2000) -> int:
+    """原本的固定 DPI 規則：至少 base_dpi，且頁面長邊至少 min_long_side 像素"""
+    page_rect = page.rect
+    return max(base_dpi, int(min_long_side / (max(page_rect.width, page_rect.height) / 72)))
+
+# 內容串流的記號：名稱、數字或運算子
+_CONTENT_TOKEN = re.compile(rb'/[^\s/\[\]()<>{}%]+|[-+]?(?:\d+\.?\d*|\.\d+)|[A-Za-z]+|\S')
+
+def _single_image_placement(page, image_name: str) -> Optional[fitz.Matrix]:
+    """頁面內容只有 q / Q / cm 與一次繪製 image_name 時，直接解析內容串流返回圖片的擺放矩陣
+
+    get_image_info 等函數會先完整解碼圖片，解析內容串流則不需要；
+    出現任何其他運算子（文字、向量圖形、圖形狀態等）時返回 None
+    """
+    ctm = fitz.Identity
+    stack = []
+    operands = []
+    placement = None
+    for token in _CONTENT_TOKEN.findall(page.read_contents()):
+        if token[:1] == b'/' or token[:1] in b'+-.0123456789':
+            operands.append(token)
+            continue
+        if token == b'q' and not operands:
+            stack.append(ctm)
+        elif token == b'Q' and not operands and stack:
+            ctm = stack.pop()
+        elif token == b'cm' and len(operands) == 6:
+            try:
+                ctm = fitz.Matrix(*(float(value) for value in operands)) * ctm
+            except ValueError:
+                return None
+        elif token == b'Do' and placement is None and operands == [b'/' + image_name.encode()]:
+            placement = ctm
+        else:
+            return None
+        operands = []
+    if placement is None or operands:
+        return None
+    # 轉換為 MuPDF 的（未旋轉）頁面座標，圖片第一列位於單位正方形的 y = 0
+    return fitz.Matrix(1, 0, 0, -1, 0, 1) * placement * page.transformation_matrix
+
+def _full_page_image(page, min_coverage: float = 0.9) -> Optional[Tuple[int, int, int, fitz.Matrix, bool]]:
+    """頁面只有一張覆蓋整頁的點陣圖時返回 (xref, 寬, 高, 擺放矩陣, 是否為唯一內容)，否則返回 None"""
+    images = page.get_images(full=True)
+    if len(images) != 1:
+        return None
+    xref, _, width, height, _, _, _, image_name = images[0][:8]
+    transform = _single_image_placement(page, image_name)
+    image_only = transform is not None
+    if transform is None:
+        image_infos = page.get_image_info(xrefs=True)
+        if len(image_infos) != 1 or image_infos[0]['xref'] != xref:
+            return None
+        transform = fitz.Matrix(image_infos[0]['transform'])
+    bbox = fitz.Rect(0, 0, 1, 1) * transform
+    page_area = page.rect.width * page.rect.height
+    if bbox.is_empty or page_area <= 0 or bbox.width * bbox.height < min_coverage * page_area:
+        return None
+    return xref, width, height, transform, image_only
+
+def native_image_dpi(page, min_coverage: float = 0.9) -> Optional[float]:
+    """頁面為單張覆蓋整頁的點陣圖（掃描頁）時，返回該圖的原始解析度，否則返回 None"""
+    full_page_image = _full_page_image(page, min_coverage)
+    if full_page_image is None:
+        return None
+    _, width, height, transform, _ = full_page_image
+    bbox = fitz.Rect(0, 0, 1, 1) * transform
+    # 以面積計算，不受頁面或圖片旋轉影響
+    return math.sqrt(width * height / (bbox.width * bbox.height)) * 72
+
+def _image_orientation(matrix: fitz.Matrix) -> Optional[Tuple[bool, bool, bool]]:
+    """由圖片在（旋轉後）頁面上的擺放矩陣求出 (轉置, 水平翻轉, 垂直翻轉)，非直角擺放時返回 None"""
+    tolerance = 1e-3 * max(abs(matrix.a), abs(matrix.b), abs(matrix.c), abs(matrix.d))
+    if abs(matrix.b) <= tolerance and abs(matrix.c) <= tolerance:
+        return False, matrix.a < 0, matrix.d < 0
+    if abs(matrix.a) <= tolerance and abs(matrix.d) <= tolerance:
+        # 轉置後圖片的 y 軸對應頁面的 x 軸
+        return True, matrix.c < 0, matrix.b < 0
+    return None
+
+def embedded_scan_image(page) -> Optional[ScanImage]:
+    """頁面內容只有一張覆蓋整頁的點陣圖時，返回可直接解碼的掃描圖資訊
+
+    有文字（包括不可見的 OCR 文字層）、向量圖形、註解、頁面外的圖片部分或非直角擺放時返回 None
+    """
+    full_page_image = _full_page_image(page)
+    if full_page_image is None:
+        return None
+    xref, width, height, transform, image_only = full_page_image
+    if not image_only or page.first_annot is not None:
+        return None
+    # 容許約一個像素的誤差（掃描圖尺寸常因取整略大於頁面）
+    if not (page.rect + (-1, -1, 1, 1)).contains(fitz.Rect(0, 0, 1, 1) * transform * page.rotation_matrix):
+        return None
+    orientation = _image_orientation(transform * page.rotation_matrix)
+    if orientation is None:
+        return None
+    bbox = fitz.Rect(0, 0, 1, 1) * transform
+    return ScanImage(xref, math.sqrt(width * height / (bbox.width * bbox.height)) * 72, orientation)
+
+def decode_scan_image(page, scan_image: ScanImage) -> Optional[np.ndarray]:
+    """直接解碼掃描頁的嵌入圖片並轉為頁面方向的 BGR 圖像，無法解碼時返回 None"""
+    pdf_document = page.parent
+    image_data = pdf_document.extract_image(scan_image.xref)
+    image = None
+    if (image_data.get('ext') == 'jpeg' and image_data.get('colorspace') in (1, 3) and not image_data.get('smask')
+            and pdf_document.xref_get_key(scan_image.xref, 'Decode')[0] == 'null'):
+        # 原始 JPEG 串流直接交給 OpenCV（libjpeg-turbo）解碼
+        image = cv2.imdecode(np.frombuffer(image_data['image'], dtype=np.uint8), cv2.IMREAD_COLOR)
+    del image_data
+    if image is None:
+        try:
+            pix = fitz.Pixmap(pdf_document, scan_image.xref)
+            if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+                pix = fitz.Pixmap(fitz.csRGB, pix)
+            image = pixmap_to_bgr(pix)
+        except (RuntimeError, ValueError) as e:
+            print(f"無法解碼嵌入圖片 xref {scan_image.xref}: {e}")
+            return None
+
+    transpose, flip_x, flip_y = scan_image.orientation
+    if transpose:
+        image = cv2.transpose(image)
+    if flip_x or flip_y:
+        image = cv2.flip(image, -1 if flip_x and flip_y else (1 if flip_x else 0))
+    return image
+
+def load_page_image(page, dpi: int, buffer_pool: Optional[PageBufferPool] = None) -> np.ndarray:
+    """載入 PDF 頁面圖像：掃描頁的 dpi 等於原始解析度時直接解碼嵌入圖片，否則以 dpi 渲染"""
+    scan_image = embedded_scan_image(page)
+    if scan_image is not None and round(scan_image.dpi) == dpi:
+        image = decode_scan_image(page, scan_image)
+        if image is not None:
+            return image
+    return render_page(page, dpi, buffer_pool)
+
+def estimate_glyph_size(page, preview_dpi: int = 72, min_glyphs: int = 20) -> Optional[float]:
+    """以低 DPI 灰階預覽估計頁面上較小文字的字高（點），無法估計時返回 None
+
+    以連通區域的短邊作為字高：小字在低 DPI 下常連成一整行，短邊仍接近字高；
+    中文字則常被拆成數個筆畫區域，取第 25 百分位數會略為低估字高，使選出的 DPI 偏向保守
+    """
+    pix = page.get_pixmap(dpi=preview_dpi, colorspace=fitz.csGRAY, alpha=False)
+    gray = np.ndarray((pix.height, pix.width), dtype=np.uint8, buffer=pix.samples_mv, strides=(pix.stride, 1))
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10)
+    del gray, pix
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    sizes = np.minimum(stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT])
+    # 過小的是雜點或細線，超過半英吋的是圖片、框線或標題
+    glyph_sizes = sizes[(sizes >= 3) & (sizes <= preview_dpi / 2)]
+    if len(glyph_sizes) < min_glyphs:
+        return None
+    return float(np.percentile(glyph_sizes, 25)) * 72 / preview_dpi
+
+def plan_page_dpi(page, base_dpi: int = 300, min_dpi: int = 150, min_glyph_pixels: int = 16,
+                  preview_dpi: int = 72) -> DpiPlan:
+    """選擇頁面的渲染 DPI
+
+    以預覽估計的最小字高選出讓文字至少有 min_glyph_pixels 像素高的最低 DPI，
+    結果介於 min_dpi 與 default_page_dpi 之間，無法估計時使用 default_page_dpi。
+    掃描頁的原始解析度不超過 default_page_dpi 時直接使用原始解析度（更高的 DPI 只是放大像素），
+    不需要預覽，頁面也可直接解碼嵌入圖片（見 load_page_image）
+    """
+    reference_dpi = default_page_dpi(page, base_dpi)
+    native_dpi = native_image_dpi(page)
+    if native_dpi is not None and native_dpi <= reference_dpi:
+        dpi = max(min_dpi, round(native_dpi))
+        return DpiPlan(dpi, dpi / reference_dpi)
+
+    dpi = reference_dpi
+    glyph_size = estimate_glyph_size(page, preview_dpi)
+    if glyph_size is not None:
+        dpi = min(dpi, math.ceil(min_glyph_pixels * 72 / glyph_size))
+    dpi = min(reference_dpi, max(min_dpi, dpi))
+    return DpiPlan(dpi, dpi / reference_dpi)